@@ -5,34 +5,40 @@ ML-powered threat detection with behavioral analysis and automated response
 """
 
 import asyncio
+import importlib.util
 import logging
 import json
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Any, Union
+from dataclasses import dataclass
 from enum import Enum
 import hashlib
-import sqlite3
-import pickle
+import ipaddress
+import math
+import socket
+import struct
+import time
 from pathlib import Path
-import aiohttp
-import redis.asyncio as redis
-
-# Machine Learning imports
-try:
-    from sklearn.ensemble import IsolationForest, RandomForestClassifier
-    from sklearn.preprocessing import StandardScaler
-    from sklearn.decomposition import PCA
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
-    logging.warning("ML libraries not available, using rule-based detection only")
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+
+from indicator_index import IndicatorIndex, IndicatorSnapshot, ipv4_column
+from model_scoring import ModelScoringExecutor
+from model_store import ModelStore, ModelStoreWriter
+from record_codec import RecordCodec
+from expiring_map import ExpiringMap
+from flow_correlation import SlidingWindow
+from redis_write_behind import RedisWriteBehind
+from service_metrics import MetricsRegistry
+from threat_event_store import ThreatEventStore
+
 logger = logging.getLogger(__name__)
 
+# sklearn takes over a second to import, so it is only located here and
+# imported by the ML warm-up once the service is already detecting
+ML_AVAILABLE = importlib.util.find_spec("sklearn") is not None
+if not ML_AVAILABLE:
+    logger.warning("ML libraries not available, using rule-based detection only")
+
 class ThreatLevel(Enum):
     """Threat severity levels"""
     LOW = 1
@@ -51,7 +57,7 @@ class ThreatCategory(Enum):
     COMMAND_INJECTION = "command_injection"
     UNKNOWN = "unknown"
 
-@dataclass
+@dataclass(slots=True)
 class ThreatEvent:
     """Detected threat event"""
     event_id: str
@@ -67,104 +73,1042 @@ class ThreatEvent:
     automated_response: bool = False
     
     def to_dict(self) -> Dict:
-        data = asdict(self)
-        data['timestamp'] = self.timestamp.isoformat()
-        data['threat_level'] = self.threat_level.value
-        data['category'] = self.category.value
-        return data
+        """JSON-ready dict; indicators and raw_data are shared, not copied"""
+        return THREAT_EVENT_CODEC.to_dict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ThreatEvent':
+        return THREAT_EVENT_CODEC.from_dict(data)
+
+THREAT_EVENT_CODEC = RecordCodec(ThreatEvent)
+
+# IANA protocol numbers used for the columnar protocol code
+PROTOCOL_CODES = {"icmp": 1, "tcp": 6, "udp": 17}
+
+def _ipv4_to_int(address: str) -> Optional[int]:
+    """Convert a dotted IPv4 string to an integer, None if it is not IPv4"""
+    if not isinstance(address, str) or address.count(".") != 3:
+        return None
+    try:
+        return int.from_bytes(socket.inet_aton(address), "big")
+    except OSError:
+        return None
+
+def _timestamp_to_epoch(value: Any) -> float:
+    """Convert an ISO string, datetime or number to epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return 0.0
+    # Naive timestamps are UTC throughout this service
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+# Largest value accepted in each integer flow field
+FLOW_INT_LIMITS = {"port": 65535, "bytes_transferred": 2 ** 63 - 1}
+
+def _flow_int(record: Dict, field: str) -> int:
+    """Integer value of a port or byte count field, 0 if missing
+
+    Numeric strings are accepted; anything else that is not a number in
+    range raises ValueError, so both analysis paths skip the same records.
+    """
+    value = record.get(field) or 0
+    if type(value) is int and 0 <= value <= FLOW_INT_LIMITS[field]:
+        return value
+    try:
+        number = int(value)
+    except (TypeError, OverflowError):
+        raise ValueError(f"{field} is not a number: {value!r}")
+    if not 0 <= number <= FLOW_INT_LIMITS[field]:
+        raise ValueError(f"{field} out of range: {value!r}")
+    return number
+
+@dataclass
+class FlowBatch:
+    """Columnar batch of flow records for vectorized rule evaluation"""
+    source_ip: np.ndarray       # uint32
+    dest_ip: np.ndarray         # uint32
+    port: np.ndarray            # int32
+    protocol: np.ndarray        # uint8 IANA protocol code
+    bytes_transferred: np.ndarray  # int64
+    timestamp: np.ndarray       # float64 epoch seconds
+    source_valid: np.ndarray    # bool, False for non-IPv4 source addresses
+    dest_valid: np.ndarray      # bool, False for non-IPv4 destination addresses
+    records: Optional[List[Dict]] = None
+    skipped: int = 0            # malformed records left out of the batch
+
+    def __len__(self) -> int:
+        return len(self.source_ip)
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'FlowBatch':
+        """Convert flow record dicts to columns in a single pass per field
+
+        Records with a port or byte count ``_flow_int`` rejects are left
+        out and counted in ``skipped``.
+        """
+        ports = np.array([r.get('port') or 0 for r in records])
+        sizes = np.array([r.get('bytes_transferred') or 0 for r in records])
+        skipped = 0
+        if not (len(records) and ports.dtype.kind in "iub" and sizes.dtype.kind in "iub"
+                and 0 <= ports.min() and ports.max() <= FLOW_INT_LIMITS["port"]
+                and 0 <= sizes.min() and sizes.max() <= FLOW_INT_LIMITS["bytes_transferred"]):
+            # Slow path for batches with strings, floats or out of range values
+            ports, sizes, kept = [], [], []
+            for r in records:
+                try:
+                    port, size = _flow_int(r, 'port'), _flow_int(r, 'bytes_transferred')
+                except ValueError:
+                    continue
+                ports.append(port)
+                sizes.append(size)
+                kept.append(r)
+            skipped = len(records) - len(kept)
+            records = kept
+        source_ip, source_valid = ipv4_column([r.get('source_ip', '') for r in records])
+        dest_ip, dest_valid = ipv4_column([r.get('dest_ip', '') for r in records])
+        return cls(
+            source_ip=source_ip,
+            dest_ip=dest_ip,
+            port=np.array(ports, dtype=np.int32),
+            protocol=np.array(
+                [PROTOCOL_CODES.get(str(r.get('protocol', '')).lower(), 0) for r in records],
+                dtype=np.uint8
+            ),
+            bytes_transferred=np.array(sizes, dtype=np.int64),
+            timestamp=np.array(
+                [_timestamp_to_epoch(r.get('timestamp')) for r in records], dtype=np.float64
+            ),
+            source_valid=source_valid,
+            dest_valid=dest_valid,
+            records=records,
+            skipped=skipped
+        )
+
+    def record(self, index: int) -> Dict:
+        """Return the original record for a row, rebuilding it from columns if needed"""
+        if self.records is not None:
+            return self.records[index]
+        protocol_names = {code: name for name, code in PROTOCOL_CODES.items()}
+        return {
+            "timestamp": datetime.utcfromtimestamp(float(self.timestamp[index])).isoformat(),
+            "source_ip": str(ipaddress.IPv4Address(int(self.source_ip[index]))) if self.source_valid[index] else "",
+            "dest_ip": str(ipaddress.IPv4Address(int(self.dest_ip[index]))) if self.dest_valid[index] else "",
+            "port": int(self.port[index]),
+            "protocol": protocol_names.get(int(self.protocol[index]), ""),
+            "bytes_transferred": int(self.bytes_transferred[index])
+        }
+
+class DecayedHistogram:
+    """Exponentially decayed category counts with O(1) updates
+
+    Instead of decaying every bin on each event, the weight added per event
+    grows by 1 / (1 - decay); only relative weights matter, and everything
+    is rescaled once the increment gets large. The number of categories is
+    capped by dropping the lightest one.
+    """
+    __slots__ = ("weights", "total", "increment", "decay", "max_categories")
+    
+    def __init__(self, decay: float = 0.01, max_categories: int = 64):
+        self.weights: Dict[Any, float] = {}
+        self.total = 0.0
+        self.increment = 1.0
+        self.decay = decay
+        self.max_categories = max_categories
+    
+    def probability(self, key: Any, categories: Optional[int] = None) -> float:
+        """Laplace-smoothed share of the decayed weight held by ``key``"""
+        categories = categories or len(self.weights) + 1
+        return (self.weights.get(key, 0.0) + self.increment) / (self.total + self.increment * categories)
+    
+    def add(self, key: Any):
+        if key not in self.weights and len(self.weights) >= self.max_categories:
+            lightest = min(self.weights, key=self.weights.get)
+            self.total -= self.weights.pop(lightest)
+        self.weights[key] = self.weights.get(key, 0.0) + self.increment
+        self.total += self.increment
+        self.increment /= 1.0 - self.decay
+        if self.increment > 1e6:
+            for k in self.weights:
+                self.weights[k] /= self.increment
+            self.total /= self.increment
+            self.increment = 1.0
+
+class CountMinSketch:
+    """Count-min sketch for approximate event frequencies in fixed memory"""
+    
+    def __init__(self, width: int = 1 << 20, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.counts = np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+    
+    def _columns(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32) % self.width
+    
+    def add(self, key: str) -> int:
+        """Count an occurrence of ``key`` and return its estimate before this one"""
+        columns = self._columns(key)
+        estimate = int(self.counts[self._rows, columns].min())
+        self.counts[self._rows, columns] += 1
+        return estimate
+    
+    def estimate(self, key: str) -> int:
+        return int(self.counts[self._rows, self._columns(key)].min())
+
+# Numeric activity fields tracked with Welford mean/variance
+BEHAVIOR_NUMERIC_FEATURES = ("bytes_transferred", "duration")
+
+# Events a profile must have seen before its scores are trusted
+BEHAVIOR_WARMUP_EVENTS = 20
+
+class UserBehaviorProfile:
+    """Streaming behavioral baseline for one user
+
+    Holds sufficient statistics only: Welford running mean/variance of the
+    numeric features and decayed histograms of hour-of-day, action and
+    resource. Each event updates the profile in O(features).
+    """
+    __slots__ = ("event_count", "means", "m2", "hours", "actions", "resources")
+    
+    _HEADER = struct.Struct("<QB")
+    _CATEGORY = struct.Struct("<fH")
+    
+    def __init__(self, decay: float = 0.01):
+        self.event_count = 0
+        self.means = [0.0] * len(BEHAVIOR_NUMERIC_FEATURES)
+        self.m2 = [0.0] * len(BEHAVIOR_NUMERIC_FEATURES)
+        self.hours = DecayedHistogram(decay, max_categories=24)
+        self.actions = DecayedHistogram(decay)
+        self.resources = DecayedHistogram(decay)
+    
+    def zscore(self, index: int, value: float) -> float:
+        if self.event_count < 2:
+            return 0.0
+        std = (self.m2[index] / (self.event_count - 1)) ** 0.5
+        return abs(value - self.means[index]) / std if std > 0 else (0.0 if value == self.means[index] else 10.0)
+    
+    def update(self, hour: int, action: str, resource: str, values: List[float]):
+        self.event_count += 1
+        for index, value in enumerate(values):
+            delta = value - self.means[index]
+            self.means[index] += delta / self.event_count
+            self.m2[index] += delta * (value - self.means[index])
+        self.hours.add(hour)
+        self.actions.add(action)
+        self.resources.add(resource)
+    
+    def to_bytes(self) -> bytes:
+        """Compact binary encoding for persistence"""
+        parts = [
+            self._HEADER.pack(self.event_count, len(self.means)),
+            np.array(self.means + self.m2, dtype="<f8").tobytes()
+        ]
+        for histogram in (self.hours, self.actions, self.resources):
+            parts.append(struct.pack("<fddH", histogram.decay, histogram.total,
+                                     histogram.increment, len(histogram.weights)))
+            for key, weight in histogram.weights.items():
+                encoded = str(key).encode()
+                parts.append(self._CATEGORY.pack(weight, len(encoded)))
+                parts.append(encoded)
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'UserBehaviorProfile':
+        profile = cls()
+        profile.event_count, feature_count = cls._HEADER.unpack_from(data, 0)
+        offset = cls._HEADER.size
+        stats = np.frombuffer(data, dtype="<f8", count=2 * feature_count, offset=offset).tolist()
+        profile.means, profile.m2 = stats[:feature_count], stats[feature_count:]
+        offset += 16 * feature_count
+        for name in ("hours", "actions", "resources"):
+            histogram = getattr(profile, name)
+            histogram.decay, histogram.total, histogram.increment, count = struct.unpack_from("<fddH", data, offset)
+            offset += struct.calcsize("<fddH")
+            for _ in range(count):
+                weight, length = cls._CATEGORY.unpack_from(data, offset)
+                offset += cls._CATEGORY.size
+                key = data[offset:offset + length].decode()
+                offset += length
+                histogram.weights[int(key) if name == "hours" else key] = weight
+        return profile
+
+def _surprise(probability: float, floor: float = 1e-3) -> float:
+    """Map a probability to a 0-1 rarity score on a log scale"""
+    return min(1.0, math.log(1.0 / max(probability, floor)) / math.log(1.0 / floor))
 
 class BehavioralAnalyzer:
-    """Advanced behavioral analysis engine"""
+    """Advanced behavioral analysis engine
     
-    def __init__(self):
-        self.user_profiles: Dict[str, Dict] = {}
+    Per-user baselines are kept as streaming statistics (see
+    UserBehaviorProfile), so each activity event is scored and learned in
+    O(features) without revisiting history. A shared count-min sketch
+    tracks how often each user has performed each action on each resource.
+    
+    With a model store, profiles and per-user models are loaded lazily on
+    a user's first event instead of all at startup.
+    """
+    
+    # Component weights of the combined anomaly score
+    SCORE_WEIGHTS = {"hour": 0.2, "action": 0.15, "resource": 0.15, "combination": 0.15,
+                     "bytes_transferred": 0.2, "duration": 0.15}
+    ANOMALY_THRESHOLD = 0.8
+    
+    # Model store kind for each in-memory per-user model dict
+    MODEL_KINDS = {"pca": "baseline_models", "isolation_forest": "anomaly_detectors",
+                   "scaler": "feature_scalers"}
+    
+    def __init__(self, decay: float = 0.01, model_store: Optional[ModelStore] = None):
+        self.user_profiles: Dict[str, UserBehaviorProfile] = {}
+        self.rare_event_sketch = CountMinSketch()
+        self.decay = decay
+        self.model_store = model_store
+        # Models fitted since the last save; older ones live in the model store
         self.baseline_models: Dict[str, Any] = {}
         self.anomaly_detectors: Dict[str, Any] = {}
         self.feature_scalers: Dict[str, Any] = {}
         
-    def analyze_user_behavior(self, user_id: str, activity_data: List[Dict]) -> Tuple[float, List[str]]:
-        """Analyze user behavior for anomalies"""
-        if not ML_AVAILABLE:
-            return self._rule_based_behavioral_analysis(user_id, activity_data)
+    def _get_profile(self, user_id: str) -> UserBehaviorProfile:
+        """Return the user's profile, loading it from the model store on first access"""
+        profile = self.user_profiles.get(user_id)
+        if profile is None:
+            stored = self.model_store.get_arrays("profile", user_id) if self.model_store else None
+            if stored is not None:
+                profile = UserBehaviorProfile.from_bytes(stored["data"].tobytes())
+            else:
+                profile = UserBehaviorProfile(self.decay)
+            self.user_profiles[user_id] = profile
+        return profile
+    
+    def get_user_model(self, kind: str, user_id: str) -> Optional[Any]:
+        """Per-user ``scaler``, ``pca`` or ``isolation_forest`` model, if one exists"""
+        model = getattr(self, self.MODEL_KINDS[kind]).get(user_id)
+        if model is None and self.model_store is not None:
+            model = self.model_store.get(kind, user_id)
+        return model
+    
+    def model_writer(self) -> ModelStoreWriter:
+        """Collect profiles and newly fitted models into a new model store version
+        
+        Users not touched since the last save are carried over from the
+        current version. Call ``commit()`` on the result to write it.
+        """
+        writer = self.model_store.writer()
+        for user_id, profile in self.user_profiles.items():
+            writer.add_arrays("profile", user_id, {"data": np.frombuffer(profile.to_bytes(), dtype=np.uint8)})
+        for attribute in self.MODEL_KINDS.values():
+            for user_id, model in getattr(self, attribute).items():
+                writer.add(user_id, model)
+        writer.carry_over()
+        return writer
         
+    def analyze_user_behavior(self, user_id: str, activity_data: List[Dict]) -> Tuple[float, List[str]]:
+        """Score new activity events for a user and fold them into the baseline
+
+        ``activity_data`` holds the events since the previous call, not the
+        user's full history. Returns the highest event score and
+        descriptions of the anomalous activities.
+        """
         try:
-            # Extract features from activity data
-            features = self._extract_behavioral_features(activity_data)
-            
-            # Get or create user profile
-            if user_id not in self.user_profiles:
-                self._create_user_profile(user_id, features)
-                return 0.1, []  # New user, low anomaly score
-            
-            # Detect anomalies
-            anomaly_score = self._detect_behavioral_anomalies(user_id, features)
-            anomalous_activities = self._identify_anomalous_activities(user_id, activity_data, features)
-            
-            # Update user profile
-            self._update_user_profile(user_id, features)
-            
+            anomaly_score = 0.0
+            anomalous_activities: List[str] = []
+            for activity in activity_data:
+                score, findings = self.analyze_event(user_id, activity)
+                anomaly_score = max(anomaly_score, score)
+                anomalous_activities.extend(findings)
             return anomaly_score, anomalous_activities
             
         except Exception as e:
             logger.error(f"Behavioral analysis error: {e}")
             return 0.0, []
+    
+    def analyze_event(self, user_id: str, activity: Dict) -> Tuple[float, List[str]]:
+        """Score a single activity event against the user's baseline, then learn from it"""
+        profile = self._get_profile(user_id)
+        
+        epoch = _timestamp_to_epoch(activity.get('timestamp'))
+        hour = datetime.utcfromtimestamp(epoch).hour if epoch else datetime.utcnow().hour
+        action = str(activity.get('action', 'unknown'))
+        resource = str(activity.get('resource', 'unknown'))
+        values = [float(activity.get(name) or 0.0) for name in BEHAVIOR_NUMERIC_FEATURES]
+        seen_before = self.rare_event_sketch.add(f"{user_id}|{action}|{resource}")
+        
+        if profile.event_count < BEHAVIOR_WARMUP_EVENTS:
+            profile.update(hour, action, resource, values)
+            return 0.1, []  # New user, low anomaly score
+        
+        components = {
+            "hour": _surprise(profile.hours.probability(hour, categories=24)),
+            "action": _surprise(profile.actions.probability(action)),
+            "resource": _surprise(profile.resources.probability(resource)),
+            "combination": 1.0 / (1.0 + seen_before)
+        }
+        for index, name in enumerate(BEHAVIOR_NUMERIC_FEATURES):
+            components[name] = min(1.0, max(0.0, (profile.zscore(index, values[index]) - 2.0) / 4.0))
+        profile.update(hour, action, resource, values)
+        
+        score = sum(self.SCORE_WEIGHTS[name] * value for name, value in components.items())
+        findings = [
+            f"Unusual {name.replace('_', ' ')} for {user_id}: {action} on {resource} at {hour:02d}:00"
+            for name, value in components.items() if value >= self.ANOMALY_THRESHOLD
+        ]
+        return min(1.0, score), findings
+    
+    def export_profiles(self) -> Dict[str, bytes]:
+        """Serialize all user profiles for persistence"""
+        return {user_id: profile.to_bytes() for user_id, profile in self.user_profiles.items()}
+    
+    def import_profiles(self, profiles: Dict[str, bytes]):
+        """Restore user profiles produced by export_profiles"""
+        for user_id, data in profiles.items():
+            self.user_profiles[user_id] = UserBehaviorProfile.from_bytes(data)
 
 class AdvancedThreatDetector:
     """Advanced threat detection system with ML capabilities"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
+    def __init__(self, redis_url: str = "redis://localhost:6379",
+                 db_path: str = "threat_detection.db", model_dir: str = "threat_models",
+                 binary_records: bool = False, threat_ttl: float = 3600.0,
+                 max_active_threats: Optional[int] = 100_000,
+                 metrics: Optional[MetricsRegistry] = None, metrics_port: Optional[int] = None):
         self.redis_client = None
+        self.redis_writer: Optional[RedisWriteBehind] = None
         self.redis_url = redis_url
-        self.threat_indicators: Dict[str, Any] = {}
-        self.active_threats: Dict[str, ThreatEvent] = {}
-        self.behavioral_analyzer = BehavioralAnalyzer()
+        # Publish threat events to Redis as msgpack rather than JSON
+        self.binary_records = binary_records
+        self.threat_indicators = IndicatorIndex()
+        # Recent threats only; every event is already stored in SQLite and Redis
+        self.active_threats: ExpiringMap = ExpiringMap(ttl=threat_ttl, max_entries=max_active_threats)
+        self.model_store = ModelStore(model_dir)
+        self.behavioral_analyzer = BehavioralAnalyzer(model_store=self.model_store)
         self.detection_rules: List[Dict] = []
+        self.correlation_rules: List[Dict] = []
+        self.correlation_windows: Dict[str, SlidingWindow] = {}
+        # rule_id -> window key -> time until which repeat alerts are suppressed
+        self._correlation_alerts: Dict[str, Dict[int, float]] = {}
         self.ml_models: Dict[str, Any] = {}
+        self.model_executor: Optional[ModelScoringExecutor] = None
+        # Loads the ML stack after initialize(); detection is rule-only until it is done
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self.traffic_anomaly_threshold = -0.1
+        
+        # Threat events are written by the store's own thread
+        self.db_path = Path(db_path)
+        self.event_store = ThreatEventStore(self.db_path)
         
-        # Setup database
-        self.db_path = Path("threat_detection.db")
-        self._init_database()
+        # Disabled unless a registry is passed in or the endpoint is requested
+        self.metrics = metrics or MetricsRegistry("xorb_threat_detection", enabled=metrics_port is not None)
+        self.metrics_port = metrics_port
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Create the per-stage histograms, counters and queue gauges"""
+        m = self.metrics
+        stage_help = "Seconds spent per stage of network traffic analysis"
+        self._stage_rules = m.histogram("stage_seconds", stage_help, stage="rule_evaluation")
+        self._stage_correlation = m.histogram("stage_seconds", stage_help, stage="correlation")
+        self._stage_store = m.histogram("stage_seconds", stage_help, stage="redis_write")
+        self._stage_total = m.histogram("stage_seconds", stage_help, stage="total")
+        self._flows_analyzed = m.counter("flows_analyzed_total", "Flow records analyzed")
+        self._threats_detected = m.counter("threats_detected_total", "Threat events detected")
+        self._malformed_flows = m.counter("malformed_flows_total", "Flow records skipped as malformed")
+        self._redis_pipeline = m.histogram("redis_pipeline_seconds", "Seconds per write-behind Redis pipeline")
+        m.gauge("active_threats", lambda: len(self.active_threats), "Threats held in memory")
+        m.gauge("event_store_pending", lambda: self.event_store.pending, "Threat event batches awaiting SQLite")
+        m.gauge("redis_writes_pending", lambda: self.redis_writer.pending if self.redis_writer else 0,
+                "Writes waiting in the Redis write-behind buffer")
     
     async def initialize(self):
         """Initialize threat detection system"""
         try:
-            self.redis_client = redis.from_url(self.redis_url)
+            # A client set beforehand, e.g. by a test or replay harness, is kept
+            if self.redis_client is None:
+                import redis.asyncio as redis
+                self.redis_client = redis.from_url(self.redis_url)
             await self.redis_client.ping()
+            self.redis_writer = RedisWriteBehind(self.redis_client)
+            if self.metrics.enabled:
+                self.redis_writer.pipeline_latency = self._redis_pipeline
+            await self.redis_writer.start()
             
             # Load detection rules
             await self._load_detection_rules()
-            
-            # Initialize ML models
-            if ML_AVAILABLE:
-                await self._initialize_ml_models()
+            await self._load_correlation_rules()
             
             # Load threat intelligence
             await self._update_threat_intelligence()
             
+            await self.active_threats.start()
+            if self.metrics_port is not None:
+                await self.metrics.serve(port=self.metrics_port)
+            
+            # Rules and threat intelligence are enough to start detecting;
+            # the ML models follow in the background
+            if ML_AVAILABLE:
+                self._warm_up_task = asyncio.create_task(self._warm_up())
             logger.info("Advanced Threat Detection System initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize threat detector: {e}")
             raise
     
+    async def _load_detection_rules(self):
+        """Load network detection rules
+
+        Each rule is a dict of conditions that must all hold for a flow record:
+        ``protocols``, ``dest_ports``, ``min_bytes``, ``source_cidrs``,
+        ``dest_cidrs``, ``exclude_dest_cidrs`` and ``match_threat_intel``
+        (source or destination in the threat indicator index). Omitted
+        conditions match everything. Only IPv4 flows can satisfy CIDR
+        conditions.
+        """
+        internal_networks = ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+        self.detection_rules = [
+            {
+                "rule_id": "threat-intel-match",
+                "description": "Communication with an address on the threat intelligence blocklist",
+                "category": ThreatCategory.INTRUSION,
+                "threat_level": ThreatLevel.HIGH,
+                "confidence": 0.9,
+                "match_threat_intel": True
+            },
+            {
+                "rule_id": "remote-admin-exposure",
+                "description": "Remote administration protocol access",
+                "category": ThreatCategory.INTRUSION,
+                "threat_level": ThreatLevel.MEDIUM,
+                "confidence": 0.6,
+                "protocols": ["tcp"],
+                "dest_ports": [23, 3389, 5900]
+            },
+            {
+                "rule_id": "known-backdoor-port",
+                "description": "Traffic to a port commonly used by backdoors and C2 frameworks",
+                "category": ThreatCategory.MALWARE,
+                "threat_level": ThreatLevel.HIGH,
+                "confidence": 0.75,
+                "dest_ports": [1337, 4444, 6667, 31337]
+            },
+            {
+                "rule_id": "internal-smb-rpc",
+                "description": "Internal SMB/RPC connection indicating possible lateral movement",
+                "category": ThreatCategory.LATERAL_MOVEMENT,
+                "threat_level": ThreatLevel.MEDIUM,
+                "confidence": 0.5,
+                "protocols": ["tcp"],
+                "dest_ports": [135, 445],
+                "source_cidrs": internal_networks,
+                "dest_cidrs": internal_networks
+            },
+            {
+                "rule_id": "large-outbound-transfer",
+                "description": "Large transfer from an internal host to an external address",
+                "category": ThreatCategory.DATA_EXFILTRATION,
+                "threat_level": ThreatLevel.HIGH,
+                "confidence": 0.7,
+                "min_bytes": 100 * 1024 * 1024,
+                "source_cidrs": internal_networks,
+                "exclude_dest_cidrs": internal_networks
+            }
+        ]
+        logger.info(f"Loaded {len(self.detection_rules)} detection rules")
+    
+    async def _load_correlation_rules(self):
+        """Load sliding-window correlation rules
+
+        Each rule keeps a window of ``buckets`` x ``bucket_seconds`` keyed by
+        ``key`` (``source_ip`` or ``dest_ip``; the other address is the peer)
+        over the flows passing the rule's detection-rule style conditions.
+        It fires when ``metric`` (``distinct_peers``, ``distinct_ports``,
+        ``bytes`` or ``flows``) reaches ``threshold`` over the window, then
+        stays quiet for that key for one window length.
+        """
+        internal_networks = ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+        self.correlation_rules = [
+            {
+                "rule_id": "internal-fan-out",
+                "description": "Host connected to many internal addresses within a minute",
+                "category": ThreatCategory.LATERAL_MOVEMENT,
+                "threat_level": ThreatLevel.HIGH,
+                "confidence": 0.8,
+                "key": "source_ip",
+                "metric": "distinct_peers",
+                "threshold": 200,
+                "bucket_seconds": 10,
+                "buckets": 6,
+                "source_cidrs": internal_networks,
+                "dest_cidrs": internal_networks
+            },
+            {
+                "rule_id": "port-sweep",
+                "description": "Host probed many distinct ports within a minute",
+                "category": ThreatCategory.INTRUSION,
+                "threat_level": ThreatLevel.MEDIUM,
+                "confidence": 0.7,
+                "key": "source_ip",
+                "metric": "distinct_ports",
+                "threshold": 100,
+                "bucket_seconds": 10,
+                "buckets": 6
+            },
+            {
+                "rule_id": "external-transfer-volume",
+                "description": "Sustained transfer volume to an external address within an hour",
+                "category": ThreatCategory.DATA_EXFILTRATION,
+                "threat_level": ThreatLevel.HIGH,
+                "confidence": 0.75,
+                "key": "dest_ip",
+                "metric": "bytes",
+                "threshold": 1024 * 1024 * 1024,
+                "bucket_seconds": 300,
+                "buckets": 12,
+                "source_cidrs": internal_networks,
+                "exclude_dest_cidrs": internal_networks
+            }
+        ]
+        self.correlation_windows = {
+            rule["rule_id"]: SlidingWindow(
+                rule["bucket_seconds"], rule["buckets"],
+                sketches=tuple(name for metric, name in (("distinct_peers", "peers"), ("distinct_ports", "ports"))
+                               if rule["metric"] == metric)
+            )
+            for rule in self.correlation_rules
+        }
+        self._correlation_alerts = {rule["rule_id"]: {} for rule in self.correlation_rules}
+        logger.info(f"Loaded {len(self.correlation_rules)} correlation rules")
+    
+    async def _update_threat_intelligence(self):
+        """Bulk load the threat intelligence feed into the indicator index
+
+        The feed is read from the ``threat_intelligence:indicators`` Redis
+        set and compiled off the event loop; lookups keep using the previous
+        snapshot until the new one is swapped in.
+        """
+        indicators = [member async for member in
+                      self.redis_client.sscan_iter("threat_intelligence:indicators", count=10000)]
+        snapshot = await asyncio.to_thread(IndicatorSnapshot.from_indicators, indicators)
+        self.threat_indicators.swap(snapshot)
+        logger.info(f"Loaded {len(snapshot)} threat indicators (v{snapshot.version})")
+    
+    @staticmethod
+    def _in_networks(address: Optional[int], cidrs: List[str]) -> bool:
+        """Check an integer IPv4 address against a list of CIDRs"""
+        if address is None:
+            return False
+        for cidr in cidrs:
+            network = ipaddress.IPv4Network(cidr, strict=False)
+            if address & int(network.netmask) == int(network.network_address):
+                return True
+        return False
+    
+    def _intel_match(self, address: Optional[int], raw: Any) -> bool:
+        """Check one flow address against the threat indicators, by integer when it is IPv4"""
+        if address is not None:
+            return self.threat_indicators.contains_ipv4_int(address)
+        # Not IPv4; the string lookup covers IPv6
+        return isinstance(raw, str) and self.threat_indicators.contains_ip(raw)
+    
+    def _rule_matches(self, rule: Dict, packet: Dict, port: int, size: int,
+                      source_ip: Optional[int], dest_ip: Optional[int]) -> bool:
+        """Evaluate a single detection rule against one flow record and its parsed fields"""
+        if 'protocols' in rule and str(packet.get('protocol', '')).lower() not in rule['protocols']:
+            return False
+        if 'dest_ports' in rule and port not in rule['dest_ports']:
+            return False
+        if 'min_bytes' in rule and size < rule['min_bytes']:
+            return False
+        if 'source_cidrs' in rule and not self._in_networks(source_ip, rule['source_cidrs']):
+            return False
+        if 'dest_cidrs' in rule and not self._in_networks(dest_ip, rule['dest_cidrs']):
+            return False
+        if 'exclude_dest_cidrs' in rule and self._in_networks(dest_ip, rule['exclude_dest_cidrs']):
+            return False
+        if rule.get('match_threat_intel') and not (
+                self._intel_match(source_ip, packet.get('source_ip'))
+                or self._intel_match(dest_ip, packet.get('dest_ip'))):
+            return False
+        return True
+    
+    def _create_rule_threat(self, rule: Dict, packet: Dict, timestamp: float) -> ThreatEvent:
+        """Build a threat event for a flow record that matched a rule"""
+        source_ip = packet.get('source_ip', '')
+        dest_ip = packet.get('dest_ip', '')
+        event_id = hashlib.sha256(
+            f"{rule['rule_id']}:{source_ip}:{dest_ip}:{packet.get('port')}:{timestamp}".encode()
+        ).hexdigest()[:16]
+        return ThreatEvent(
+            event_id=event_id,
+            timestamp=datetime.utcfromtimestamp(timestamp) if timestamp else datetime.utcnow(),
+            source_ip=source_ip,
+            target_ip=dest_ip,
+            threat_level=rule['threat_level'],
+            category=rule['category'],
+            description=rule['description'],
+            indicators=[f"rule:{rule['rule_id']}"],
+            confidence=rule['confidence'],
+            raw_data=packet
+        )
+    
+    async def _apply_detection_rules(self, packets: List[Dict]) -> List[ThreatEvent]:
+        """Apply detection rules to flow records one record at a time, skipping malformed ones"""
+        threats = []
+        skipped = 0
+        for packet in packets:
+            try:
+                port, size = _flow_int(packet, 'port'), _flow_int(packet, 'bytes_transferred')
+            except ValueError:
+                skipped += 1
+                continue
+            # Addresses are parsed once per record for every rule's CIDR and indicator checks
+            source_ip = _ipv4_to_int(packet.get('source_ip', ''))
+            dest_ip = _ipv4_to_int(packet.get('dest_ip', ''))
+            for rule in self.detection_rules:
+                if self._rule_matches(rule, packet, port, size, source_ip, dest_ip):
+                    threats.append(self._create_rule_threat(
+                        rule, packet, _timestamp_to_epoch(packet.get('timestamp'))
+                    ))
+        if skipped:
+            self._malformed_flows.inc(skipped)
+            logger.warning(f"Skipped {skipped} malformed flow records")
+        return threats
+    
+    @staticmethod
+    def _cidr_mask(addresses: np.ndarray, valid: np.ndarray, cidrs: List[str]) -> np.ndarray:
+        """Vectorized membership of a uint32 address column in a list of CIDRs"""
+        mask = np.zeros(len(addresses), dtype=bool)
+        for cidr in cidrs:
+            network = ipaddress.IPv4Network(cidr, strict=False)
+            mask |= (addresses & np.uint32(int(network.netmask))) == np.uint32(int(network.network_address))
+        return mask & valid
+    
+    def _evaluate_rule_mask(self, rule: Dict, batch: FlowBatch) -> np.ndarray:
+        """Evaluate a detection rule over a whole batch, returning a row mask"""
+        mask = np.ones(len(batch), dtype=bool)
+        if 'protocols' in rule:
+            codes = [PROTOCOL_CODES[p] for p in rule['protocols'] if p in PROTOCOL_CODES]
+            mask &= np.isin(batch.protocol, codes)
+        if 'dest_ports' in rule:
+            mask &= np.isin(batch.port, rule['dest_ports'])
+        if 'min_bytes' in rule:
+            mask &= batch.bytes_transferred >= rule['min_bytes']
+        if 'source_cidrs' in rule:
+            mask &= self._cidr_mask(batch.source_ip, batch.source_valid, rule['source_cidrs'])
+        if 'dest_cidrs' in rule:
+            mask &= self._cidr_mask(batch.dest_ip, batch.dest_valid, rule['dest_cidrs'])
+        if 'exclude_dest_cidrs' in rule:
+            mask &= ~self._cidr_mask(batch.dest_ip, batch.dest_valid, rule['exclude_dest_cidrs'])
+        if rule.get('match_threat_intel'):
+            snapshot = self.threat_indicators.snapshot
+            intel = (snapshot.contains_ipv4_many(batch.source_ip) & batch.source_valid) | \
+                    (snapshot.contains_ipv4_many(batch.dest_ip) & batch.dest_valid)
+            # Non-IPv4 rows are not in the uint32 columns; check them by string
+            for index in np.flatnonzero(~(batch.source_valid & batch.dest_valid)):
+                record = batch.record(int(index))
+                intel[index] |= snapshot.contains_ip(record.get('source_ip') or '') or \
+                    snapshot.contains_ip(record.get('dest_ip') or '')
+            mask &= intel
+        return mask
+    
+    def _correlate_flows(self, batch: FlowBatch) -> List[ThreatEvent]:
+        """Feed a batch into the correlation windows and evaluate rules for its keys
+
+        Only keys that appear in the batch are evaluated, so the cost per
+        batch is proportional to the batch, not to the number of tracked keys.
+        """
+        threats = []
+        valid = batch.source_valid & batch.dest_valid
+        for rule in self.correlation_rules:
+            mask = self._evaluate_rule_mask(rule, batch) & valid
+            if not mask.any():
+                continue
+            window = self.correlation_windows[rule["rule_id"]]
+            keyed_by_source = rule["key"] == "source_ip"
+            keys = (batch.source_ip if keyed_by_source else batch.dest_ip)[mask]
+            peers = (batch.dest_ip if keyed_by_source else batch.source_ip)[mask]
+            timestamps = batch.timestamp[mask]
+            window.add(timestamps, keys, batch.bytes_transferred[mask], peers, batch.port[mask])
+            
+            aggregates = window.aggregate(np.unique(keys))
+            values = getattr(aggregates, rule["metric"])
+            alerts = self._correlation_alerts[rule["rule_id"]]
+            now = float(timestamps.max())
+            if len(alerts) > 10000:
+                for key in [k for k, until in alerts.items() if until <= now]:
+                    del alerts[key]
+            
+            for index in np.flatnonzero(values >= rule["threshold"]):
+                key = int(aggregates.keys[index])
+                if alerts.get(key, 0.0) > now:
+                    continue
+                alerts[key] = now + window.window_seconds
+                key_ip = str(ipaddress.IPv4Address(key))
+                peer_ip = str(ipaddress.IPv4Address(int(aggregates.witness[index])))
+                source_ip, target_ip = (key_ip, peer_ip) if keyed_by_source else (peer_ip, key_ip)
+                value = float(values[index])
+                threats.append(ThreatEvent(
+                    event_id=hashlib.sha256(f"{rule['rule_id']}:{key}:{now}".encode()).hexdigest()[:16],
+                    timestamp=datetime.utcfromtimestamp(now),
+                    source_ip=source_ip,
+                    target_ip=target_ip,
+                    threat_level=rule['threat_level'],
+                    category=rule['category'],
+                    description=f"{rule['description']} ({rule['metric']}={value:,.0f})",
+                    indicators=[f"correlation:{rule['rule_id']}"],
+                    confidence=rule['confidence'],
+                    raw_data={
+                        "window_seconds": window.window_seconds,
+                        "flows": int(aggregates.flows[index]),
+                        "bytes": int(aggregates.bytes[index]),
+                        "distinct_peers": round(float(aggregates.distinct_peers[index])),
+                        "distinct_ports": round(float(aggregates.distinct_ports[index]))
+                    }
+                ))
+        return threats
+    
+    async def analyze_network_traffic_batch(self, traffic_data: Union[FlowBatch, List[Dict]]) -> List[ThreatEvent]:
+        """Analyze a batch of flow records with vectorized rule evaluation
+
+        The batch is converted to columns once and every detection rule is
+        evaluated as a boolean mask over all rows; threat events are only
+        built for matching rows. Results are equivalent to
+        ``analyze_network_traffic``; both skip and count the same malformed
+        records.
+        """
+        try:
+            timed = self.metrics.enabled
+            if timed:
+                start = time.perf_counter()
+            batch = traffic_data if isinstance(traffic_data, FlowBatch) else FlowBatch.from_records(traffic_data)
+            if batch.skipped:
+                self._malformed_flows.inc(batch.skipped)
+                logger.warning(f"Skipped {batch.skipped} malformed flow records")
+            if not len(batch):
+                return []
+            
+            matches = [(rule, np.flatnonzero(self._evaluate_rule_mask(rule, batch)))
+                       for rule in self.detection_rules]
+            
+            # Emit in record order, then rule order, like the per-packet path
+            rows = [(int(index), rule_order) for rule_order, (_, indices) in enumerate(matches)
+                    for index in indices]
+            rows.sort()
+            detected_threats = [
+                self._create_rule_threat(matches[rule_order][0], batch.record(index),
+                                         float(batch.timestamp[index]))
+                for index, rule_order in rows
+            ]
+            if timed:
+                rules_done = time.perf_counter()
+                self._stage_rules.record(rules_done - start)
+            detected_threats.extend(self._correlate_flows(batch))
+            if timed:
+                correlated = time.perf_counter()
+                self._stage_correlation.record(correlated - rules_done)
+            
+            await self._store_threat_events(detected_threats)
+            for threat in detected_threats:
+                self.active_threats[threat.event_id] = threat
+            if timed:
+                self._stage_store.record_since(correlated)
+                self._stage_total.record_since(start)
+                self._flows_analyzed.inc(len(batch))
+                self._threats_detected.inc(len(detected_threats))
+            
+            return detected_threats
+            
+        except Exception as e:
+            logger.error(f"Batch network traffic analysis error: {e}")
+            return []
+    
+    async def _warm_up(self):
+        """Import the ML stack and open the model store off the event loop"""
+        try:
+            start = time.perf_counter()
+            await asyncio.to_thread(importlib.import_module, "sklearn.ensemble")
+            await asyncio.to_thread(lambda: self.model_store.version)
+            await self._initialize_ml_models()
+            logger.info(f"ML models ready after {time.perf_counter() - start:.2f}s warm-up")
+        except Exception as e:
+            logger.error(f"ML warm-up failed, continuing with rule-based detection: {e}")
+    
+    async def wait_until_warm(self):
+        """Wait for the ML warm-up started by initialize(), if any"""
+        if self._warm_up_task is not None:
+            await asyncio.shield(self._warm_up_task)
+    
+    async def _initialize_ml_models(self):
+        """Start the process pool that scores and fits the ML models"""
+        from sklearn.ensemble import IsolationForest
+        self.model_executor = ModelScoringExecutor()
+        self.ml_models["traffic_anomaly"] = IsolationForest(n_estimators=100, random_state=42)
+    
+    @staticmethod
+    def _flow_features(batch: FlowBatch) -> np.ndarray:
+        """Numeric feature matrix for the traffic anomaly model"""
+        hours = (batch.timestamp % 86400) / 3600
+        return np.column_stack([
+            batch.port.astype(np.float64),
+            batch.protocol.astype(np.float64),
+            np.log1p(batch.bytes_transferred.astype(np.float64)),
+            np.sin(2 * np.pi * hours / 24),
+            np.cos(2 * np.pi * hours / 24)
+        ])
+    
+    async def train_traffic_model(self, traffic_data: Union[FlowBatch, List[Dict]]) -> int:
+        """Fit the traffic anomaly model off the event loop and hot-reload it"""
+        await self.wait_until_warm()
+        if self.model_executor is None:
+            raise RuntimeError("ML models are not available")
+        batch = traffic_data if isinstance(traffic_data, FlowBatch) else FlowBatch.from_records(traffic_data)
+        version = await self.model_executor.fit(
+            "traffic_anomaly", self.ml_models["traffic_anomaly"], self._flow_features(batch)
+        )
+        logger.info(f"Traffic anomaly model trained on {len(batch)} flows (version {version})")
+        return version
+    
+    async def detect_traffic_anomalies(self, traffic_data: Union[FlowBatch, List[Dict]]) -> List[ThreatEvent]:
+        """Score flows with the traffic anomaly model and report the outliers"""
+        try:
+            if self.model_executor is None or not self.model_executor.has_model("traffic_anomaly"):
+                return []
+            batch = traffic_data if isinstance(traffic_data, FlowBatch) else FlowBatch.from_records(traffic_data)
+            if batch.skipped:
+                self._malformed_flows.inc(batch.skipped)
+                logger.warning(f"Skipped {batch.skipped} malformed flow records")
+            if not len(batch):
+                return []
+            scores = await self.model_executor.score(
+                "traffic_anomaly", self._flow_features(batch), "decision_function"
+            )
+            
+            detected_threats = []
+            for index in np.flatnonzero(scores < self.traffic_anomaly_threshold):
+                record = batch.record(int(index))
+                score = float(scores[index])
+                timestamp = float(batch.timestamp[index])
+                event_id = hashlib.sha256(
+                    f"ml:traffic_anomaly:{record.get('source_ip')}:{record.get('dest_ip')}:"
+                    f"{record.get('port')}:{timestamp}".encode()
+                ).hexdigest()[:16]
+                detected_threats.append(ThreatEvent(
+                    event_id=event_id,
+                    timestamp=datetime.utcfromtimestamp(timestamp) if timestamp else datetime.utcnow(),
+                    source_ip=record.get('source_ip', ''),
+                    target_ip=record.get('dest_ip', ''),
+                    threat_level=ThreatLevel.MEDIUM if score < 2 * self.traffic_anomaly_threshold else ThreatLevel.LOW,
+                    category=ThreatCategory.ANOMALOUS_BEHAVIOR,
+                    description="Flow is an outlier for the traffic anomaly model",
+                    indicators=["ml:traffic_anomaly"],
+                    confidence=min(1.0, 0.5 - score),
+                    raw_data=record
+                ))
+            
+            await self._store_threat_events(detected_threats)
+            for threat in detected_threats:
+                self.active_threats[threat.event_id] = threat
+            
+            return detected_threats
+            
+        except Exception as e:
+            logger.error(f"Traffic anomaly detection error: {e}")
+            return []
+    
+    async def save_models(self) -> int:
+        """Write behavioral profiles and per-user models as a new model store version"""
+        analyzer = self.behavioral_analyzer
+        saved = {attribute: dict(getattr(analyzer, attribute))
+                 for attribute in BehavioralAnalyzer.MODEL_KINDS.values()}
+        writer = analyzer.model_writer()
+        version = await asyncio.to_thread(writer.commit)
+        await asyncio.to_thread(self.model_store.prune)
+        # Saved models are now served from the store; keep any fitted meanwhile
+        for attribute, models in saved.items():
+            current = getattr(analyzer, attribute)
+            for user_id, model in models.items():
+                if current.get(user_id) is model:
+                    del current[user_id]
+        return version
+    
+    async def _store_threat_event(self, threat: ThreatEvent):
+        """Persist a single threat event"""
+        await self._store_threat_events([threat])
+    
+    async def _store_threat_events(self, threats: List[ThreatEvent]):
+        """Queue threat events for the SQLite writer thread and publish them to Redis"""
+        if not threats:
+            return
+        payloads = [THREAT_EVENT_CODEC.dumps(t) for t in threats]
+        self.event_store.submit([
+            (t.event_id, _timestamp_to_epoch(t.timestamp), t.source_ip, t.target_ip,
+             t.threat_level.value, t.category.value, t.confidence, payload)
+            for t, payload in zip(threats, payloads)
+        ])
+        if self.redis_writer:
+            if self.binary_records:
+                payloads = [THREAT_EVENT_CODEC.pack(t) for t in threats]
+            for threat, payload in zip(threats, payloads):
+                await self.redis_writer.setex(f"threat_event:{threat.event_id}", 86400 * 7, payload)
+    
+    async def get_threats_from_ip(self, source_ip: str, hours: float = 24,
+                                  limit: int = 1000) -> List[Dict]:
+        """Stored threat events from an IP in the last ``hours`` hours, newest first"""
+        try:
+            return await self.event_store.query_async(source_ip=source_ip, hours=hours, limit=limit)
+        except Exception as e:
+            logger.error(f"Threat event query error: {e}")
+            return []
+    
+    async def shutdown(self):
+        """Flush pending writes, stop the scoring pool and close the connection"""
+        await self.metrics.close()
+        await self.active_threats.close()
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+        if self.model_executor:
+            await self.model_executor.close()
+        await self.event_store.aclose()
+        if self.redis_writer:
+            await self.redis_writer.close()
+        if self.redis_client:
+            await self.redis_client.close()
+    
     async def analyze_network_traffic(self, traffic_data: List[Dict]) -> List[ThreatEvent]:
         """Analyze network traffic for threats"""
         detected_threats = []
         
         try:
-            for packet in traffic_data:
-                # Check against threat indicators
-                source_ip = packet.get('source_ip', '')
-                dest_ip = packet.get('dest_ip', '')
-                
-                # Apply detection rules to all traffic
-                rule_threats = await self._apply_detection_rules([packet])
-                detected_threats.extend(rule_threats)
+            timed = self.metrics.enabled
+            if timed:
+                start = time.perf_counter()
+            # Apply detection rules to all traffic
+            detected_threats.extend(await self._apply_detection_rules(traffic_data))
+            if timed:
+                rules_done = time.perf_counter()
+                self._stage_rules.record(rules_done - start)
+            
+            # Multi-flow patterns need the whole batch
+            if self.correlation_rules and traffic_data:
+                detected_threats.extend(self._correlate_flows(FlowBatch.from_records(traffic_data)))
+            if timed:
+                correlated = time.perf_counter()
+                self._stage_correlation.record(correlated - rules_done)
             
             # Store detected threats
             for threat in detected_threats:
                 await self._store_threat_event(threat)
                 self.active_threats[threat.event_id] = threat
+            if timed:
+                self._stage_store.record_since(correlated)
+                self._stage_total.record_since(start)
+                self._flows_analyzed.inc(len(traffic_data))
+                self._threats_detected.inc(len(detected_threats))
             
             return detected_threats
             
@@ -193,4 +1137,5 @@ async def main():
     print(f"Detected {len(threats)} threats from network traffic")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
\ No newline at end of file
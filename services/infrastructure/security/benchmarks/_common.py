@@ -0,0 +1,55 @@
+"""
+Shared helpers for the security service benchmarks
+"""
+
+import importlib.util
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+def load_service(name: str):
+    """Import a service script such as ``advanced-threat-detection`` as a module"""
+    module_name = name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, SERVICE_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def synthetic_flows(count: int, seed: int = 42) -> List[Dict]:
+    """Generate reproducible flow records with a small fraction of suspicious traffic"""
+    rng = random.Random(seed)
+    ports = [80, 443, 443, 443, 53, 8080, 22, 445, 3389, 4444]
+    flows = []
+    for _ in range(count):
+        internal_dest = rng.random() < 0.5
+        flows.append({
+            "timestamp": 1_700_000_000 + rng.random() * 3600,
+            "source_ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            "dest_ip": (f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+                        if internal_dest else
+                        f"{rng.randrange(11, 223)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"),
+            "port": ports[rng.randrange(len(ports))] if rng.random() < 0.05 else 443,
+            "protocol": "tcp" if rng.random() < 0.9 else "udp",
+            "bytes_transferred": rng.randrange(64, 200 * 1024 * 1024) if rng.random() < 0.001 else rng.randrange(64, 65536)
+        })
+    return flows
+
+class Timer:
+    """Context manager measuring wall-clock seconds"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
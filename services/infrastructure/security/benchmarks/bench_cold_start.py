@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import time and time to first decision of the detector and controller from a fresh interpreter
+
+Usage: python bench_cold_start.py [--runs N] [--service detector|controller ...]
+
+Each run starts a new interpreter and records, from the moment it is
+launched, when the service module is imported, when ``initialize()``
+returns and when the first decision comes back: a batch of flows through
+the detector's rules, or one access check by the controller. ``eager``
+imports sklearn, aiohttp and redis up front and, for the detector, waits
+for the ML warm-up before deciding, as both services did before imports
+were deferred. The detector uses an in-process fakeredis client, whose
+import stands in for the redis client's and counts towards initialize.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# What the services imported at module load before they deferred it
+EAGER_IMPORTS = {
+    "detector": ["sklearn.ensemble", "sklearn.preprocessing", "sklearn.decomposition", "aiohttp", "redis.asyncio"],
+    "controller": ["aiohttp.web", "redis.asyncio"],
+}
+
+async def detector_child(mode: str, marks: dict):
+    from _common import load_service, synthetic_flows
+    atd = load_service("advanced-threat-detection")
+    marks["import"] = time.time()
+    import fakeredis.aioredis
+    with tempfile.TemporaryDirectory() as workdir:
+        detector = atd.AdvancedThreatDetector(db_path=f"{workdir}/events.db", model_dir=f"{workdir}/models")
+        detector.redis_client = fakeredis.aioredis.FakeRedis()
+        await detector.initialize()
+        marks["initialize"] = time.time()
+        if mode == "eager":
+            await detector.wait_until_warm()
+        await detector.analyze_network_traffic_batch(synthetic_flows(1000))
+        marks["first_decision"] = time.time()
+        await detector.wait_until_warm()
+        marks["warm"] = time.time()
+        await detector.shutdown()
+
+async def controller_child(mode: str, marks: dict):
+    from _common import load_service
+    ztn = load_service("zero-trust-network")
+    marks["import"] = time.time()
+    controller = ztn.ZeroTrustNetworkController(redis_url=None)
+    await controller.initialize()
+    marks["initialize"] = time.time()
+    await controller.register_network_identity("user001", "172.20.10.100", "00:11:22:33:44:55",
+                                               "device_fp_123", ztn.NetworkZone.INTERNAL)
+    await controller.verify_network_access("user001", "172.20.20.50", 8000)
+    marks["first_decision"] = marks["warm"] = time.time()
+    await controller.shutdown()
+
+def child(service: str, mode: str):
+    marks = {}
+    if mode == "eager":
+        import importlib
+        for name in EAGER_IMPORTS[service]:
+            importlib.import_module(name)
+    asyncio.run((detector_child if service == "detector" else controller_child)(mode, marks))
+    print(json.dumps(marks))
+
+def measure(service: str, mode: str) -> dict:
+    launched = time.time()
+    output = subprocess.run([sys.executable, __file__, "--child", service, mode], check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    marks = json.loads(output.stdout.strip().splitlines()[-1])
+    return {name: value - launched for name, value in marks.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--service", action="append", choices=sorted(EAGER_IMPORTS))
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    launched = time.time()
+    for _ in range(args.runs):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter = (time.time() - launched) / args.runs
+    print(f"{args.runs} runs each, median seconds from launch; bare interpreter {interpreter:.3f}s")
+    print(f"{'service':<12}{'mode':<8}{'import':>9}{'initialize':>12}{'first decision':>16}{'ML ready':>10}")
+    for service in args.service or sorted(EAGER_IMPORTS):
+        for mode in ("eager", "lazy"):
+            runs = [measure(service, mode) for _ in range(args.runs)]
+            median = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+            print(f"{service:<12}{mode:<8}{median['import']:>9.3f}{median['initialize']:>12.3f}"
+                  f"{median['first_decision']:>16.3f}{median['warm']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory per identity for Dict[str, NetworkIdentity] vs the columnar IdentityStore
+
+Usage: python bench_identity_store.py [--identities N] [--seed S]
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _common import Timer, load_service
+
+def build_identities(ztn, count: int, seed: int):
+    rng = random.Random(seed)
+    zones = list(ztn.NetworkZone)
+    trust_levels = list(ztn.TrustLevel)
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        yield ztn.NetworkIdentity(
+            entity_id=f"device-{i:08d}",
+            ip_address=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            mac_address=":".join(f"{rng.randrange(256):02x}" for _ in range(6)),
+            device_fingerprint=f"fp-{rng.getrandbits(64):016x}",
+            trust_level=rng.choice(trust_levels),
+            zone=rng.choice(zones),
+            last_verified=start + timedelta(seconds=rng.randrange(86400 * 30)),
+            risk_score=round(rng.random(), 3)
+        )
+
+def measure(ztn, container, count: int, seed: int):
+    """Bytes allocated while filling ``container`` with ``count`` identities"""
+    gc.collect()
+    tracemalloc.start()
+    with Timer() as timer:
+        for identity in build_identities(ztn, count, seed):
+            container[identity.entity_id] = identity
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, timer.elapsed
+
+def lookup_rate(container, count: int) -> float:
+    keys = [f"device-{i:08d}" for i in range(0, count, max(1, count // 100_000))]
+    with Timer() as timer:
+        for key in keys:
+            identity = container[key]
+            identity.trust_level, identity.zone, identity.ip_address
+    return len(keys) / timer.elapsed
+
+def run(count: int, seed: int):
+    ztn = load_service("zero-trust-network")
+
+    identities = {}
+    dict_bytes, dict_time = measure(ztn, identities, count, seed)
+    dict_rate = lookup_rate(identities, count)
+    del identities
+
+    store = ztn.IdentityStore()
+    store_bytes, store_time = measure(ztn, store, count, seed)
+    store_rate = lookup_rate(store, count)
+
+    print(f"identities:              {count:>12,}")
+    print(f"dict of dataclasses:     {dict_bytes / count:>12.1f} bytes/identity "
+          f"({dict_time:.2f} s to fill, {dict_rate:,.0f} reads/s)")
+    print(f"IdentityStore:           {store_bytes / count:>12.1f} bytes/identity "
+          f"({store_time:.2f} s to fill, {store_rate:,.0f} reads/s)")
+    print(f"  of which columns:      {store.nbytes() / count:>12.1f} bytes/identity")
+    print(f"reduction:               {dict_bytes / store_bytes:>12.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--identities", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.identities, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: alert storm through create_incident with and without incident aggregation
+
+Usage: python bench_incident_aggregation.py [--alerts N] [--hosts N] [--seed S]
+"""
+
+import argparse
+import asyncio
+import random
+from typing import Dict, List
+
+import fakeredis.aioredis
+
+from _common import Timer, load_service
+from redis_write_behind import RedisWriteBehind
+
+def make_alerts(iro, count: int, hosts: int, seed: int) -> List[Dict]:
+    """A worm spreading across ``hosts`` (a few file hashes, one C2 address) plus unrelated noise"""
+    rng = random.Random(seed)
+    hashes = [f"{rng.getrandbits(256):064x}" for _ in range(4)]
+    infected = [f"10.{h >> 8 & 255}.{h & 255}.{rng.randrange(1, 255)}" for h in range(hosts)]
+    severities = [iro.IncidentSeverity.P3_MEDIUM] * 8 + [iro.IncidentSeverity.P2_HIGH]
+    alerts = []
+    for i in range(count):
+        if rng.random() < 0.9:
+            host = rng.choice(infected)
+            # The outbreak is confirmed critical halfway through
+            severity = iro.IncidentSeverity.P1_CRITICAL if i == count // 2 else rng.choice(severities)
+            alerts.append({
+                "title": "Malware detected", "description": "Worm binary executed",
+                "severity": severity, "source_system": "endpoint_security",
+                "affected_assets": [f"host:{host}"],
+                "indicators": [f"FILE_HASH:{rng.choice(hashes).upper()}", "ip:203.0.113.50"],
+                "evidence": {"threat_category": "malware", "confidence": 0.9}
+            })
+        else:
+            alerts.append({
+                "title": "Suspicious login", "description": "Login from a new location",
+                "severity": iro.IncidentSeverity.P4_LOW, "source_system": "identity",
+                "affected_assets": [f"user:u{rng.randrange(100000)}"],
+                "indicators": [f"ip:198.51.{rng.randrange(256)}.{rng.randrange(256)}"],
+                "evidence": {"threat_category": "account_compromise", "confidence": 0.5}
+            })
+    return alerts
+
+async def run_storm(iro, alerts: List[Dict], window: float):
+    orchestrator = iro.IncidentResponseOrchestrator(aggregation_window=window)
+    orchestrator.redis_writer = RedisWriteBehind(fakeredis.aioredis.FakeRedis())
+    await orchestrator.redis_writer.start()
+    responses = 0
+
+    async def respond(incident):
+        nonlocal responses
+        responses += 1
+
+    orchestrator.response_handlers[iro.ResponseAction.NOTIFY_ADMIN] = respond
+    for severity in iro.IncidentSeverity:
+        orchestrator.response_playbooks[severity.name] = [iro.ResponseAction.NOTIFY_ADMIN]
+
+    with Timer() as timer:
+        for alert in alerts:
+            await orchestrator.create_incident(**alert)
+    writes = orchestrator.redis_writer.stats["writes"]
+    await orchestrator.shutdown()
+    return timer.elapsed, len(orchestrator.active_incidents), responses, writes, orchestrator
+
+async def run(count: int, hosts: int, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("WARNING")
+    alerts = make_alerts(iro, count, hosts, seed)
+
+    print(f"alerts:                  {count:>10,} (worm across up to {hosts:,} hosts, 10% unrelated noise)")
+    print(f"{'':<25}{'alerts/s':>10}{'incidents':>11}{'responses':>11}{'redis writes':>14}")
+    for label, window in (("no aggregation", 0.0), ("aggregated", 900.0)):
+        elapsed, incidents, responses, writes, orchestrator = await run_storm(iro, alerts, window)
+        print(f"{label:<25}{count / elapsed:>10,.0f}{incidents:>11,}{responses:>11,}{writes:>14,}")
+
+    worm = max(orchestrator.active_incidents.values(), key=lambda i: i.evidence["alert_count"])
+    print(f"largest incident:        {worm.evidence['alert_count']:,} alerts, "
+          f"{len(worm.affected_assets):,} assets, severity {worm.severity.name}, "
+          f"{len(worm.timeline)} timeline entries")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--hosts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.alerts, args.hosts, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dashboard polls over many active incidents, full serialization vs indexed pages
+
+Usage: python bench_incident_queries.py [--incidents N] [--page N] [--polls N] [--seed S]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+import fakeredis.aioredis
+
+from _common import Timer, load_service
+from redis_write_behind import RedisWriteBehind
+
+async def timed(polls: int, call) -> float:
+    """Mean milliseconds per call"""
+    with Timer() as timer:
+        for _ in range(polls):
+            await call()
+    return timer.elapsed / polls * 1000
+
+async def run(count: int, page: int, polls: int, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("WARNING")
+    rng = random.Random(seed)
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_writer = RedisWriteBehind(fakeredis.aioredis.FakeRedis())
+    severities = list(iro.IncidentSeverity)
+    systems = ["endpoint_security", "advanced_threat_detection", "identity", "email_gateway"]
+
+    with Timer() as load:
+        for i in range(count):
+            await orchestrator.create_incident(
+                title=f"Incident {i}", description="Benchmark incident", severity=rng.choice(severities),
+                source_system=rng.choice(systems),
+                affected_assets=[f"host:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", f"user:u{rng.randrange(count // 10)}"],
+                indicators=[f"hash:{i:064x}"], evidence={"threat_category": f"category-{i % 50}"}
+            )
+    ids = list(orchestrator.active_incidents)
+    for incident_id in rng.sample(ids, count // 100):
+        await orchestrator.update_incident(incident_id, status=iro.IncidentStatus.INVESTIGATING,
+                                           assigned_analyst=rng.choice(["alice", "bob", "carol"]))
+    await orchestrator.redis_writer.flush()
+
+    async def legacy_poll():
+        # The previous list_active_incidents: serialize every incident on each call
+        return json.dumps([incident.to_dict() for incident in orchestrator.active_incidents.values()])
+
+    async def deep_pages():
+        cursor = None
+        for _ in range(20):
+            result = await orchestrator.query_incidents(limit=page, cursor=cursor)
+            cursor = result["next_cursor"]
+
+    async def mutate():
+        await orchestrator.update_incident(rng.choice(ids), assigned_analyst=rng.choice(["alice", "bob", "dave"]))
+
+    cases = [
+        ("full list, to_dict each poll", legacy_poll, max(polls // 50, 2)),
+        ("full list, cached dicts", lambda: orchestrator.list_active_incidents(), max(polls // 50, 2)),
+        (f"first page of {page}", lambda: orchestrator.query_incidents(limit=page), polls),
+        (f"first page of {page}, JSON", lambda: orchestrator.query_incidents_json(limit=page), polls),
+        ("open P1 incidents", lambda: orchestrator.query_incidents(status="open", severity="P1_CRITICAL",
+                                                                   limit=page), polls),
+        ("assigned to alice", lambda: orchestrator.query_incidents(assigned_analyst="alice", limit=page), polls),
+        ("by affected asset", lambda: orchestrator.query_incidents(asset="host:10.0.1.2"), polls),
+        (f"20 pages of {page} via cursor", deep_pages, max(polls // 20, 2)),
+        ("update_incident (analyst)", mutate, polls),
+    ]
+    print(f"incidents:               {count:,} active (loaded in {load.elapsed:.1f} s)")
+    for label, call, n in cases:
+        print(f"  {label:<32}{await timed(n, call):>10.3f} ms")
+    page_result = await orchestrator.query_incidents(status=iro.IncidentStatus.OPEN, severity=1, limit=page)
+    print(f"open P1 page:            {len(page_result['incidents'])} incidents, "
+          f"next cursor {page_result['next_cursor']}")
+    await orchestrator.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=100_000)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.incidents, args.page, args.polls, args.seed))
+
+if __name__ == "__main__":
+    main()
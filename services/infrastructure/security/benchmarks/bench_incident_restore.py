@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: orchestrator restart with many persisted incidents, blocking load vs background SCAN/MGET restore
+
+Usage: python bench_incident_restore.py [--incidents N] [--seed S]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import fakeredis.aioredis
+import numpy as np
+
+from _common import Timer, load_service
+
+async def populate(client, count: int, seed: int) -> list:
+    """Persist ``count`` incidents and return the ids of those not closed"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    ids = []
+    pipe = client.pipeline(transaction=False)
+    for i in range(count):
+        incident_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        created = (start + timedelta(seconds=i * 10)).isoformat()
+        status = rng.choice(["open", "investigating", "contained", "closed"])
+        if status != "closed":
+            ids.append(incident_id)
+        pipe.setex(f"incident:{incident_id}", 86400 * 7, json.dumps({
+            "incident_id": incident_id, "title": f"Incident {i}", "description": "Restored incident",
+            "severity": rng.randint(1, 4), "status": status,
+            "created_at": created, "updated_at": created, "source_system": "advanced_threat_detection",
+            "affected_assets": [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"],
+            "indicators": [f"rule:rule-{i % 40}"], "evidence": {"threat_category": f"category-{i % 12}"},
+            "assigned_analyst": None, "response_actions": ["block_ip"],
+            "timeline": [{"timestamp": created, "event": "response_action", "action": "block_ip"}]
+        }))
+        if len(pipe) >= 5000:
+            await pipe.execute()
+    await pipe.execute()
+    return ids
+
+async def loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        before = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - before - interval)
+
+async def run(count: int, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("WARNING")
+    client = fakeredis.aioredis.FakeRedis()
+    ids = await populate(client, count, seed)
+    rng = random.Random(seed)
+
+    # Blocking: read every key one GET at a time before serving
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_client = client
+    with Timer() as blocking:
+        values = [await client.get(key) async for key in client.scan_iter(match="incident:*", count=1000)]
+        orchestrator._restore_batch(values)
+
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_client = client
+    lag, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(loop_lag(lag, stop))
+    with Timer() as serving:
+        await orchestrator._load_active_incidents()
+    with Timer() as lazy:
+        status = await orchestrator.get_incident_status(rng.choice(ids[-1000:]))
+    query_ms, page = [], {"complete": True}
+    while not orchestrator.restore_ready.is_set():
+        with Timer() as query:
+            page = await orchestrator.query_incidents(status="open", limit=50)
+        query_ms.append(query.elapsed * 1000)
+        await asyncio.sleep(0.05)
+    stop.set()
+    await sampler
+    progress = orchestrator.restore_status()
+    after = await orchestrator.query_incidents(status="open", limit=50)
+
+    lag_ms = np.percentile(np.asarray(lag) * 1000, [50, 99])
+    print(f"persisted incidents:     {count:,} (about a quarter closed)")
+    print(f"blocking restore:        {blocking.elapsed:>8.2f} s before the first request could be served")
+    print(f"background restore:      {serving.elapsed * 1000:>8.2f} ms to start serving, "
+          f"{progress['elapsed']:.2f} s to load {progress['loaded']:,} ({progress['rate']:,.0f}/s), "
+          f"{progress['skipped']:,} skipped")
+    print(f"lazy lookup:             {lazy.elapsed * 1000:>8.2f} ms for an incident not yet restored "
+          f"({'found' if status else 'missing'}, {progress['lazy']} lazy fetches)")
+    print(f"during restore:          loop lag p50 {lag_ms[0]:.2f} ms p99 {lag_ms[1]:.2f} ms, "
+          f"open-incident page p99 {np.percentile(query_ms, 99) if query_ms else 0:.2f} ms "
+          f"over {len(query_ms)} polls (complete={page['complete']})")
+    print(f"after restore:           first open page has {len(after['incidents'])} incidents, complete={after['complete']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.incidents, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event loop latency with IsolationForest scoring off, inline, and in the process pool
+
+Usage: python bench_model_scoring.py [--seconds S] [--rows N] [--interval MS] [--workers N]
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from _common import Timer, load_service, synthetic_flows
+from model_scoring import ModelScoringExecutor
+
+async def monitor_lag(stop: asyncio.Event, interval: float = 0.001) -> np.ndarray:
+    """Record how late a periodic 1 ms timer fires, in milliseconds"""
+    lags = []
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+    return np.array(lags)
+
+async def scoring_load(mode: str, model, executor, features: np.ndarray, rows: int,
+                       interval: float, seconds: float) -> int:
+    """Submit ``rows``-row scoring requests every ``interval`` seconds"""
+    pending, requests, offset = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        chunk = features[offset:offset + rows]
+        offset = (offset + rows) % (len(features) - rows)
+        if mode == "inline":
+            model.decision_function(chunk)
+        elif mode == "pool":
+            pending.append(executor.score("traffic_anomaly", chunk, "decision_function"))
+        requests += 1
+        await asyncio.sleep(interval)
+    await asyncio.gather(*pending)
+    return requests
+
+async def measure(mode: str, model, executor, features, rows, interval, seconds):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(stop))
+    with Timer() as timer:
+        requests = await scoring_load(mode, model, executor, features, rows, interval, seconds)
+    stop.set()
+    lags = await monitor
+    p50, p99, p999 = np.percentile(lags, [50, 99, 99.9])
+    print(f"scoring {mode:<7}         p50 {p50:>7.2f} ms  p99 {p99:>7.2f} ms  p99.9 {p999:>7.2f} ms  "
+          f"max {lags.max():>7.2f} ms  ({requests * rows / timer.elapsed:,.0f} rows/s)")
+
+async def run(seconds: float, rows: int, interval_ms: float, workers: int):
+    atd = load_service("advanced-threat-detection")
+    batch = atd.FlowBatch.from_records(synthetic_flows(50_000))
+    features = atd.AdvancedThreatDetector._flow_features(batch)
+    model = IsolationForest(n_estimators=100, random_state=42).fit(features[:10_000])
+
+    executor = ModelScoringExecutor(max_workers=workers)
+    executor.publish("traffic_anomaly", model)
+    # Start the workers and load the model before measuring
+    await executor.score("traffic_anomaly", features[:1], "decision_function")
+
+    interval = interval_ms / 1000
+    print(f"requests:                {rows} rows every {interval_ms} ms for {seconds} s")
+    for mode in ("off", "inline", "pool"):
+        await measure(mode, model, executor, features, rows, interval, seconds)
+
+    # Hot reload while requests are in flight; none may be dropped
+    futures = [executor.score("traffic_anomaly", features[i:i + rows], "decision_function")
+               for i in range(0, 20 * rows, rows)]
+    executor.publish("traffic_anomaly", model)
+    futures += [executor.score("traffic_anomaly", features[i:i + rows], "decision_function")
+                for i in range(0, 20 * rows, rows)]
+    results = await asyncio.gather(*futures)
+    assert all(len(result) == rows for result in results)
+    print(f"hot reload:              {len(results)} requests across the swap, none dropped")
+    print(f"micro-batches:           {executor.stats['batches']:,} for {executor.stats['requests']:,} requests")
+    await executor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=256)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(run(args.seconds, args.rows, args.interval, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of per-user models from pickle vs the memory-mapped model store
+
+Usage: python bench_model_store.py [--users N] [--forest-users N] [--lookups N] [--seed S]
+"""
+
+import argparse
+import copy
+import os
+import pickle
+import random
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from _common import Timer
+from model_store import ModelStore
+
+FEATURES = 5
+
+def build_models(users: int, forest_users: int, seed: int):
+    """Per-user scaler and PCA for every user, isolation forests for a subset"""
+    rng = np.random.default_rng(seed)
+    sample = rng.normal(size=(500, FEATURES))
+    scaler_template = StandardScaler().fit(sample)
+    pca_template = PCA(3).fit(sample)
+    forests = [IsolationForest(n_estimators=25, max_samples=64, random_state=i).fit(sample * (1 + i))
+               for i in range(8)]
+
+    models = {}
+    for i in range(users):
+        scaler = copy.copy(scaler_template)
+        scaler.mean_ = rng.normal(size=FEATURES)
+        scaler.scale_ = rng.uniform(0.5, 2.0, size=FEATURES)
+        pca = copy.copy(pca_template)
+        pca.mean_ = rng.normal(size=FEATURES)
+        user_models = {"scaler": scaler, "pca": pca}
+        if i < forest_users:
+            # Distinct objects, as every user has its own forest in practice
+            user_models["isolation_forest"] = copy.deepcopy(forests[i % len(forests)])
+        models[f"user-{i:07d}"] = user_models
+    return models
+
+def run(users: int, forest_users: int, lookups: int, seed: int):
+    with Timer() as build_timer:
+        models = build_models(users, forest_users, seed)
+    root = tempfile.mkdtemp(prefix="bench-model-store-")
+    pickle_path = os.path.join(root, "models.pkl")
+
+    with Timer() as pickle_write:
+        with open(pickle_path, "wb") as f:
+            pickle.dump(models, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    store = ModelStore(os.path.join(root, "store"))
+    with Timer() as store_write:
+        writer = store.writer()
+        for user_id, user_models in models.items():
+            for model in user_models.values():
+                writer.add(user_id, model)
+        writer.commit()
+
+    with Timer() as pickle_load:
+        with open(pickle_path, "rb") as f:
+            pickle.load(f)
+
+    probe_users = random.Random(seed).sample(list(models), min(lookups, users))
+    features = np.random.default_rng(seed).normal(size=(1, FEATURES))
+    with Timer() as store_open:
+        cold = ModelStore(os.path.join(root, "store"))
+        cold.version
+    with Timer() as first_access:
+        for user_id in probe_users:
+            scaled = cold.get("scaler", user_id).transform(features)
+            cold.get("pca", user_id).transform(scaled)
+            forest = cold.get("isolation_forest", user_id)
+            if forest is not None:
+                forest.decision_function(scaled)
+
+    forest_user = "user-0000000"
+    sample = np.random.default_rng(seed + 1).normal(size=(1000, FEATURES))
+    expected = models[forest_user]["isolation_forest"].decision_function(sample)
+    assert np.allclose(cold.get("isolation_forest", forest_user).decision_function(sample), expected)
+
+    store_bytes = sum(os.path.getsize(os.path.join(dirpath, name))
+                      for dirpath, _, names in os.walk(os.path.join(root, "store")) for name in names)
+    print(f"users:                   {users:>12,} ({forest_users:,} with isolation forests, "
+          f"built in {build_timer.elapsed:.1f} s)")
+    print(f"pickle size:             {os.path.getsize(pickle_path) / 1e6:>12.1f} MB "
+          f"(written in {pickle_write.elapsed:.2f} s)")
+    print(f"model store size:        {store_bytes / 1e6:>12.1f} MB (written in {store_write.elapsed:.2f} s)")
+    print(f"pickle cold start:       {pickle_load.elapsed:>12.3f} s (every model unpickled)")
+    print(f"model store open:        {store_open.elapsed * 1000:>12.3f} ms")
+    print(f"first access:            {first_access.elapsed / len(probe_users) * 1e6:>12.1f} us/user "
+          f"({len(probe_users):,} users scored)")
+    shutil.rmtree(root)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--forest-users", type=int, default=2_000)
+    parser.add_argument("--lookups", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.users, args.forest_users, args.lookups, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: create_incident latency with notifications to a slow mail server, inline smtplib vs queued dispatch
+
+Usage: python bench_notifications.py [--incidents N] [--rate R] [--smtp-delay S] [--seed S]
+"""
+
+import argparse
+import asyncio
+import random
+import smtplib
+import threading
+from email.mime.text import MIMEText
+
+import fakeredis.aioredis
+import numpy as np
+
+from _common import Timer, load_service
+from notification_sinks import MockSMTPServer, MockWebhookServer
+from redis_write_behind import RedisWriteBehind
+
+class SinkThread:
+    """Runs the mock servers on their own event loop, like real remote servers"""
+
+    def __init__(self, smtp_delay: float, webhook_delay: float):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.smtp = self._run(MockSMTPServer(delay=smtp_delay).start())
+        self.webhook = self._run(MockWebhookServer(delay=webhook_delay).start())
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self._run(self.smtp.close())
+        self._run(self.webhook.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+def percentiles(samples):
+    return np.percentile(np.asarray(samples) * 1000, [50, 99, 100]) if samples else np.zeros(3)
+
+def severity_for(iro, rng: random.Random):
+    roll = rng.random()
+    if roll < 0.03:
+        return iro.IncidentSeverity.P1_CRITICAL
+    if roll < 0.10:
+        return iro.IncidentSeverity.P2_HIGH
+    return iro.IncidentSeverity.P3_MEDIUM if roll < 0.5 else iro.IncidentSeverity.P4_LOW
+
+async def create(orchestrator, iro, i: int, severity):
+    return await orchestrator.create_incident(
+        title=f"Suspicious activity on host {i}", description="Benchmark incident", severity=severity,
+        source_system="bench", affected_assets=[f"host:bench-{i}"], indicators=[f"hash:{i:064x}"],
+        evidence={"threat_category": "malware"}
+    )
+
+async def run(incidents: int, rate: float, smtp_delay: float, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("WARNING")
+    sinks = SinkThread(smtp_delay, webhook_delay=0.005)
+    rng = random.Random(seed)
+
+    # Inline: the old approach, one blocking SMTP session per urgent incident
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_writer = RedisWriteBehind(fakeredis.aioredis.FakeRedis())
+    inline_latency = []
+    for i in range(min(incidents, 50)):
+        severity = severity_for(iro, rng)
+        with Timer() as timer:
+            incident = await create(orchestrator, iro, i, severity)
+            if severity.value <= 2:
+                message = MIMEText(incident.description)
+                message["Subject"] = incident.title
+                with smtplib.SMTP("127.0.0.1", sinks.smtp.port) as smtp:
+                    smtp.send_message(message, "xorb@example.com", ["soc@example.com"])
+        inline_latency.append(timer.elapsed)
+        await asyncio.sleep(1 / rate)
+    await orchestrator.shutdown()
+
+    # Queued: per-channel queues over pooled connections, digests for P3/P4
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_writer = RedisWriteBehind(fakeredis.aioredis.FakeRedis())
+    orchestrator.notification_channels = {
+        "soc-email": {"type": "email", "smtp_host": "127.0.0.1", "smtp_port": sinks.smtp.port,
+                      "sender": "xorb@example.com", "recipients": ["soc@example.com"],
+                      "concurrency": 4, "digest_interval": 2.0},
+        "chat": {"type": "webhook", "url": sinks.webhook.url("chat"), "concurrency": 8,
+                 "digest_interval": 2.0}
+    }
+    orchestrator.notifier.configure(orchestrator.notification_channels)
+    queued_latency = []
+    rng = random.Random(seed)
+    with Timer() as total:
+        for i in range(incidents):
+            severity = severity_for(iro, rng)
+            with Timer() as timer:
+                await create(orchestrator, iro, i, severity)
+            queued_latency.append(timer.elapsed)
+            await asyncio.sleep(1 / rate)
+    channels = orchestrator.notifier.channels
+    delivery = {name: percentiles(list(channel.delivery_latency)) for name, channel in channels.items()}
+    stats = orchestrator.notifier.metrics()
+    smtp_connections = next(iter(orchestrator.notifier._smtp_pools.values())).stats["connections"]
+    with Timer() as drain:
+        await orchestrator.shutdown()
+    sinks.close()
+
+    inline = percentiles(inline_latency)
+    queued = percentiles(queued_latency)
+    print(f"incidents:               {incidents:,} at {rate:,.0f}/s, 10% P1/P2, mail server takes "
+          f"{smtp_delay * 1000:.0f} ms per message")
+    print(f"create_incident latency  {'p50':>9}{'p99':>10}{'max':>10}")
+    print(f"  inline smtplib         {inline[0]:>7.2f}ms{inline[1]:>8.2f}ms{inline[2]:>8.2f}ms  (first {len(inline_latency)} incidents)")
+    print(f"  queued dispatch        {queued[0]:>7.2f}ms{queued[1]:>8.2f}ms{queued[2]:>8.2f}ms")
+    for name in ("soc-email", "chat"):
+        s = stats[name]
+        print(f"  {name:<10} sent {s['sent']:>4} individually, {s['digested']:>5} in {s['digests']} digests, "
+              f"dropped {s['dropped']}, delivery p50 {delivery[name][0]:,.0f} ms p99 {delivery[name][1]:,.0f} ms")
+    print(f"smtp connections:        {smtp_connections} for {len(sinks.smtp.messages)} messages "
+          f"(inline opened one per message)")
+    print(f"webhook requests:        {len(sinks.webhook.requests)}; shutdown drain {drain.elapsed:.2f} s "
+          f"after {total.elapsed:.2f} s of load")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200.0)
+    parser.add_argument("--smtp-delay", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.incidents, args.rate, args.smtp_delay, args.seed))
+
+if __name__ == "__main__":
+    main()
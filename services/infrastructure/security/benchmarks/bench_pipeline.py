@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: burst through the ingest -> detect -> incident -> respond pipeline with shedding
+
+Usage: python bench_pipeline.py [--chunks N] [--chunk-size N] [--respond-ms MS] [--seed S]
+"""
+
+import argparse
+import asyncio
+import resource
+import tempfile
+from pathlib import Path
+
+import fakeredis.aioredis
+
+from _common import Timer, load_service, synthetic_flows
+from redis_write_behind import RedisWriteBehind
+from security_pipeline import ThreatResponsePipeline
+
+async def run(chunks: int, chunk_size: int, respond_ms: float, seed: int):
+    atd = load_service("advanced-threat-detection")
+    iro = load_service("incident-response-orchestrator")
+    flows = synthetic_flows(chunks * chunk_size, seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = atd.AdvancedThreatDetector(db_path=str(Path(tmp) / "bench.db"))
+        await detector._load_detection_rules()
+        # Make backdoor-port traffic critical so every priority is exercised
+        for rule in detector.detection_rules:
+            if rule["rule_id"] == "known-backdoor-port":
+                rule["threat_level"] = atd.ThreatLevel.CRITICAL
+
+        # No aggregation, so every threat becomes an incident and the respond stage overloads
+        orchestrator = iro.IncidentResponseOrchestrator(aggregation_window=0.0)
+        orchestrator.redis_writer = RedisWriteBehind(fakeredis.aioredis.FakeRedis())
+        await orchestrator.redis_writer.start()
+
+        async def slow_containment(incident, target):
+            await asyncio.sleep(respond_ms / 1000)
+
+        orchestrator.response_handlers[iro.ResponseAction.BLOCK_IP] = slow_containment
+        # Leave the respond stage's concurrency as the only limit
+        orchestrator.playbook_engine.policies[iro.ResponseAction.BLOCK_IP] = iro.ActionPolicy(concurrency=64)
+        for severity in iro.IncidentSeverity:
+            orchestrator.response_playbooks[severity.name] = [iro.ResponseAction.BLOCK_IP]
+
+        pipeline = ThreatResponsePipeline(detector, orchestrator, atd.FlowBatch, iro.IncidentSeverity, respond_queue=200)
+        await pipeline.start()
+        with Timer() as submit_timer:
+            for i in range(chunks):
+                await pipeline.submit(flows[i * chunk_size:(i + 1) * chunk_size])
+        with Timer() as drain_timer:
+            await pipeline.stop()
+
+        await orchestrator.redis_writer.close()
+        await detector.event_store.aclose()
+
+    print(f"burst:                   {chunks:,} chunks x {chunk_size:,} flows, "
+          f"responses take {respond_ms} ms ({pipeline.stages[-1].concurrency} concurrent)")
+    print(f"submit / drain:          {submit_timer.elapsed:.2f} s / {drain_timer.elapsed:.2f} s")
+    print(f"{'stage':<10}{'max depth':>10}{'processed':>11}{'dropped by priority':>24}"
+          f"{'wait p50':>10}{'wait p99':>10}")
+    for snapshot in pipeline.metrics():
+        dropped = ", ".join(f"{p}:{n}" for p, n in sorted(snapshot["dropped"].items())) or "-"
+        print(f"{snapshot['stage']:<10}{snapshot['max_depth']:>10,}{snapshot['processed']:>11,}{dropped:>24}"
+              f"{snapshot['queue_wait']['p50_ms']:>8.1f}ms{snapshot['queue_wait']['p99_ms']:>8.1f}ms")
+    critical_dropped = sum(s["dropped"].get(4, 0) for s in pipeline.metrics())
+    print(f"critical dropped:        {critical_dropped}")
+    print(f"peak RSS:                {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB")
+    assert critical_dropped == 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--respond-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.chunks, args.chunk_size, args.respond_ms, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: containment time for a wide incident, sequential handlers vs the playbook engine
+
+Usage: python bench_playbook.py [--hosts N] [--latency-ms MS] [--failure-rate F] [--seed S]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from _common import Timer, load_service
+from playbook_engine import PlaybookStep
+
+class MockAPI:
+    """Downstream API with fixed latency and transient failures, tracking its peak load"""
+
+    def __init__(self, latency: float, failure_rate: float, rng: random.Random):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.calls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __call__(self, incident, target=None):
+        self.calls.append(time.perf_counter())
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.rng.random() < self.failure_rate:
+                raise ConnectionError("503 Service Unavailable")
+        finally:
+            self.in_flight -= 1
+
+    def peak_rate(self) -> int:
+        """Most calls started within any one-second span"""
+        peak, start = 0, 0
+        for end, stamp in enumerate(self.calls):
+            while stamp - self.calls[start] >= 1.0:
+                start += 1
+            peak = max(peak, end - start + 1)
+        return peak
+
+def make_incident(iro, hosts: int):
+    now = datetime.utcnow()
+    return iro.SecurityIncident(
+        incident_id="bench", title="Worm outbreak", description="", severity=iro.IncidentSeverity.P1_CRITICAL,
+        status=iro.IncidentStatus.OPEN, created_at=now, updated_at=now, source_system="bench",
+        affected_assets=[f"host:10.0.{h >> 8}.{h & 255}" for h in range(hosts)],
+        indicators=[f"ip:203.0.{h >> 8}.{h & 255}" for h in range(hosts)],
+        evidence={}
+    )
+
+async def run(hosts: int, latency: float, failure_rate: float, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("CRITICAL")
+    A = iro.ResponseAction
+    rng = random.Random(seed)
+
+    # Sequential baseline: one call after another, as the handlers used to run
+    edr, firewall = MockAPI(latency, 0.0, rng), MockAPI(latency, 0.0, rng)
+    incident = make_incident(iro, hosts)
+    with Timer() as sequential:
+        for host in iro.IncidentResponseOrchestrator._response_targets(A.ISOLATE_HOST, incident):
+            await edr(incident, host)
+        for address in iro.IncidentResponseOrchestrator._response_targets(A.BLOCK_IP, incident):
+            await firewall(incident, address)
+
+    orchestrator = iro.IncidentResponseOrchestrator()
+    edr, firewall, soc = (MockAPI(latency, failure_rate, rng), MockAPI(latency, failure_rate, rng),
+                          MockAPI(latency, 0.0, rng))
+    orchestrator.response_handlers.update({A.ISOLATE_HOST: edr, A.BLOCK_IP: firewall, A.ESCALATE_TO_SOC: soc})
+    for policy in orchestrator.playbook_engine.policies.values():
+        policy.retry_base = 0.05
+    orchestrator.response_playbooks["P1_CRITICAL"] = [
+        A.ISOLATE_HOST, A.BLOCK_IP,
+        PlaybookStep(A.ESCALATE_TO_SOC, depends_on=(A.ISOLATE_HOST, A.BLOCK_IP))
+    ]
+    incident = make_incident(iro, hosts)
+    with Timer() as engine:
+        await orchestrator.trigger_automated_response(incident)
+    with Timer() as repeat:
+        await orchestrator.trigger_automated_response(incident)
+    stats = orchestrator.playbook_engine.stats
+
+    print(f"incident:                {hosts:,} hosts to isolate, {hosts:,} addresses to block, "
+          f"{latency * 1000:.0f} ms per call, {failure_rate:.0%} transient failures")
+    print(f"sequential handlers:     {sequential.elapsed:>8.2f} s")
+    print(f"playbook engine:         {engine.elapsed:>8.2f} s, time to containment "
+          f"{incident.evidence.get('time_to_containment', float('nan')):.2f} s, status {incident.status.value}")
+    print(f"repeat run:              {repeat.elapsed * 1000:>8.2f} ms ({stats['duplicates']:,} calls skipped as duplicates)")
+    print(f"calls / retries / failed:{stats['calls']:>8,} / {stats['retries']:,} / {stats['failed']:,}")
+    for name, api, action in (("EDR", edr, A.ISOLATE_HOST), ("firewall", firewall, A.BLOCK_IP)):
+        policy = orchestrator.playbook_engine.policy(action)
+        print(f"  {name:<9} peak {api.peak_in_flight:>3} in flight (limit {policy.concurrency}), "
+              f"peak {api.peak_rate():>4} calls/s (limit {policy.rate:.0f} + burst {policy.burst})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.hosts, args.latency_ms / 1000, args.failure_rate, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: compiled policy decision table vs linear policy scan in ZeroTrustNetworkController
+
+Usage: python bench_policy_table.py [--policies N] [--checks N] [--seed S]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime
+
+from _common import Timer, load_service
+
+def linear_find_policy(policies, source_zone, dest_zone, port, protocol):
+    """The O(policies) scan the decision table replaces"""
+    for policy in policies:
+        if (policy.source_zone == source_zone and policy.destination_zone == dest_zone
+                and policy.protocol == protocol and port in policy.allowed_ports):
+            return policy
+    return None
+
+async def run(policy_count: int, check_count: int, seed: int):
+    ztn = load_service("zero-trust-network")
+    rng = random.Random(seed)
+    zones = list(ztn.NetworkZone)
+    trust_levels = list(ztn.TrustLevel)
+
+    controller = ztn.ZeroTrustNetworkController()
+    await controller._initialize_network_zones()
+    zone_hosts = {
+        ztn.NetworkZone.DMZ: "172.20.0.",
+        ztn.NetworkZone.INTERNAL: "172.20.10.",
+        ztn.NetworkZone.SECURE: "172.20.20.",
+        ztn.NetworkZone.ADMIN: "172.20.30.",
+        ztn.NetworkZone.ISOLATED: "172.20.99.",
+    }
+
+    with Timer() as compile_timer:
+        for i in range(policy_count):
+            controller.add_policy(ztn.NetworkPolicy(
+                policy_id=f"policy-{i}",
+                source_zone=rng.choice(zones),
+                destination_zone=rng.choice(zones),
+                min_trust_level=rng.choice(trust_levels),
+                allowed_ports=rng.sample(range(1, 20000), rng.randint(1, 8)),
+                protocol=rng.choice(["tcp", "udp"])
+            ))
+
+    for i in range(1000):
+        controller.network_identities[f"entity-{i}"] = ztn.NetworkIdentity(
+            entity_id=f"entity-{i}",
+            ip_address=f"172.20.10.{i % 250}",
+            mac_address="00:00:00:00:00:00",
+            device_fingerprint="bench",
+            trust_level=rng.choice(trust_levels),
+            zone=rng.choice(zones),
+            last_verified=datetime.utcnow()
+        )
+
+    ports = sorted({port for policy in controller.network_policies for port in policy.allowed_ports})
+    checks = [
+        (f"entity-{rng.randrange(1000)}",
+         zone_hosts[rng.choice(zones)] + str(rng.randrange(1, 250)),
+         rng.choice(ports) if rng.random() < 0.5 else rng.randrange(1, 65536),
+         rng.choice(["tcp", "udp"]))
+        for _ in range(check_count)
+    ]
+
+    with Timer() as compiled_timer:
+        granted = sum(controller._evaluate_access(*check)[0] is not None for check in checks)
+
+    sample = checks[:2000]
+    with Timer() as linear_timer:
+        for entity, dest_ip, port, protocol in sample:
+            identity = controller.network_identities[entity]
+            linear_find_policy(controller.network_policies, identity.zone,
+                               controller.zone_map.lookup(dest_ip), port, protocol)
+    for entity, dest_ip, port, protocol in sample:
+        identity = controller.network_identities[entity]
+        expected = linear_find_policy(controller.network_policies, identity.zone,
+                                      controller.zone_map.lookup(dest_ip), port, protocol)
+        assert expected is controller._find_applicable_policy(
+            identity.zone, controller.zone_map.lookup(dest_ip), port, protocol)
+
+    with Timer() as remove_timer:
+        for i in range(0, policy_count, 10):
+            controller.remove_policy(f"policy-{i}")
+    removed = len(range(0, policy_count, 10))
+
+    with Timer() as batch_timer:
+        results = await controller.verify_many(checks[:100_000])
+
+    print(f"policies:                {policy_count:>12,}")
+    print(f"compile (incremental):   {compile_timer.elapsed / policy_count * 1e6:>12.1f} us/policy")
+    print(f"policy removal:          {remove_timer.elapsed / removed * 1e6:>12.1f} us/policy")
+    print(f"compiled decisions:      {check_count / compiled_timer.elapsed:>12,.0f} checks/s "
+          f"({granted:,} of {check_count:,} granted)")
+    print(f"linear scan decisions:   {len(sample) / linear_timer.elapsed:>12,.0f} checks/s")
+    print(f"verify_many incl. sessions: {len(results) / batch_timer.elapsed:>9,.0f} checks/s "
+          f"({sum(results):,} sessions)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--policies", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.policies, args.checks, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential Redis writes vs the pipelined write-behind buffer at several flush windows
+
+Runs against fakeredis by default; pass --redis-url to use a local redis-server.
+
+Usage: python bench_redis_write_behind.py [--writes N] [--rate W] [--producers N] [--redis-url URL]
+
+Producers submit at a steady offered rate (--rate writes/s in total),
+yielding between writes the way services do, so the flusher sees a
+stream rather than one burst. With the default rate every window fills
+well short of max_batch, so pipelines go out on the flush window and
+the run shows what each window costs in submit-to-durable latency.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from _common import Timer
+from redis_write_behind import RedisWriteBehind
+
+def connect(redis_url):
+    if redis_url:
+        import redis.asyncio as redis
+        return redis.from_url(redis_url)
+    import fakeredis.aioredis
+    return fakeredis.aioredis.FakeRedis()
+
+def percentiles(samples):
+    return np.percentile(np.asarray(samples) * 1000, [50, 99, 100]) if samples else np.zeros(3)
+
+async def produce(writer: RedisWriteBehind, prefix: str, count: int, interval: float, payload: str,
+                  latency: list, futures: list):
+    """Submit ``count`` writes one ``interval`` apart, catching up after late wake-ups"""
+    start = time.perf_counter()
+    for i in range(count):
+        delay = start + i * interval - time.perf_counter()
+        await asyncio.sleep(delay if delay > 0 else 0)
+        submitted = time.perf_counter()
+        future = await writer.setex(f"{prefix}:{i}", 600, payload)
+        future.add_done_callback(lambda _, submitted=submitted: latency.append(time.perf_counter() - submitted))
+        futures.append(future)
+
+async def run(writes: int, rate: float, producers: int, redis_url):
+    client = connect(redis_url)
+    payload = json.dumps({"title": "benchmark incident", "severity": 2, "evidence": {"x": 1}})
+
+    sequential_latency = []
+    with Timer() as sequential_timer:
+        for i in range(writes):
+            submitted = time.perf_counter()
+            await client.setex(f"bench:sequential:{i}", 600, payload)
+            sequential_latency.append(time.perf_counter() - submitted)
+
+    per_producer = writes // producers
+    results = []
+    for flush_ms in (1, 10, 100):
+        writer = RedisWriteBehind(client, flush_interval=flush_ms / 1000)
+        await writer.start()
+        latency, futures = [], []
+        with Timer() as timer:
+            await asyncio.gather(*[
+                produce(writer, f"bench:{flush_ms}ms:{p}", per_producer, producers / rate, payload, latency, futures)
+                for p in range(producers)
+            ])
+            await asyncio.gather(*futures)
+        await writer.close()
+        results.append((flush_ms, len(futures) / timer.elapsed, writer.stats["pipelines"], percentiles(latency)))
+
+    await client.flushdb()
+    await client.close()
+
+    print(f"writes:                  {writes:>10,} ({'redis-server' if redis_url else 'fakeredis'}), "
+          f"{producers} producers offering {rate:,.0f} writes/s")
+    print(f"{'':<24}{'writes/s':>11}{'pipelines':>11}{'writes/pipe':>13}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    p50, p99, worst = percentiles(sequential_latency)
+    print(f"{'sequential (unpaced)':<24}{writes / sequential_timer.elapsed:>11,.0f}{'':>11}{'':>13}"
+          f"{p50:>9.2f}{p99:>9.2f}{worst:>9.2f}")
+    for flush_ms, throughput, pipelines, (p50, p99, worst) in results:
+        print(f"{f'write-behind {flush_ms} ms':<24}{throughput:>11,.0f}{pipelines:>11,}"
+              f"{per_producer * producers / max(pipelines, 1):>13,.0f}{p50:>9.2f}{p99:>9.2f}{worst:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=20_000)
+    parser.add_argument("--rate", type=float, default=5_000, help="offered writes per second across producers")
+    parser.add_argument("--producers", type=int, default=50)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(run(args.writes, args.rate, args.producers, args.redis_url))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encode/decode throughput and payload size for incidents, threat events and identities, asdict vs generated codecs
+
+Usage: python bench_serialization.py [--records N] [--seed S]
+"""
+
+import argparse
+import json
+import random
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from _common import Timer, load_service
+
+def incidents(iro, count: int, rng: random.Random):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        created = start + timedelta(seconds=i * 7)
+        yield iro.SecurityIncident(
+            incident_id=f"{rng.getrandbits(128):032x}", title=f"Malware beaconing from host {i}",
+            description="Aggregated detections from advanced threat detection",
+            severity=rng.choice(list(iro.IncidentSeverity)), status=rng.choice(list(iro.IncidentStatus)),
+            created_at=created, updated_at=created + timedelta(seconds=rng.randrange(3600)),
+            source_system="advanced_threat_detection",
+            affected_assets=[f"10.0.{i >> 8 & 255}.{i & 255}", f"user:u{rng.randrange(5000)}"],
+            indicators=[f"hash:{rng.getrandbits(256):064x}", f"rule:rule-{i % 40}"],
+            evidence={"threat_category": "malware", "source_ip": f"10.0.{i >> 8 & 255}.{i & 255}",
+                      "alert_count": rng.randrange(1, 50), "confidence": rng.random(),
+                      "max_severity": "P2_HIGH", "time_to_containment": rng.random() * 30},
+            response_actions=["block_ip", "isolate_host"],
+            timeline=[{"timestamp": (created + timedelta(seconds=k)).isoformat(), "event": "alert_merged",
+                       "assets": [f"10.1.0.{k}"], "severity": "P3_MEDIUM"} for k in range(rng.randrange(1, 12))]
+        )
+
+def threat_events(atd, count: int, rng: random.Random):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        yield atd.ThreatEvent(
+            event_id=f"{rng.getrandbits(128):032x}", timestamp=start + timedelta(milliseconds=i * 13),
+            source_ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", target_ip=f"203.0.113.{i % 250}",
+            threat_level=rng.choice(list(atd.ThreatLevel)), category=rng.choice(list(atd.ThreatCategory)),
+            description="Connection to known command and control server",
+            indicators=[f"ip:203.0.113.{i % 250}", f"rule:rule-{i % 40}"], confidence=rng.random(),
+            raw_data={"flow": {"port": 443, "protocol": "tcp", "bytes_transferred": rng.randrange(1 << 20),
+                               "timestamp": 1_767_225_600 + i * 0.013},
+                      "matched_rules": [f"rule-{i % 40}"], "model_scores": [rng.random() for _ in range(4)]}
+        )
+
+def identities(ztn, count: int, rng: random.Random):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        yield ztn.NetworkIdentity(
+            entity_id=f"device-{i:08d}", ip_address=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            mac_address=":".join(f"{rng.randrange(256):02x}" for _ in range(6)),
+            device_fingerprint=f"fp-{rng.getrandbits(64):016x}", trust_level=rng.choice(list(ztn.TrustLevel)),
+            zone=rng.choice(list(ztn.NetworkZone)), last_verified=start + timedelta(seconds=rng.randrange(86400)),
+            cert_thumbprint=f"{rng.getrandbits(160):040x}" if rng.random() < 0.5 else None,
+            risk_score=round(rng.random(), 3)
+        )
+
+def legacy_encoder(enums, datetimes):
+    """The previous to_dict: asdict, then fix up enums and datetimes, then json.dumps"""
+    def encode(record):
+        data = asdict(record)
+        for name in enums:
+            data[name] = getattr(record, name).value
+        for name in datetimes:
+            data[name] = getattr(record, name).isoformat()
+        return json.dumps(data)
+    return encode
+
+def legacy_decoder(cls, enums, datetimes):
+    """The previous from_dict: json.loads, copy, call each Enum, fromisoformat"""
+    def decode(raw):
+        data = dict(json.loads(raw))
+        for name, enum in enums.items():
+            data[name] = enum(data[name])
+        for name in datetimes:
+            data[name] = datetime.fromisoformat(data[name])
+        return cls(**data)
+    return decode
+
+def throughput(call, items) -> float:
+    with Timer() as timer:
+        for item in items:
+            call(item)
+    return len(items) / timer.elapsed
+
+def run(count: int, seed: int):
+    iro = load_service("incident-response-orchestrator")
+    atd = load_service("advanced-threat-detection")
+    ztn = load_service("zero-trust-network")
+    rng = random.Random(seed)
+    cases = [
+        ("SecurityIncident", iro.INCIDENT_CODEC, list(incidents(iro, count, rng)),
+         {"severity": iro.IncidentSeverity, "status": iro.IncidentStatus}, ["created_at", "updated_at"]),
+        ("ThreatEvent", atd.THREAT_EVENT_CODEC, list(threat_events(atd, count, rng)),
+         {"threat_level": atd.ThreatLevel, "category": atd.ThreatCategory}, ["timestamp"]),
+        ("NetworkIdentity", ztn.IDENTITY_CODEC, list(identities(ztn, count, rng)),
+         {"trust_level": ztn.TrustLevel, "zone": ztn.NetworkZone}, ["last_verified"]),
+    ]
+    print(f"records:                 {count:,} of each type")
+    print(f"{'':<25}{'encode/s':>12}{'decode/s':>12}{'bytes':>9}")
+    for name, codec, records, enums, datetimes in cases:
+        legacy_json = [legacy_encoder(enums, datetimes)(record) for record in records]
+        packed = [codec.pack(record) for record in records]
+        assert all(codec.loads(raw) == record for raw, record in zip(packed, records))
+        assert all(codec.loads(raw) == record for raw, record in zip(legacy_json, records))
+        rows = [
+            ("asdict + json", throughput(legacy_encoder(enums, datetimes), records),
+             throughput(legacy_decoder(codec.cls, enums, datetimes), legacy_json), legacy_json),
+            ("codec, JSON", throughput(codec.dumps, records), throughput(codec.loads, legacy_json), legacy_json),
+            ("codec, msgpack", throughput(codec.pack, records), throughput(codec.loads, packed), packed),
+        ]
+        print(name)
+        for label, encode, decode, payloads in rows:
+            size = sum(len(payload) for payload in payloads) / len(payloads)
+            print(f"  {label:<23}{encode:>12,.0f}{decode:>12,.0f}{size:>9,.0f}")
+
+    # Identities in the columnar store are encoded through IdentityView
+    store = ztn.IdentityStore()
+    for record in cases[2][2]:
+        store[record.entity_id] = record
+    views = [store[record.entity_id] for record in cases[2][2]]
+    legacy_view = legacy_encoder(cases[2][3], cases[2][4])
+    print("IdentityView.to_dict")
+    print(f"  {'via NetworkIdentity':<23}{throughput(lambda view: legacy_view(view.to_identity()), views):>12,.0f}")
+    print(f"  {'codec on the view':<23}{throughput(lambda view: json.dumps(view.to_dict()), views):>12,.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.records, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: session token issue and verify rates, JWT + Fernet per token vs SessionTokenManager
+
+Usage: python bench_session_tokens.py [--tokens N] [--presentations N] [--batch N] [--ring N] [--seed S]
+"""
+
+import argparse
+import random
+import uuid
+
+import jwt
+from cryptography.fernet import Fernet
+
+from _common import Timer
+from session_tokens import SessionTokenManager
+
+TTL = 1800
+
+def session_claims(count: int, seed: int):
+    rng = random.Random(seed)
+    return [{
+        "sid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "sub": f"user{rng.randrange(50_000):05d}",
+        "dst": f"172.20.20.{rng.randrange(1, 255)}:{rng.choice([443, 8000, 8443])}",
+        "pol": "internal-to-secure",
+    } for _ in range(count)]
+
+class JwtFernetTokens:
+    """The per-session HS256 JWT wrapped in Fernet that the controller used to issue"""
+
+    def __init__(self):
+        self.key = Fernet.generate_key()
+        self.cipher = Fernet(self.key)
+
+    def issue(self, claims, ttl):
+        token = jwt.encode({**claims, "exp": 1_900_000_000 + ttl}, self.key, algorithm="HS256")
+        return self.cipher.encrypt(token.encode()).decode()
+
+    def verify(self, token):
+        return jwt.decode(self.cipher.decrypt(token.encode()).decode(), self.key, algorithms=["HS256"])
+
+def rate(count: int, timer: Timer) -> str:
+    return f"{count / timer.elapsed:>12,.0f}/s"
+
+def run(args):
+    claims = session_claims(args.tokens, args.seed)
+    rng = random.Random(args.seed)
+    # Connections present their session's token again many times
+    presented = [rng.randrange(args.tokens) for _ in range(args.presentations)]
+    print(f"{args.tokens:,} sessions, {args.presentations:,} presentations, batches of {args.batch}")
+
+    baseline = JwtFernetTokens()
+    with Timer() as timer:
+        old_tokens = [baseline.issue(c, TTL) for c in claims]
+    print(f"{'jwt+fernet issue':<34}{rate(args.tokens, timer)}")
+    with Timer() as timer:
+        for index in presented:
+            baseline.verify(old_tokens[index])
+    print(f"{'jwt+fernet verify':<34}{rate(args.presentations, timer)}")
+
+    manager = SessionTokenManager(ring_size=args.ring)
+    with Timer() as timer:
+        for c in claims:
+            manager.issue(c, TTL)
+    print(f"{'issue':<34}{rate(args.tokens, timer)}")
+    manager = SessionTokenManager(ring_size=args.ring)
+    with Timer() as timer:
+        tokens = manager.issue_many(claims, TTL)
+    print(f"{'issue_many':<34}{rate(args.tokens, timer)}")
+
+    with Timer() as timer:
+        for token in tokens:
+            manager.verify(token)
+    print(f"{'verify, first presentation':<34}{rate(args.tokens, timer)}")
+    with Timer() as timer:
+        for index in presented:
+            manager.verify(tokens[index])
+    print(f"{'verify, cached':<34}{rate(args.presentations, timer)}")
+    stream = [tokens[index] for index in presented]
+    with Timer() as timer:
+        for start in range(0, len(stream), args.batch):
+            manager.verify_many(stream[start:start + args.batch])
+    print(f"{'verify_many, cached':<34}{rate(args.presentations, timer)}")
+
+    # Tokens from every key still on the ring keep verifying from the cache
+    for _ in range(args.ring - 1):
+        manager.rotate()
+    with Timer() as timer:
+        for start in range(0, len(stream), args.batch):
+            results = manager.verify_many(stream[start:start + args.batch])
+    valid = sum(result is not None for result in results)
+    print(f"{f'verify_many after {args.ring - 1} rotations':<34}{rate(args.presentations, timer)}"
+          f"  ({valid}/{len(results)} of the last batch valid)")
+
+    cold = SessionTokenManager(cache_size=1)
+    cold_tokens = cold.issue_many(claims, TTL)
+    with Timer() as timer:
+        for start in range(0, len(cold_tokens), args.batch):
+            cold.verify_many(cold_tokens[start:start + args.batch])
+    print(f"{'verify_many, no cache':<34}{rate(args.tokens, timer)}")
+    print(f"cache: {manager.cached():,} tokens; stats {manager.stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--presentations", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=512)
+    parser.add_argument("--ring", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
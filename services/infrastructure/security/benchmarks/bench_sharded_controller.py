@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: access decision throughput of one controller vs the sharded controller across process counts
+
+Usage: python bench_sharded_controller.py [--identities N] [--checks N] [--shards 1,2,4] [--chunk N]
+                                          [--window N] [--updates N] [--redis URL] [--seed S]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+import corpus
+from _common import Timer, load_service
+from controller_sharding import HashRing
+
+async def drive(verify_many, checks, chunk: int, window: int):
+    """Wall-clock and this process's CPU seconds to verify every check, with up to ``window`` chunks in flight"""
+    slots = asyncio.Semaphore(window)
+
+    async def run(part):
+        async with slots:
+            return await verify_many(part)
+    cpu = time.process_time()
+    with Timer() as timer:
+        await asyncio.gather(*(run(checks[start:start + chunk]) for start in range(0, len(checks), chunk)))
+    return timer.elapsed, time.process_time() - cpu
+
+async def single(ztn, identities, checks, args) -> float:
+    controller = ztn.ZeroTrustNetworkController(redis_url=None)
+    await controller.initialize()
+    await controller.register_identities_bulk(identities)
+    elapsed, _ = await drive(controller.verify_many, checks, args.chunk, 1)
+    await controller.shutdown()
+    return elapsed
+
+async def sharded(ztn, shards: int, identities, checks, args):
+    router = ztn.sharded_controller(shards, redis_url=args.redis, log_level="ERROR")
+    with Timer() as startup:
+        await router.start()
+    await router.register_identities_bulk(identities)
+    elapsed, router_cpu = await drive(router.verify_many, checks, args.chunk, args.window * shards)
+    # Time for a policy edit to reach every shard
+    propagation = []
+    for update in range(args.updates):
+        with Timer() as timer:
+            await router.update_policy("dmz-to-internal", allowed_ports=[80, 443, 8080 + update % 2])
+            await router.wait_for_version()
+        propagation.append(timer.elapsed)
+    stats = await router.stats()
+    await router.close()
+    return elapsed, router_cpu, startup.elapsed, propagation, [shard["identities"] for shard in stats["shards"]]
+
+async def run(args):
+    ztn = load_service("zero-trust-network")
+    logging.getLogger().setLevel(logging.ERROR)
+    identities = corpus.generate_identities(args.identities, args.seed)
+    checks = [(c["source_entity"], c["destination_ip"], c["destination_port"], c["protocol"])
+              for c in corpus.generate_access(args.checks, args.seed, population=args.identities)]
+    print(f"{os.cpu_count()} CPUs, {args.identities:,} identities, {args.checks:,} checks, "
+          f"control snapshots via {'Redis pub/sub' if args.redis else 'shard connections'}")
+
+    base = await single(ztn, identities, checks, args)
+    # With fewer cores than shards the processes share them; the router's
+    # own CPU per check bounds throughput however many cores there are
+    print(f"{'mode':<14}{'checks/s':>11}{'vs single':>11}{'router us':>11}{'router max/s':>14}{'startup s':>11}"
+          f"{'update p50 ms':>15}{'update max ms':>15}{'max/mean ids':>14}")
+    print(f"{'single':<14}{args.checks / base:>11,.0f}{1.0:>10.2f}x")
+    for shards in args.shards:
+        elapsed, router_cpu, startup, propagation, spread = await sharded(ztn, shards, identities, checks, args)
+        print(f"{f'{shards} shards':<14}{args.checks / elapsed:>11,.0f}{base / elapsed:>10.2f}x"
+              f"{router_cpu / args.checks * 1e6:>11.2f}{args.checks / router_cpu:>14,.0f}{startup:>11.2f}"
+              f"{statistics.median(propagation) * 1e3:>15.2f}{max(propagation) * 1e3:>15.2f}"
+              f"{max(spread) / (sum(spread) / len(spread)):>13.2f}x")
+
+    # Identities that change shard when one more shard is added
+    keys = [identity["entity_id"] for identity in identities]
+    for shards in args.shards:
+        before, after = HashRing(range(shards)), HashRing(range(shards + 1))
+        moved = sum(before.owner(key) != after.owner(key) for key in keys) / len(keys)
+        print(f"{shards} -> {shards + 1} shards moves {moved:.1%} of identities (ideal {1 / (shards + 1):.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--identities", type=int, default=50_000)
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--shards", type=lambda value: [int(n) for n in value.split(",")],
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--chunk", type=int, default=4096, help="Checks per verify_many call")
+    parser.add_argument("--window", type=int, default=2, help="Calls in flight per shard")
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--redis", help="Publish control snapshots through this Redis instead")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory of active sessions, threats and incidents over a simulated 30-day soak, unbounded dicts vs expiring maps
+
+Usage: python bench_state_soak.py [--days N] [--baseline-days N] [--sessions-per-min N] [--threats-per-min N]
+                                  [--incident-every-min N] [--max-incidents N] [--max-sessions N] [--seed S]
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import tempfile
+import tracemalloc
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+import fakeredis.aioredis
+
+from _common import Timer, load_service
+from redis_write_behind import RedisWriteBehind
+
+class SimClock:
+    """Simulated monotonic clock advanced by the benchmark"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class PlainDict(dict):
+    """The previous state containers: plain dicts that never drop anything"""
+
+    def set(self, key, value, ttl=None):
+        self[key] = value
+
+    def expire_in(self, key, ttl):
+        pass
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+def state_bytes() -> int:
+    """Traced Python heap, leaving out fakeredis, which stands in for an out-of-process Redis"""
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, "*fakeredis*"), tracemalloc.Filter(False, tracemalloc.__file__)])
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+async def soak(args, days: int, bounded: bool):
+    iro = load_service("incident-response-orchestrator")
+    atd = load_service("advanced-threat-detection")
+    ztn = load_service("zero-trust-network")
+    for module in (iro, atd, ztn):
+        module.logger.setLevel("CRITICAL")
+    rng = random.Random(args.seed)
+    clock = SimClock()
+    client = fakeredis.aioredis.FakeRedis()
+    workdir = tempfile.TemporaryDirectory()
+
+    orchestrator = iro.IncidentResponseOrchestrator(max_active_incidents=args.max_incidents)
+    orchestrator.redis_client = client
+    orchestrator.redis_writer = RedisWriteBehind(client)
+    detector = atd.AdvancedThreatDetector(db_path=f"{workdir.name}/events.db", model_dir=f"{workdir.name}/models")
+    controller = ztn.ZeroTrustNetworkController(max_sessions=args.max_sessions)
+    controller.redis_writer = orchestrator.redis_writer
+    await controller._load_default_policies()
+    policies = [p for p in controller.network_policies if p.allowed_ports]
+    ended = {"expired": 0}
+
+    def session_ended(session, reason):
+        ended[reason] = ended.get(reason, 0) + 1
+    controller.on_session_end = session_ended
+    if bounded:
+        for state in (orchestrator.active_incidents, detector.active_threats, controller.active_sessions):
+            state.clock = clock
+        orchestrator.incident_aggregator.clock = clock
+    else:
+        orchestrator.active_incidents = PlainDict()
+        detector.active_threats = PlainDict()
+        controller.active_sessions = PlainDict()
+
+    # (resolve at, incident id), and (close at, incident id) for resolved ones
+    to_resolve, to_close = deque(), deque()
+    start = datetime(2026, 1, 1)
+    samples = []
+    tracemalloc.start()
+    with Timer() as timer:
+        for minute in range(days * 1440):
+            clock.now = minute * 60.0
+            for _ in range(args.sessions_per_min):
+                policy = rng.choice(policies)
+                await controller._create_network_session(
+                    f"device-{rng.randrange(50_000)}", f"172.20.20.{rng.randrange(1, 255)}",
+                    policy.allowed_ports[0], policy)
+            for _ in range(args.threats_per_min):
+                threat = atd.ThreatEvent(
+                    event_id=str(uuid.UUID(int=rng.getrandbits(128))), timestamp=start + timedelta(minutes=minute),
+                    source_ip=f"10.0.{rng.randrange(256)}.{rng.randrange(256)}", target_ip="203.0.113.7",
+                    threat_level=atd.ThreatLevel.MEDIUM, category=atd.ThreatCategory.MALWARE,
+                    description="Beaconing", indicators=["rule:c2-beacon"], confidence=0.7,
+                    raw_data={"port": 443, "bytes_transferred": rng.randrange(1 << 16)})
+                detector.active_threats[threat.event_id] = threat
+            if minute % args.incident_every_min == 0:
+                incident = await orchestrator.create_incident(
+                    title=f"Beaconing from host {minute}", description="Soak incident",
+                    severity=iro.IncidentSeverity.P3_MEDIUM, source_system="soak",
+                    affected_assets=[f"host:soak-{minute}"], indicators=[f"hash:{minute:064x}"],
+                    evidence={"threat_category": "malware"}, trigger_response=False)
+                # Most are resolved within hours and half of those closed days later;
+                # the rest are left open and forgotten
+                if rng.random() < 0.9:
+                    to_resolve.append((minute + rng.randrange(60, 480), incident.incident_id))
+            while to_resolve and to_resolve[0][0] <= minute:
+                _, incident_id = to_resolve.popleft()
+                await orchestrator.update_incident(incident_id, status=iro.IncidentStatus.RESOLVED)
+                if rng.random() < 0.5:
+                    to_close.append((minute + 3 * 1440, incident_id))
+            while to_close and to_close[0][0] <= minute:
+                await orchestrator.update_incident(to_close.popleft()[1], status=iro.IncidentStatus.CLOSED)
+            if minute % 60 == 0:
+                # Let the write-behind buffer and eviction callbacks run
+                await asyncio.sleep(0)
+            if minute % 1440 == 1439:
+                await orchestrator.redis_writer.flush()
+                samples.append((minute // 1440 + 1, state_bytes(), len(controller.active_sessions),
+                                len(detector.active_threats), len(orchestrator.active_incidents),
+                                await client.dbsize()))
+    tracemalloc.stop()
+    await orchestrator.shutdown()
+    await detector.event_store.aclose()
+    workdir.cleanup()
+    return samples, timer.elapsed, ended["expired"]
+
+async def expired_incident_cache() -> int:
+    """Serialized forms the incident index still caches once its incidents expired with a write pending"""
+    iro = load_service("incident-response-orchestrator")
+    iro.logger.setLevel("CRITICAL")
+    clock = SimClock()
+    client = fakeredis.aioredis.FakeRedis()
+    orchestrator = iro.IncidentResponseOrchestrator(resolved_retention=60.0, persist_delay=3600.0)
+    orchestrator.redis_client = client
+    orchestrator.redis_writer = RedisWriteBehind(client)
+    orchestrator.active_incidents.clock = clock
+    orchestrator.incident_aggregator.clock = clock
+    for host in range(10):
+        alert = dict(title=f"Beaconing from host {host}", description="Soak incident",
+                     severity=iro.IncidentSeverity.P3_MEDIUM, source_system="soak",
+                     affected_assets=[f"host:soak-{host}"], indicators=[f"hash:{host:064x}"],
+                     evidence={"threat_category": "malware"}, trigger_response=False)
+        incident = await orchestrator.create_incident(**alert)
+        # The repeat merges into the incident and defers its write
+        await orchestrator.create_incident(**alert)
+        await orchestrator.update_incident(incident.incident_id, status=iro.IncidentStatus.RESOLVED)
+    clock.now += 120.0
+    orchestrator.active_incidents.expire()
+    await orchestrator.redis_writer.flush()
+    stale = len(orchestrator.incident_index._cache)
+    await orchestrator.shutdown()
+    return stale
+
+def report(label: str, samples, elapsed: float):
+    print(f"{label} ({elapsed:.0f} s wall clock)")
+    print(f"  {'day':>4}{'heap MB':>10}{'sessions':>10}{'threats':>10}{'incidents':>11}{'redis keys':>12}")
+    shown = {1, 2, 3, 5, 10, 15, 20, 25, 30, samples[-1][0]}
+    for day, size, sessions, threats, incidents, keys in samples:
+        if day in shown:
+            print(f"  {day:>4}{size / 1e6:>10.1f}{sessions:>10,}{threats:>10,}{incidents:>11,}{keys:>12,}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--baseline-days", type=int, default=3)
+    parser.add_argument("--sessions-per-min", type=int, default=10)
+    parser.add_argument("--threats-per-min", type=int, default=10)
+    parser.add_argument("--incident-every-min", type=int, default=2)
+    parser.add_argument("--max-incidents", type=int, default=2000)
+    parser.add_argument("--max-sessions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    baseline, baseline_elapsed, _ = asyncio.run(soak(args, args.baseline_days, bounded=False))
+    report("plain dicts", baseline, baseline_elapsed)
+    growth = (baseline[-1][1] - baseline[0][1]) / max(len(baseline) - 1, 1)
+    print(f"  growth {growth / 1e6:.1f} MB/day, about {(baseline[0][1] + growth * (args.days - 1)) / 1e6:,.0f} MB "
+          f"by day {args.days}")
+    bounded, bounded_elapsed, ended = asyncio.run(soak(args, args.days, bounded=True))
+    report("expiring maps", bounded, bounded_elapsed)
+    later = [size for day, size, *_ in bounded if day > 1]
+    print(f"  heap range after day 1: {min(later) / 1e6:.1f} - {max(later) / 1e6:.1f} MB; "
+          f"{ended:,} sessions torn down at expiry")
+    stale = asyncio.run(expired_incident_cache())
+    print(f"  {stale} serialized incidents left cached after their incidents expired")
+    if stale:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: threat event inserts and per-IP queries on the SQLite threat event store
+
+Usage: python bench_threat_event_store.py [--events N] [--batch N] [--ips N] [--seed S]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from _common import Timer
+from threat_event_store import ThreatEventStore
+
+def synthetic_rows(count: int, ips: int, seed: int):
+    rng = random.Random(seed)
+    # Events arrive roughly in time order over the last three days
+    start, step = time.time() - 3 * 86400, 3 * 86400 / count
+    categories = ["intrusion", "malware", "data_exfiltration", "lateral_movement"]
+    payload = json.dumps({"description": "benchmark event", "indicators": ["rule:bench"]})
+    return [
+        (f"{i:016x}", start + (i + rng.random()) * step, f"10.0.{(n := rng.randrange(ips)) >> 8}.{n & 255}",
+         "203.0.113.7", rng.randint(1, 4), rng.choice(categories), rng.random(), payload)
+        for i in range(count)
+    ]
+
+def baseline_inserts(db_path: str, rows) -> float:
+    """The previous path: one connection and transaction per stored event"""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS threat_events (event_id TEXT PRIMARY KEY, timestamp TEXT, "
+                     "source_ip TEXT, target_ip TEXT, threat_level INTEGER, category TEXT, "
+                     "confidence REAL, data TEXT)")
+    with Timer() as timer:
+        for row in rows:
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("INSERT OR REPLACE INTO threat_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+    return len(rows) / timer.elapsed
+
+def run(events: int, batch: int, ips: int, seed: int):
+    root = tempfile.mkdtemp(prefix="bench-event-store-")
+    rows = synthetic_rows(events, ips, seed)
+    baseline_rate = baseline_inserts(os.path.join(root, "baseline.db"), rows[:2000])
+
+    store = ThreatEventStore(os.path.join(root, "events.db"))
+    store.start()
+    # Seed the store so queries have history to search while the insert run goes on
+    store.submit(rows[:events // 2]).result()
+
+    latencies = []
+    stop = threading.Event()
+    query_rng = random.Random(seed + 1)
+
+    def query_loop():
+        while not stop.is_set():
+            n = query_rng.randrange(ips)
+            start = time.perf_counter()
+            store.threats_from_ip(f"10.0.{n >> 8}.{n & 255}", hours=24)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    querier = threading.Thread(target=query_loop)
+    querier.start()
+    remaining = rows[events // 2:]
+    with Timer() as timer:
+        futures = [store.submit(remaining[i:i + batch]) for i in range(0, len(remaining), batch)]
+        for future in futures:
+            future.result()
+    stop.set()
+    querier.join()
+    store.close()
+
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    print(f"events:                  {events:>12,} over 3 days, {ips:,} source IPs")
+    print(f"per-event connection:    {baseline_rate:>12,.0f} inserts/s (previous path)")
+    print(f"writer thread:           {len(remaining) / timer.elapsed:>12,.0f} inserts/s "
+          f"(batches of {batch}, {store.stats['batches']:,} transactions)")
+    print(f"threats_from_ip (24 h):  p50 {p50:.2f} ms, p99 {p99:.2f} ms over {len(latencies):,} "
+          f"queries during inserts")
+    for name in os.listdir(root):
+        os.remove(os.path.join(root, name))
+    os.rmdir(root)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--ips", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.events, args.batch, args.ips, args.seed)
+
+if __name__ == "__main__":
+    main()
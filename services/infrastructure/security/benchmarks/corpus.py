@@ -0,0 +1,254 @@
+"""
+Deterministic synthetic corpora for replaying through the security services
+
+Every generator takes a seed, a start time and an arrival rate and returns
+records in arrival order, so the same arguments always give the same
+corpus. Flows are NumPy columns matching ``FlowBatch``; the other kinds are
+lists of dicts. Corpora are saved as JSONL, or for flows also as ``.npz``
+columns that load without parsing.
+"""
+
+import json
+import random
+from typing import Dict, List, Union
+
+import numpy as np
+
+CORPUS_KINDS = ("flows", "activity", "identities", "access", "alerts")
+
+# 2026-01-01T00:00:00Z
+START = 1_767_225_600.0
+
+FLOW_COLUMNS = {"timestamp": np.float64, "source_ip": np.uint32, "dest_ip": np.uint32, "port": np.int32,
+                "protocol": np.uint8, "bytes_transferred": np.int64}
+PROTOCOLS = {6: "tcp", 17: "udp"}
+
+# Zone subnets and policy ports of the zero trust controller's defaults
+ZONE_PREFIXES = {"dmz": "172.20.0.", "internal": "172.20.10.", "secure": "172.20.20.",
+                 "admin": "172.20.30.", "isolated": "172.20.99."}
+ACCESS_PORTS = [80, 443, 8000, 8001, 5432, 22, 8443, 3389, 445, 25]
+ACCESS_ROUTES = {"dmz": [("internal", [80, 443])],
+                 "internal": [("secure", [8000, 8001, 5432]), ("admin", [22, 8443])]}
+
+ACTIONS = ["login", "read", "write", "query", "download", "upload", "logout"]
+ALERT_CATEGORIES = ["malware", "lateral_movement", "data_exfiltration", "brute_force", "command_and_control"]
+SEVERITIES = ["P4_LOW", "P3_MEDIUM", "P2_HIGH", "P1_CRITICAL"]
+
+Corpus = Union[Dict[str, np.ndarray], List[Dict]]
+
+def _ip(value: int) -> str:
+    return f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+def _arrivals(rng: np.random.Generator, count: int, rate: float, start: float) -> np.ndarray:
+    """Poisson arrival times at ``rate`` per second"""
+    return start + np.cumsum(rng.exponential(1.0 / rate, count))
+
+def threat_indicators(seed: int, count: int = 500) -> List[str]:
+    """External addresses on the threat intelligence feed; flows of the same seed contact some of them"""
+    rng = np.random.default_rng([seed, 1])
+    values = (185 << 24) | rng.integers(0, 1 << 24, count, dtype=np.uint32)
+    return [_ip(int(value)) for value in values]
+
+def generate_flows(count: int, seed: int = 42, rate: float = 2000.0, start: float = START) -> Dict[str, np.ndarray]:
+    """Flow columns: mostly internal hosts on 443, with port sweeps, SMB fan-out,
+    backdoor ports, large transfers and threat-feed destinations mixed in"""
+    rng = np.random.default_rng(seed)
+    span = count / rate
+    parts: List[Dict[str, np.ndarray]] = []
+
+    def part(timestamp, source_ip, dest_ip, port, protocol=6, bytes_transferred=None):
+        n = len(timestamp)
+        if bytes_transferred is None:
+            bytes_transferred = rng.integers(64, 4096, n)
+        parts.append({"timestamp": timestamp, "source_ip": np.broadcast_to(source_ip, n),
+                      "dest_ip": np.broadcast_to(dest_ip, n), "port": np.broadcast_to(port, n),
+                      "protocol": np.broadcast_to(protocol, n), "bytes_transferred": bytes_transferred})
+
+    # About one sweep and one fan-out of 150 and 250 flows per 50,000 flows
+    hosts = (10 << 24) | rng.integers(0, 1 << 16, max(count // 50, 256), dtype=np.uint32)
+    injected = 0
+    for _ in range(count // 50_000):
+        began = start + rng.random() * max(span - 30, 0)
+        part(began + np.sort(rng.random(150)) * 30, rng.choice(hosts), rng.choice(hosts), np.arange(1, 151))
+        part(began + np.sort(rng.random(250)) * 30, rng.choice(hosts),
+             (10 << 24) | rng.integers(0, 1 << 24, 250, dtype=np.uint32), 445)
+        injected += 400
+
+    base = count - injected
+    internal = rng.random(base) < 0.5
+    dest = np.where(internal, (10 << 24) | rng.integers(0, 1 << 24, base, dtype=np.uint32),
+                    rng.integers(11 << 24, 223 << 24, base, dtype=np.uint32))
+    feed = np.array([sum(int(octet) << shift for octet, shift in zip(ip.split("."), (24, 16, 8, 0)))
+                     for ip in threat_indicators(seed)], dtype=np.uint32)
+    flagged = rng.random(base) < 0.0005
+    dest[flagged] = rng.choice(feed, int(flagged.sum()))
+    port = np.where(rng.random(base) < 0.05,
+                    rng.choice(np.array([80, 53, 8080, 22, 23, 445, 3389, 4444, 1337, 5900]), base), 443)
+    size = np.where(rng.random(base) < 0.001, rng.integers(100 << 20, 200 << 20, base),
+                    rng.lognormal(8.0, 1.5, base).astype(np.int64) + 64)
+    part(_arrivals(rng, base, rate, start) if base else np.empty(0), rng.choice(hosts, base), dest, port,
+         np.where(rng.random(base) < 0.9, 6, 17), size)
+
+    columns = {name: np.concatenate([p[name] for p in parts]).astype(dtype) for name, dtype in FLOW_COLUMNS.items()}
+    order = np.argsort(columns["timestamp"], kind="stable")
+    return {name: column[order] for name, column in columns.items()}
+
+def flow_records(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """Flow columns as the record dicts collectors send"""
+    return [{"timestamp": timestamp, "source_ip": _ip(source), "dest_ip": _ip(dest), "port": port,
+             "protocol": PROTOCOLS.get(protocol, "tcp"), "bytes_transferred": size}
+            for timestamp, source, dest, port, protocol, size in zip(
+                *(columns[name].tolist() for name in FLOW_COLUMNS))]
+
+def flow_columns(records: List[Dict]) -> Dict[str, np.ndarray]:
+    codes = {name: code for code, name in PROTOCOLS.items()}
+
+    def ip(value: str) -> int:
+        a, b, c, d = value.split(".")
+        return int(a) << 24 | int(b) << 16 | int(c) << 8 | int(d)
+    return {
+        "timestamp": np.array([r["timestamp"] for r in records], dtype=np.float64),
+        "source_ip": np.array([ip(r["source_ip"]) for r in records], dtype=np.uint32),
+        "dest_ip": np.array([ip(r["dest_ip"]) for r in records], dtype=np.uint32),
+        "port": np.array([r["port"] for r in records], dtype=np.int32),
+        "protocol": np.array([codes.get(r["protocol"], 0) for r in records], dtype=np.uint8),
+        "bytes_transferred": np.array([r["bytes_transferred"] for r in records], dtype=np.int64)
+    }
+
+def generate_activity(count: int, seed: int = 42, rate: float = 200.0, start: float = START) -> List[Dict]:
+    """User activity events: each user keeps to their own hours, actions and
+    resources, with about 1% of events off-hours, on new resources or oversized"""
+    rng = random.Random(seed)
+    times = _arrivals(np.random.default_rng(seed), count, rate, start).tolist()
+    users = []
+    for index in range(max(count // 200, 50)):
+        users.append((f"user{index:05d}", rng.randrange(6, 12), rng.sample(ACTIONS, 3),
+                      [f"/data/team{index % 40}/{name}" for name in rng.sample(range(100), 5)]))
+    events = []
+    for timestamp in times:
+        user_id, first_hour, actions, resources = users[min(int(rng.paretovariate(1.2)) - 1, len(users) - 1)
+                                                        if rng.random() < 0.5 else rng.randrange(len(users))]
+        event = {"arrival": timestamp, "user_id": user_id, "action": rng.choice(actions), "resource": rng.choice(resources),
+                 "bytes_transferred": int(rng.lognormvariate(10, 1)), "duration": rng.uniform(0.1, 30.0)}
+        # Arrival sets the day; the user's working hours set the hour
+        day = timestamp - timestamp % 86400
+        event["timestamp"] = day + (first_hour + rng.random() * 8) * 3600
+        if rng.random() < 0.01:
+            event.update(timestamp=day + rng.randrange(0, 5) * 3600, resource=f"/secrets/{rng.randrange(1000)}",
+                         bytes_transferred=event["bytes_transferred"] * 200)
+        events.append(event)
+    return events
+
+def generate_identities(count: int, seed: int = 42) -> List[Dict]:
+    """Identity records as read by ``read_identity_records``, spread over the default zones"""
+    rng = random.Random(seed)
+    zones = list(ZONE_PREFIXES)
+    weights = [10, 60, 15, 5, 10]
+    records = []
+    for index in range(count):
+        zone = rng.choices(zones, weights)[0]
+        records.append({"entity_id": f"device-{index:07d}", "ip_address": f"{ZONE_PREFIXES[zone]}{index % 254 + 1}",
+                        "mac_address": (0x020000000000 + index).to_bytes(6, "big").hex(":"),
+                        "device_fingerprint": f"fp-{rng.getrandbits(64):016x}", "zone": zone})
+    return records
+
+def generate_access(count: int, seed: int = 42, rate: float = 1000.0, start: float = START,
+                    population: int = 10_000) -> List[Dict]:
+    """Access checks by the identities of ``generate_identities(population, seed)``
+
+    Most checks repeat a recent (entity, destination, port) so decisions are
+    reused as they are in live traffic. New ones mostly follow a default
+    policy route from the entity's zone; the rest go anywhere, and 1% come
+    from unknown entities.
+    """
+    rng = random.Random(seed)
+    times = _arrivals(np.random.default_rng(seed), count, rate, start).tolist()
+    identities = generate_identities(population, seed)
+    zones = list(ZONE_PREFIXES)
+    recent: List[Dict] = []
+    checks = []
+    for timestamp in times:
+        if recent and rng.random() < 0.7:
+            check = dict(recent[rng.randrange(len(recent))], timestamp=timestamp)
+        else:
+            identity = identities[rng.randrange(population)]
+            routes = ACCESS_ROUTES.get(identity["zone"])
+            if routes and rng.random() < 0.6:
+                zone, ports = rng.choice(routes)
+                port = rng.choice(ports)
+            else:
+                zone, port = rng.choice(zones), rng.choice(ACCESS_PORTS)
+            entity = identity["entity_id"] if rng.random() >= 0.01 else f"unknown-{rng.randrange(1 << 20)}"
+            check = {"timestamp": timestamp, "source_entity": entity,
+                     "destination_ip": f"{ZONE_PREFIXES[zone]}{rng.randrange(1, 255)}",
+                     "destination_port": port, "protocol": "tcp"}
+            recent.append(check)
+            if len(recent) > 2000:
+                recent.pop(0)
+        checks.append(check)
+    return checks
+
+def generate_alerts(count: int, seed: int = 42, rate: float = 20.0, start: float = START) -> List[Dict]:
+    """Alerts from several detectors; about a third arrive in storms sharing an
+    indicator, which aggregation should merge into one incident"""
+    rng = random.Random(seed)
+    times = _arrivals(np.random.default_rng(seed), count, rate, start).tolist()
+    alerts = []
+    storm = None
+    for index, timestamp in enumerate(times):
+        if storm is None and rng.random() < 0.02:
+            storm = [rng.randrange(10, 60), rng.choice(ALERT_CATEGORIES),
+                     f"ip:185.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"]
+        host = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        if storm is not None:
+            category, indicators = storm[1], [storm[2]]
+            storm[0] -= 1
+            if storm[0] <= 0:
+                storm = None
+        else:
+            category = rng.choice(ALERT_CATEGORIES)
+            indicators = [f"hash:{rng.getrandbits(128):032x}"]
+        alerts.append({"timestamp": timestamp, "title": f"{category.replace('_', ' ').title()} on {host}",
+                       "severity": rng.choices(SEVERITIES, [40, 35, 20, 5])[0],
+                       "source_system": rng.choice(["ids", "edr", "siem"]), "category": category,
+                       "affected_assets": [f"host:{host}"], "indicators": indicators})
+    return alerts
+
+def generate(kind: str, count: int, seed: int = 42, rate: float = 0.0, population: int = 10_000) -> Corpus:
+    """A corpus of ``kind`` with ``count`` records; a rate of 0 uses the kind's default"""
+    rates = {"flows": generate_flows, "activity": generate_activity, "alerts": generate_alerts}
+    if kind in rates:
+        return rates[kind](count, seed, **({"rate": rate} if rate else {}))
+    if kind == "access":
+        return generate_access(count, seed, population=population, **({"rate": rate} if rate else {}))
+    if kind == "identities":
+        return generate_identities(count, seed)
+    raise ValueError(f"Unknown corpus kind {kind!r}; expected one of {', '.join(CORPUS_KINDS)}")
+
+def save(corpus: Corpus, path: str):
+    """Write a corpus as JSONL, or flow columns as ``.npz``"""
+    if isinstance(corpus, dict):
+        if path.endswith(".npz"):
+            np.savez(path, **corpus)
+            return
+        corpus = flow_records(corpus)
+    elif path.endswith(".npz"):
+        raise ValueError("Only flow corpora can be saved as .npz")
+    with open(path, "w") as out:
+        for record in corpus:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+def load(kind: str, path: str) -> Corpus:
+    """Read a corpus written by ``save`` or exported elsewhere in the same shape"""
+    if path.endswith(".npz"):
+        with np.load(path) as columns:
+            return {name: columns[name].astype(dtype, copy=False) for name, dtype in FLOW_COLUMNS.items()}
+    with open(path) as export:
+        records = [json.loads(line) for line in export if line.strip()]
+    return flow_columns(records) if kind == "flows" else records
+
+def timeline(corpus: Corpus) -> np.ndarray:
+    """Arrival time of each record, for pacing the replay"""
+    if isinstance(corpus, dict):
+        return corpus["timestamp"]
+    return np.array([record.get("arrival", record.get("timestamp", 0.0)) for record in corpus], dtype=np.float64)
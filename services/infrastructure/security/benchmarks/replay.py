@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Replay harness: synthetic or recorded corpora through the security services, with throughput, latency and peak RSS per scenario
+
+Usage: python replay.py generate KIND --count N [--seed S] [--rate R] [--population N] --out PATH
+       python replay.py run [--scenario NAME ...] [--corpus NAME=PATH ...] [--count N] [--seed S] [--speed X]
+                            [--batch N] [--population N] [--redis URL] [--flush] [--respond-ms MS]
+                            [--response-limits] [--json PATH] [--compare PATH] [--tolerance F]
+
+Scenarios replay one corpus each through the real service objects,
+initialized as in production except for the Redis client: ``detect`` sends
+flow batches to ``AdvancedThreatDetector.analyze_network_traffic_batch``,
+``behavior`` scores activity with the detector's behavioral analyzer,
+``access`` checks access with ``ZeroTrustNetworkController`` after a bulk
+identity import, and ``incidents`` opens and merges incidents with
+``IncidentResponseOrchestrator``, running no-op response playbooks for P1
+and P2 alerts (without the default rate limits unless ``--response-limits``).
+
+Corpora are generated from ``--seed`` unless given with ``--corpus``
+(files from ``generate``, JSONL, or ``.npz`` for flows). ``--speed 0``
+replays as fast as the services go; ``--speed X`` replays X times faster
+than the corpus timestamps and measures latency from each record's
+scheduled time, so a stall counts against every record delayed by it.
+Either way the services' TTLs and windows follow corpus time. Each
+scenario runs in a fresh process so its peak RSS is its own.
+
+``--redis fakeredis`` (the default) keeps everything in process; a URL
+such as ``redis://localhost:6379/15`` uses a real server, and ``--flush``
+empties that database first. ``--json`` writes the results with the
+settings and environment, and ``--compare`` checks them against an
+earlier file, exiting with status 1 when throughput, p99 latency or peak
+RSS is worse by more than ``--tolerance``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import corpus
+from _common import SERVICE_DIR, load_service
+from service_metrics import LatencyHistogram
+
+# Scenario -> corpus kind it replays
+SCENARIOS = {"detect": "flows", "behavior": "activity", "access": "access", "incidents": "alerts"}
+RESULT_FORMAT = 1
+
+class ReplayClock:
+    """Corpus time, installed as the clock of the services' expiring state"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def peak_rss_mb() -> float:
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+async def connect(url: str, flush: bool):
+    if url == "fakeredis":
+        import fakeredis.aioredis
+        return fakeredis.aioredis.FakeRedis()
+    import redis.asyncio as redis
+    client = redis.from_url(url)
+    if flush:
+        await client.flushdb()
+    return client
+
+async def detect(data: corpus.Corpus, args, client, clock: ReplayClock, workdir: str):
+    atd = load_service("advanced-threat-detection")
+    await client.sadd("threat_intelligence:indicators", *corpus.threat_indicators(args.seed))
+    detector = atd.AdvancedThreatDetector(db_path=f"{workdir}/events.db", model_dir=f"{workdir}/models")
+    detector.redis_client = client
+    await detector.initialize()
+    # Keep the background ML warm-up out of the measured replay
+    await detector.wait_until_warm()
+    detector.active_threats.clock = clock
+    valid = np.ones(len(data["timestamp"]), dtype=bool)
+    threats = 0
+
+    async def step(start: int, end: int):
+        nonlocal threats
+        batch = atd.FlowBatch(**{name: column[start:end] for name, column in data.items()},
+                              source_valid=valid[start:end], dest_valid=valid[start:end])
+        threats += len(await detector.analyze_network_traffic_batch(batch))
+
+    async def finish() -> Dict[str, Any]:
+        await detector.redis_writer.flush()
+        return {"threats": threats, "active_threats": len(detector.active_threats)}
+    return step, finish, detector.shutdown
+
+async def behavior(data: corpus.Corpus, args, client, clock: ReplayClock, workdir: str):
+    atd = load_service("advanced-threat-detection")
+    detector = atd.AdvancedThreatDetector(db_path=f"{workdir}/events.db", model_dir=f"{workdir}/models")
+    detector.redis_client = client
+    await detector.initialize()
+    # Keep the background ML warm-up out of the measured replay
+    await detector.wait_until_warm()
+    analyzer = detector.behavioral_analyzer
+    anomalous = 0
+
+    async def step(start: int, end: int):
+        nonlocal anomalous
+        for event in data[start:end]:
+            score, findings = analyzer.analyze_event(event["user_id"], event)
+            if findings:
+                anomalous += 1
+
+    async def finish() -> Dict[str, Any]:
+        return {"anomalous_events": anomalous, "profiles": len(analyzer.user_profiles)}
+    return step, finish, detector.shutdown
+
+async def access(data: corpus.Corpus, args, client, clock: ReplayClock, workdir: str):
+    ztn = load_service("zero-trust-network")
+    controller = ztn.ZeroTrustNetworkController()
+    controller.redis_client = client
+    await controller.initialize()
+    controller.active_sessions.clock = clock
+    identities = (corpus.load("identities", args.corpus["identities"]) if "identities" in args.corpus
+                  else corpus.generate_identities(args.population, args.seed))
+    await controller.register_identities_bulk(identities)
+    granted = 0
+
+    async def step(start: int, end: int):
+        nonlocal granted
+        for check in data[start:end]:
+            if await controller.verify_network_access(check["source_entity"], check["destination_ip"],
+                                                      check["destination_port"], check["protocol"]):
+                granted += 1
+
+    async def finish() -> Dict[str, Any]:
+        await controller.redis_writer.flush()
+        cache = controller.decision_cache.stats()
+        lookups = cache["hits"] + cache["misses"]
+        return {"identities": len(identities), "granted": granted, "denied": len(data) - granted,
+                "decision_cache_hit_rate": round(cache["hits"] / lookups, 4) if lookups else 0.0,
+                "active_sessions": len(controller.active_sessions)}
+    return step, finish, controller.shutdown
+
+async def incidents(data: corpus.Corpus, args, client, clock: ReplayClock, workdir: str):
+    iro = load_service("incident-response-orchestrator")
+    orchestrator = iro.IncidentResponseOrchestrator()
+    orchestrator.redis_client = client
+    await orchestrator.initialize()
+    orchestrator.active_incidents.clock = clock
+    orchestrator.incident_aggregator.clock = clock
+
+    async def respond(incident, target=None):
+        if args.respond_ms:
+            await asyncio.sleep(args.respond_ms / 1000)
+    for action in (iro.ResponseAction.ISOLATE_HOST, iro.ResponseAction.BLOCK_IP):
+        orchestrator.response_handlers[action] = respond
+    orchestrator.response_playbooks = {"P1_CRITICAL": [iro.ResponseAction.ISOLATE_HOST, iro.ResponseAction.BLOCK_IP],
+                                       "P2_HIGH": [iro.ResponseAction.BLOCK_IP]}
+    if not args.response_limits:
+        # The production rate limits protect real APIs; unpaced, they would be all we measured
+        orchestrator.playbook_engine.policies = {}
+    opened = set()
+
+    async def step(start: int, end: int):
+        for alert in data[start:end]:
+            incident = await orchestrator.create_incident(
+                title=alert["title"], description="Replayed alert", severity=iro.IncidentSeverity[alert["severity"]],
+                source_system=alert["source_system"], affected_assets=alert["affected_assets"],
+                indicators=alert["indicators"], evidence={"threat_category": alert["category"]})
+            opened.add(incident.incident_id)
+
+    async def finish() -> Dict[str, Any]:
+        await orchestrator.flush_incidents()
+        await orchestrator.redis_writer.flush()
+        return {"incidents": len(opened), "merged_alerts": len(data) - len(opened),
+                "active_incidents": len(orchestrator.active_incidents),
+                "response_calls": orchestrator.playbook_engine.stats["calls"]}
+    return step, finish, orchestrator.shutdown
+
+SETUP = {"detect": detect, "behavior": behavior, "access": access, "incidents": incidents}
+
+async def replay(times: np.ndarray, batch: int, speed: float, clock: ReplayClock,
+                 step: Callable) -> Tuple[LatencyHistogram, float]:
+    """Feed records to ``step`` in batches, paced by ``speed``; returns latencies and elapsed seconds
+
+    Unpaced, latency is the time ``step`` takes. Paced, a batch is due when
+    its last record arrives and latency runs from then, including any time
+    it waited behind earlier batches.
+    """
+    latencies = LatencyHistogram()
+    count = len(times)
+    first = float(times[0]) if count else 0.0
+    began = time.perf_counter()
+    for start in range(0, count, batch):
+        end = min(start + batch, count)
+        clock.now = float(times[end - 1])
+        if speed > 0:
+            due = began + (clock.now - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            due = time.perf_counter()
+        await step(start, end)
+        latencies.record(time.perf_counter() - due)
+        if not speed and start % (batch * 64) == 0:
+            # Let the write-behind flusher and other background tasks run
+            await asyncio.sleep(0)
+    return latencies, time.perf_counter() - began
+
+async def run_scenario_async(name: str, args) -> Dict[str, Any]:
+    kind = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as workdir:
+        data = (corpus.load(kind, args.corpus[kind]) if kind in args.corpus
+                else corpus.generate(kind, args.count, args.seed, population=args.population))
+        times = corpus.timeline(data)
+        records = len(times)
+        client = await connect(args.redis, args.flush)
+        clock = ReplayClock(float(times[0]) if records else 0.0)
+        setup_began = time.perf_counter()
+        step, finish, shutdown = await SETUP[name](data, args, client, clock, workdir)
+        setup = time.perf_counter() - setup_began
+        setup_rss = peak_rss_mb()
+
+        batch = args.batch if name == "detect" else 1
+        latencies, elapsed = await replay(times, batch, args.speed, clock, step)
+        # Pending Redis writes are part of the work
+        drain_began = time.perf_counter()
+        detail = await finish()
+        elapsed += time.perf_counter() - drain_began
+        await shutdown()
+        summary = latencies.summary()
+        return {
+            "corpus": args.corpus.get(kind, f"generated:{kind}"),
+            "records": records,
+            "calls": latencies.count,
+            "batch": batch,
+            "elapsed_s": round(elapsed, 4),
+            "throughput_per_s": round(records / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {"mean": summary["mean"] * 1e3, "p50": summary["p50"] * 1e3,
+                           "p99": summary["p99"] * 1e3, "p999": summary["p99.9"] * 1e3,
+                           "max": summary["max"] * 1e3},
+            "corpus_span_s": round(float(times[-1] - times[0]), 3) if records else 0.0,
+            "setup_s": round(setup, 4),
+            "setup_rss_mb": round(setup_rss, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "detail": detail
+        }
+
+def run_scenario(name: str, args) -> Dict[str, Any]:
+    """Entry point of the per-scenario process"""
+    # Service loggers at INFO as deployed, writing to a discarded stream
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), force=True)
+    return asyncio.run(run_scenario_async(name, args))
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of ``results`` against a baseline results file"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        checks = [("throughput", before["throughput_per_s"], result["throughput_per_s"], False),
+                  ("p99 latency", before["latency_ms"]["p99"], result["latency_ms"]["p99"], True),
+                  ("peak RSS", before["peak_rss_mb"], result["peak_rss_mb"], True)]
+        for metric, old, new, lower_is_better in checks:
+            if not old:
+                continue
+            change = new / old - 1
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append(f"{name}: {metric} {old:,.3f} -> {new:,.3f} ({change:+.1%})")
+    return regressions
+
+def generate_command(args):
+    data = corpus.generate(args.kind, args.count, args.seed, args.rate, args.population)
+    corpus.save(data, args.out)
+    print(f"wrote {args.count:,} {args.kind} records to {args.out}")
+
+def run_command(args) -> int:
+    args.corpus = dict(item.split("=", 1) for item in args.corpus)
+    names = args.scenario or list(SCENARIOS)
+    print(f"{'scenario':<11}{'records':>10}{'records/s':>12}{'p50 ms':>9}{'p99 ms':>9}{'p999 ms':>9}"
+          f"{'max ms':>9}{'peak RSS MB':>13}")
+    results = {}
+    for name in names:
+        # A fresh interpreter per scenario, so ru_maxrss is that scenario's peak
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            result = results[name] = pool.submit(run_scenario, name, args).result()
+        latency = result["latency_ms"]
+        print(f"{name:<11}{result['records']:>10,}{result['throughput_per_s']:>12,.0f}{latency['p50']:>9.3f}"
+              f"{latency['p99']:>9.3f}{latency['p999']:>9.3f}{latency['max']:>9.2f}{result['peak_rss_mb']:>13.1f}")
+
+    report = {
+        "format": RESULT_FORMAT,
+        "created": datetime.utcnow().isoformat(),
+        "revision": revision(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "numpy": np.__version__},
+        "settings": {"count": args.count, "seed": args.seed, "speed": args.speed, "batch": args.batch,
+                     "population": args.population, "respond_ms": args.respond_ms,
+                     "response_limits": args.response_limits,
+                     "redis": "fakeredis" if args.redis == "fakeredis" else "server", "corpus": args.corpus},
+        "scenarios": results
+    }
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"wrote results to {args.json}")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("settings") != report["settings"]:
+            print("warning: baseline was recorded with different settings")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic corpus to a file")
+    generate.add_argument("kind", choices=corpus.CORPUS_KINDS)
+    generate.add_argument("--count", type=int, default=100_000)
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--rate", type=float, default=0.0, help="Records per second of corpus time")
+    generate.add_argument("--population", type=int, default=10_000, help="Identities that access checks draw on")
+    generate.add_argument("--out", required=True, help=".jsonl, or .npz for flows")
+
+    run = commands.add_parser("run", help="Replay corpora through the services")
+    run.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    run.add_argument("--corpus", action="append", default=[], metavar="KIND=PATH",
+                     help="Replay a file instead of a generated corpus; identities=PATH sets the access population")
+    run.add_argument("--count", type=int, default=100_000, help="Records per generated corpus")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--speed", type=float, default=0.0, help="Times faster than corpus time; 0 for unpaced")
+    run.add_argument("--batch", type=int, default=1000, help="Flows per analyzed batch")
+    run.add_argument("--population", type=int, default=10_000, help="Generated identities for the access scenario")
+    run.add_argument("--redis", default="fakeredis", help="fakeredis or a redis:// URL")
+    run.add_argument("--flush", action="store_true", help="FLUSHDB the Redis database before each scenario")
+    run.add_argument("--respond-ms", type=float, default=0.0, help="Simulated latency of each response action")
+    run.add_argument("--response-limits", action="store_true",
+                     help="Keep the default per-action rate limits of the response playbooks")
+    run.add_argument("--json", help="Write machine-readable results here")
+    run.add_argument("--compare", help="Results file to check for regressions against")
+    run.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_command(args)
+    else:
+        sys.exit(run_command(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+XORB Controller Sharding
+Consistent-hash partitioning of controller state over worker processes, with versioned control snapshots
+"""
+
+import asyncio
+import bisect
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+import sys
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTROL_CHANNEL = "zero_trust:control"
+CONTROL_SNAPSHOT_KEY = "zero_trust:control:snapshot"
+
+_FRAME_HEADER = struct.Struct("!I")
+
+Check = Tuple[str, str, int, str]
+
+class HashRing:
+    """Consistent hash ring with virtual nodes
+
+    Each node owns ``vnodes`` points on a 64-bit ring and a key belongs to
+    the first point at or after its hash, so adding or removing one of n
+    nodes moves about 1/n of the keys. Keys hash with BLAKE2b, which is the
+    same in every process, unlike ``hash()``. Owners are memoized per key
+    up to ``cache_size`` keys.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), vnodes: int = 64, cache_size: int = 1 << 20):
+        self.vnodes = vnodes
+        self.cache_size = cache_size
+        self.nodes: List[int] = []
+        self._points: List[int] = []
+        self._owners: List[int] = []
+        self._cache: Dict[str, int] = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def _rebuild(self):
+        ring = sorted((self.hash_key(f"{node}#{replica}"), node)
+                      for node in self.nodes for replica in range(self.vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+        self._cache.clear()
+
+    def add(self, node: int):
+        if node not in self.nodes:
+            self.nodes.append(node)
+            self._rebuild()
+
+    def remove(self, node: int):
+        if node in self.nodes:
+            self.nodes.remove(node)
+            self._rebuild()
+
+    def owner(self, key: str) -> int:
+        node = self._cache.get(key)
+        if node is None:
+            if not self._points:
+                raise LookupError("Hash ring has no nodes")
+            index = bisect.bisect_left(self._points, self.hash_key(key))
+            node = self._owners[index if index < len(self._points) else 0]
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = node
+        return node
+
+def _policy_dict(policy: Any) -> Dict:
+    data = policy.to_dict() if hasattr(policy, "to_dict") else dict(policy)
+    return {name: value.value if isinstance(value, Enum) else value for name, value in data.items()}
+
+class ControlPlane:
+    """Authoritative policies and indicator feed, published to shards as versioned snapshots
+
+    Every change bumps ``version``; ``policy_version`` and
+    ``indicator_version`` record the version that last changed each part,
+    so shards only rebuild what changed.
+    """
+
+    def __init__(self, policies: Iterable[Any] = (), indicators: Iterable[str] = (), version: int = 0):
+        self.policies: Dict[str, Dict] = {}
+        for policy in policies:
+            policy = _policy_dict(policy)
+            self.policies[policy["policy_id"]] = policy
+        self.indicators: List[str] = list(indicators)
+        # Start past any version already published, e.g. by a previous router
+        self.version = version
+        self.policy_version = 0
+        self.indicator_version = 0
+        self._snapshot: Optional[Dict] = None
+        self.bump(policies=True, indicators=True)
+
+    def bump(self, policies: bool = False, indicators: bool = False) -> int:
+        self.version += 1
+        if policies:
+            self.policy_version = self.version
+        if indicators:
+            self.indicator_version = self.version
+        self._snapshot = None
+        return self.version
+
+    def snapshot(self) -> Dict:
+        if self._snapshot is None:
+            self._snapshot = {"version": self.version, "policy_version": self.policy_version,
+                              "policies": list(self.policies.values()),
+                              "indicator_version": self.indicator_version, "indicators": self.indicators}
+        return self._snapshot
+
+class RedisControlBus:
+    """Control snapshots through Redis: the latest in a key, new versions announced by pub/sub
+
+    Pub/sub delivery is at most once, so announcements only carry the
+    version; subscribers read the snapshot key, and also do so whenever a
+    request needs a version they have not seen.
+    """
+
+    def __init__(self, client, channel: str = CONTROL_CHANNEL, key: str = CONTROL_SNAPSHOT_KEY):
+        self.client = client
+        self.channel = channel
+        self.key = key
+
+    async def publish(self, snapshot: Dict):
+        await self.client.set(self.key, json.dumps(snapshot, separators=(",", ":")))
+        await self.client.publish(self.channel, str(snapshot["version"]))
+
+    async def latest(self) -> Optional[Dict]:
+        raw = await self.client.get(self.key)
+        return json.loads(raw) if raw else None
+
+    async def listen(self, on_version):
+        """Call ``on_version(version)`` for every announcement until cancelled"""
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    try:
+                        await on_version(int(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Failed to apply control version {message['data']}: {e}")
+        finally:
+            await pubsub.aclose()
+
+class ShardWorker:
+    """Serves router requests against one controller that owns a slice of the entities"""
+
+    def __init__(self, controller, shard_id: int, bus: Optional[RedisControlBus] = None,
+                 catch_up_timeout: float = 1.0):
+        self.controller = controller
+        self.shard_id = shard_id
+        self.bus = bus
+        # How long a request may wait for the snapshot it needs to reach the bus
+        self.catch_up_timeout = catch_up_timeout
+        self._catch_up_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.bus is not None:
+            await self.catch_up()
+            self._listener = asyncio.create_task(self.bus.listen(self.catch_up))
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+
+    async def catch_up(self, version: Optional[int] = None):
+        """Apply the bus's latest snapshot if ours is older than ``version`` (default: any newer)
+
+        Raises TimeoutError if the bus does not hold ``version`` within
+        ``catch_up_timeout``, so the request fails rather than being
+        decided against older policies.
+        """
+        if self.bus is None or (version is not None and self.controller.control_version >= version):
+            return
+        async with self._catch_up_lock:
+            deadline = asyncio.get_running_loop().time() + self.catch_up_timeout
+            while version is None or self.controller.control_version < version:
+                snapshot = await self.bus.latest()
+                if snapshot is not None:
+                    await self.controller.apply_control_snapshot(snapshot)
+                if version is None or self.controller.control_version >= version:
+                    return
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise TimeoutError(f"Control snapshot {version} not on the bus after {self.catch_up_timeout}s; "
+                                       f"shard {self.shard_id} is at {self.controller.control_version}")
+                await asyncio.sleep(0.001)
+
+    async def handle(self, op: str, args: tuple) -> Any:
+        controller = self.controller
+        if op == "verify":
+            min_version, checks = args
+            # Decide against the version the router published, never an older one
+            await self.catch_up(min_version)
+            return await controller.verify_many(checks)
+        if op == "control":
+            await controller.apply_control_snapshot(args[0])
+            return controller.control_version
+        if op == "register":
+            return await controller.register_identities_bulk(args[0])
+        if op == "get_session":
+            return await controller.get_session(args[0])
+        if op == "end_session":
+            return await controller.end_session(args[0])
+        if op == "export":
+            return controller.export_control_snapshot()
+        if op == "stats":
+            return {"shard": self.shard_id, "pid": os.getpid(), "control_version": controller.control_version,
+                    "identities": len(controller.network_identities),
+                    "active_sessions": len(controller.active_sessions),
+                    "decision_cache": controller.decision_cache.stats()}
+        if op == "ping":
+            return controller.control_version
+        raise ValueError(f"Unknown shard operation {op}")
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer framed requests in order until the router sends ``stop`` or disconnects"""
+        while True:
+            try:
+                request_id, op, args = await _read_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            if op == "stop":
+                _write_frame(writer, (request_id, True, None))
+                await writer.drain()
+                break
+            try:
+                reply = (request_id, True, await self.handle(op, args))
+            except Exception as e:
+                logger.error(f"Shard {self.shard_id} failed {op}: {e}")
+                reply = (request_id, False, f"{type(e).__name__}: {e}")
+            _write_frame(writer, reply)
+            await writer.drain()
+        writer.close()
+
+def _write_frame(writer: asyncio.StreamWriter, message: Any):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+
+async def _read_frame(reader: asyncio.StreamReader) -> Any:
+    (length,) = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+    return pickle.loads(await reader.readexactly(length))
+
+def _load_script(path: str):
+    """Import a service script such as ``zero-trust-network.py`` by path"""
+    module_name = os.path.basename(path)[:-3].replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+async def _start_worker(controller_class, shard_id: int, options: Dict) -> ShardWorker:
+    controller = controller_class(redis_url=options["redis_url"], **options["controller"])
+    await controller.initialize()
+    bus = RedisControlBus(controller.redis_client, options["channel"]) if options["redis_url"] else None
+    worker = ShardWorker(controller, shard_id, bus)
+    await worker.start()
+    return worker
+
+async def _serve_shard(controller_class, shard_id: int, sock: socket.socket, options: Dict):
+    worker = await _start_worker(controller_class, shard_id, options)
+    reader, writer = await asyncio.open_connection(sock=sock)
+    try:
+        await worker.serve(reader, writer)
+    finally:
+        await worker.close()
+        await worker.controller.shutdown()
+
+def _shard_process(script: str, class_name: str, shard_id: int, sock: socket.socket, options: Dict):
+    """Entry point of a shard process"""
+    controller_class = getattr(_load_script(script), class_name)
+    logging.getLogger().setLevel(options["log_level"])
+    asyncio.run(_serve_shard(controller_class, shard_id, sock, options))
+
+class _ProcessShard:
+    """Router side of a shard process: pipelined requests over a socket pair"""
+
+    def __init__(self, shard_id: int, process, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.shard_id = shard_id
+        self.process = process
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._reader_task = asyncio.create_task(self._read_replies())
+
+    async def request(self, op: str, *args) -> Any:
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[self._next_id] = future
+        _write_frame(self.writer, (self._next_id, op, args))
+        await self.writer.drain()
+        return await future
+
+    async def _read_replies(self):
+        try:
+            while True:
+                request_id, ok, value = await _read_frame(self.reader)
+                future = self._waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(f"Shard {self.shard_id}: {value}"))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ConnectionError(f"Shard {self.shard_id} disconnected: {e}")
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._waiting.clear()
+
+    async def close(self):
+        if not self._reader_task.done():
+            try:
+                await asyncio.wait_for(self.request("stop"), 10)
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                logger.error(f"Shard {self.shard_id} did not stop cleanly: {e}")
+        self._reader_task.cancel()
+        self.writer.close()
+        await asyncio.to_thread(self.process.join, 10)
+        if self.process.is_alive():
+            self.process.terminate()
+
+class _LocalShard:
+    """A shard served in this process, for tests and single-core hosts"""
+
+    def __init__(self, shard_id: int, worker: ShardWorker):
+        self.shard_id = shard_id
+        self.worker = worker
+
+    async def request(self, op: str, *args) -> Any:
+        return await self.worker.handle(op, args)
+
+    async def close(self):
+        await self.worker.close()
+        await self.worker.controller.shutdown()
+
+class ShardRouter:
+    """Routes zero trust decisions to controller shards that each own a slice of the entities
+
+    Each shard is a full controller in its own process, started from
+    ``controller_script`` by class name; ``network_identities`` and
+    ``active_sessions`` are partitioned by consistent hashing of entity_id,
+    so a shard's decision cache and sessions only hold its own entities.
+
+    Policies and the threat indicator feed are set through the router,
+    which bumps the control plane version and publishes a snapshot: over
+    each shard's connection by default, or through Redis pub/sub when
+    ``redis_url`` is given (shards then also persist to that Redis). Every
+    request carries the version current when it was sent and a shard
+    catches up before deciding, so no decision uses an older policy set
+    than the router had published.
+
+    ``verify_network_access`` calls issued in the same event loop turn are
+    coalesced into one request per shard, and ``verify_many`` splits a
+    batch by shard and sends the parts concurrently. A failed shard
+    request denies its checks. ``processes=False`` runs the shards in this
+    process instead.
+    """
+
+    def __init__(self, controller_script: str, controller_class: str, shards: Optional[int] = None,
+                 processes: bool = True, vnodes: int = 64, max_batch: int = 2048,
+                 redis_url: Optional[str] = None, control_channel: str = CONTROL_CHANNEL,
+                 controller_options: Optional[Dict] = None, log_level: str = "WARNING"):
+        self.controller_script = os.path.abspath(controller_script)
+        self.controller_class = controller_class
+        self.shard_count = shards or os.cpu_count() or 1
+        self.processes = processes
+        self.max_batch = max_batch
+        self.redis_url = redis_url
+        self.ring = HashRing(range(self.shard_count), vnodes=vnodes)
+        self.control = ControlPlane()
+        # Newest snapshot version every shard can read; requests carry it as
+        # the minimum to decide with, never a version still being published
+        self.published_version = 0
+        self._publish_lock = asyncio.Lock()
+        self._options = {"redis_url": redis_url, "channel": control_channel,
+                         "controller": controller_options or {}, "log_level": log_level}
+        self._shards: List[Any] = []
+        self._bus: Optional[RedisControlBus] = None
+        self._pending: Dict[int, List[Tuple[Check, asyncio.Future]]] = {}
+        self._flush_scheduled = False
+        self._tasks = set()
+
+    async def start(self, policies: Optional[Iterable[Any]] = None, indicators: Iterable[str] = ()):
+        """Start the shards and publish the first control snapshot
+
+        ``policies`` default to those of the snapshot last published to
+        Redis, if any, with its indicator feed; otherwise to the policies a
+        new controller loads.
+        """
+        if self.processes:
+            context = multiprocessing.get_context("spawn")
+            started = []
+            for shard_id in range(self.shard_count):
+                parent, child = socket.socketpair()
+                process = context.Process(target=_shard_process, daemon=True, name=f"zero-trust-shard-{shard_id}",
+                                          args=(self.controller_script, self.controller_class, shard_id, child,
+                                                self._options))
+                process.start()
+                child.close()
+                started.append((shard_id, process, parent))
+            for shard_id, process, parent in started:
+                reader, writer = await asyncio.open_connection(sock=parent)
+                self._shards.append(_ProcessShard(shard_id, process, reader, writer))
+        else:
+            controller_class = getattr(_load_script(self.controller_script), self.controller_class)
+            for shard_id in range(self.shard_count):
+                self._shards.append(_LocalShard(shard_id, await _start_worker(controller_class, shard_id,
+                                                                               self._options)))
+        # The first reply means the shard is initialized
+        await asyncio.gather(*(shard.request("ping") for shard in self._shards))
+        if self.redis_url:
+            import redis.asyncio as redis
+            self._bus = RedisControlBus(redis.from_url(self.redis_url), self._options["channel"])
+        latest = await self._bus.latest() if self._bus is not None else None
+        if policies is None and latest is not None:
+            policies, indicators = latest["policies"], indicators or latest["indicators"]
+        if policies is None:
+            policies = (await self._shards[0].request("export"))["policies"]
+        self.control = ControlPlane(policies, indicators, version=latest["version"] if latest else 0)
+        await self.publish()
+        logger.info(f"Started {self.shard_count} controller shards at control version {self.control.version}")
+
+    async def publish(self):
+        """Send the current control snapshot to every shard"""
+        # One at a time, so the bus never ends up holding an older snapshot
+        async with self._publish_lock:
+            snapshot = self.control.snapshot()
+            if snapshot["version"] <= self.published_version:
+                return
+            if self._bus is not None:
+                await self._bus.publish(snapshot)
+            else:
+                await asyncio.gather(*(shard.request("control", snapshot) for shard in self._shards))
+            self.published_version = snapshot["version"]
+
+    async def wait_for_version(self, version: Optional[int] = None, interval: float = 0.001):
+        """Wait until every shard has applied ``version`` (default: the current one)"""
+        version = self.control.version if version is None else version
+        while min(await asyncio.gather(*(shard.request("ping") for shard in self._shards))) < version:
+            await asyncio.sleep(interval)
+
+    async def add_policy(self, policy: Any):
+        policy = _policy_dict(policy)
+        self.control.policies[policy["policy_id"]] = policy
+        self.control.bump(policies=True)
+        await self.publish()
+
+    async def remove_policy(self, policy_id: str) -> bool:
+        if self.control.policies.pop(policy_id, None) is None:
+            return False
+        self.control.bump(policies=True)
+        await self.publish()
+        return True
+
+    async def update_policy(self, policy_id: str, **changes) -> bool:
+        policy = self.control.policies.get(policy_id)
+        if policy is None:
+            return False
+        self.control.policies[policy_id] = {**policy, **_policy_dict(changes)}
+        self.control.bump(policies=True)
+        await self.publish()
+        return True
+
+    async def set_indicators(self, indicators: Iterable[str]):
+        """Replace the threat indicator feed on every shard"""
+        self.control.indicators = list(indicators)
+        self.control.bump(indicators=True)
+        await self.publish()
+
+    async def add_indicators(self, indicators: Iterable[str]):
+        self.control.indicators = self.control.indicators + list(indicators)
+        self.control.bump(indicators=True)
+        await self.publish()
+
+    def shard_for(self, entity_id: str) -> int:
+        return self.ring.owner(entity_id)
+
+    async def register_identities_bulk(self, records: Iterable[Dict], chunk_size: int = 10000) -> int:
+        """Register identity records on their owning shards, ``chunk_size`` records at a time"""
+        registered = 0
+        chunk: List[Dict] = []
+
+        async def flush_chunk():
+            nonlocal registered
+            parts: Dict[int, List[Dict]] = {}
+            for record in chunk:
+                parts.setdefault(self.ring.owner(record["entity_id"]), []).append(record)
+            counts = await asyncio.gather(*(self._shards[shard].request("register", part)
+                                            for shard, part in parts.items()))
+            registered += sum(counts)
+            chunk.clear()
+
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                await flush_chunk()
+        if chunk:
+            await flush_chunk()
+        return registered
+
+    async def verify_network_access(self, source_entity: str, destination_ip: str, destination_port: int,
+                                    protocol: str = "tcp") -> bool:
+        """Decide one connection on the shard owning ``source_entity``"""
+        future = asyncio.get_running_loop().create_future()
+        shard = self.ring.owner(source_entity)
+        self._pending.setdefault(shard, []).append(((source_entity, destination_ip, destination_port, protocol),
+                                                    future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        for shard, waiting in pending.items():
+            task = asyncio.create_task(self._send_pending(shard, waiting))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_pending(self, shard: int, waiting: List[Tuple[Check, asyncio.Future]]):
+        results = await self._verify_on(shard, [check for check, _ in waiting])
+        for (_, future), granted in zip(waiting, results):
+            if not future.done():
+                future.set_result(granted)
+
+    async def _verify_on(self, shard: int, checks: List[Check]) -> List[bool]:
+        try:
+            return await self._shards[shard].request("verify", self.published_version, checks)
+        except Exception as e:
+            logger.error(f"Access verification failed on shard {shard}, denying {len(checks)} checks: {e}")
+            return [False] * len(checks)
+
+    async def verify_many(self, checks: Iterable[Check]) -> List[bool]:
+        """Verify (source_entity, destination_ip, destination_port, protocol) checks across the shards"""
+        checks = list(checks)
+        owner = self.ring.owner
+        parts: Dict[int, Tuple[List[int], List[Check]]] = {}
+        for index, check in enumerate(checks):
+            part = parts.get(owner(check[0]))
+            if part is None:
+                part = parts[owner(check[0])] = ([], [])
+            part[0].append(index)
+            part[1].append(check)
+        requests, placements = [], []
+        for shard, (indexes, shard_checks) in parts.items():
+            for start in range(0, len(shard_checks), self.max_batch):
+                requests.append(self._verify_on(shard, shard_checks[start:start + self.max_batch]))
+                placements.append(indexes[start:start + self.max_batch])
+        results = [False] * len(checks)
+        for indexes, granted in zip(placements, await asyncio.gather(*requests)):
+            for index, value in zip(indexes, granted):
+                results[index] = value
+        return results
+
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """A live session from whichever shard holds it"""
+        for session in await asyncio.gather(*(shard.request("get_session", session_id) for shard in self._shards)):
+            if session is not None:
+                return session
+        return None
+
+    async def end_session(self, session_id: str) -> bool:
+        ended = await asyncio.gather(*(shard.request("end_session", session_id) for shard in self._shards))
+        return any(ended)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"shards": await asyncio.gather(*(shard.request("stats") for shard in self._shards)),
+                "control_version": self.control.version, "published_version": self.published_version}
+
+    async def close(self):
+        """Stop every shard, letting each flush its Redis writes"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(shard.close() for shard in self._shards))
+        self._shards.clear()
+        if self._bus is not None:
+            await self._bus.client.close()
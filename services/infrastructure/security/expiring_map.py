@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+XORB Expiring Map
+Bounded in-memory state with per-entry deadlines, LRU eviction and eviction callbacks
+"""
+
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Reasons passed to on_evict
+EXPIRED = "expired"
+EVICTED = "evicted"
+
+_NEVER = float("inf")
+
+class ExpiringMap(MutableMapping):
+    """Dict whose entries leave at a deadline or when the map is full
+
+    Each entry may have a deadline (``ttl`` by default, or per entry via
+    ``set`` and ``expire_in``); deadlines sit in a heap, so expiring is
+    O(log n) per entry and an entry past its deadline is never returned.
+    Past ``max_entries`` the least recently used entry is evicted, after
+    ``spill(key, value)`` has had the chance to save it elsewhere, e.g. to
+    Redis. ``on_evict(key, value, reason)`` runs for every expired or
+    evicted entry, with ``EXPIRED`` or ``EVICTED``; either callback may
+    return an awaitable, which is run as a task. Entries removed with
+    ``del`` or ``pop`` are the caller's business and trigger no callback.
+
+    Expired entries are dropped on access and by ``expire()``, which runs
+    whenever an insert or ``len()`` finds the earliest deadline has passed. ``start()``
+    adds a background task that also expires entries while the map is
+    idle, so callbacks fire on time. Reads refresh recency; iterating
+    does not.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 on_evict: Optional[Callable[[Hashable, Any, str], Any]] = None,
+                 spill: Optional[Callable[[Hashable, Any], Any]] = None,
+                 clock: Callable[[], float] = time.monotonic, sweep_interval: float = 1.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.spill = spill
+        self.clock = clock
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._deadlines: Dict[Hashable, float] = {}
+        # (deadline, tiebreak, key); stale once the key's deadline changes
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._counter = itertools.count()
+        self._tasks: Set[asyncio.Task] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"expired": 0, "evicted": 0, "callback_errors": 0}
+
+    def __len__(self) -> int:
+        # Counts only live entries, so expired ones are dropped first
+        if self._heap and self._heap[0][0] <= self.clock():
+            self.expire()
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        now = self.clock()
+        deadlines = self._deadlines
+        return (key for key in list(self._entries) if deadlines.get(key, _NEVER) > now)
+
+    def __contains__(self, key: Hashable) -> bool:
+        if key not in self._entries:
+            return False
+        deadline = self._deadlines.get(key)
+        return deadline is None or deadline > self.clock()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._entries[key]
+        deadline = self._deadlines.get(key)
+        if deadline is not None and deadline <= self.clock():
+            self._expire_entry(key)
+            raise KeyError(key)
+        self._entries.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def __delitem__(self, key: Hashable):
+        del self._entries[key]
+        self._deadlines.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._deadlines.clear()
+        self._heap.clear()
+
+    def items(self):
+        # One pass without the per-key lookups or recency updates of the mixin
+        now = self.clock()
+        deadlines = self._deadlines
+        return [(key, value) for key, value in self._entries.items() if deadlines.get(key, _NEVER) > now]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Insert or replace an entry, expiring ``ttl`` seconds from now (default: the map's ttl)"""
+        now = self.clock()
+        if self._heap and self._heap[0][0] <= now:
+            self.expire(now)
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._schedule(key, ttl if ttl is not None else self.ttl, now)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def expire_in(self, key: Hashable, ttl: Optional[float]):
+        """Move an entry's deadline to ``ttl`` seconds from now; None keeps it until evicted"""
+        if key in self._entries:
+            self._schedule(key, ttl, self.clock())
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def _schedule(self, key: Hashable, ttl: Optional[float], now: float):
+        if ttl is None:
+            self._deadlines.pop(key, None)
+            return
+        deadline = now + ttl
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        # Replaced deadlines leave stale heap entries; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            self._heap = [(deadline, next(self._counter), key) for key, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop every entry past its deadline; returns how many"""
+        now = self.clock() if now is None else now
+        heap = self._heap
+        expired = 0
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            if self._deadlines.get(key) == deadline:
+                self._expire_entry(key)
+                expired += 1
+        return expired
+
+    def _expire_entry(self, key: Hashable):
+        value = self._entries.pop(key)
+        del self._deadlines[key]
+        self.stats["expired"] += 1
+        self._callback(self.on_evict, key, value, EXPIRED)
+
+    def _evict_oldest(self):
+        key, value = self._entries.popitem(last=False)
+        self._deadlines.pop(key, None)
+        self.stats["evicted"] += 1
+        self._callback(self.spill, key, value)
+        self._callback(self.on_evict, key, value, EVICTED)
+
+    def _callback(self, callback: Optional[Callable], *args):
+        if callback is None:
+            return
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._callback_done)
+        except Exception as e:
+            self.stats["callback_errors"] += 1
+            logger.error(f"Eviction callback failed for {args[0]}: {e}")
+
+    def _callback_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["callback_errors"] += 1
+            logger.error(f"Eviction callback failed: {task.exception()}")
+
+    async def start(self):
+        """Expire entries in the background, waking at the next deadline"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            delay = self.sweep_interval
+            if self._heap:
+                delay = min(delay, max(self._heap[0][0] - self.clock(), 0.0))
+            await asyncio.sleep(delay)
+            self.expire()
+
+    async def close(self):
+        """Stop the background sweep and wait for running callbacks"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"entries": len(self), "max_entries": self.max_entries,
+                "scheduled": len(self._deadlines), **self.stats}
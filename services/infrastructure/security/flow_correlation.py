@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+XORB Flow Correlation Engine
+Sliding-window aggregates over flow batches for multi-flow detections
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# HyperLogLog precision: 2**HLL_BITS registers per sketch, stored 4 bits each
+HLL_BITS = 6
+HLL_REGISTERS = 1 << HLL_BITS
+HLL_PACKED = HLL_REGISTERS // 2
+HLL_MAX_RANK = 15
+HLL_ALPHA = 0.709
+# Compact a bucket once it holds this many runs
+MAX_RUNS_PER_BUCKET = 8
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, vectorized over a uint64 array"""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (z ^ (z >> np.uint64(31))) & _MASK64
+
+def _hll_positions(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """HyperLogLog register index and rank for each value"""
+    hashed = _mix64(values)
+    registers = (hashed >> np.uint64(64 - HLL_BITS)).astype(np.int64)
+    low = (hashed & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    ranks = np.minimum(32 - np.floor(np.log2(np.maximum(low, 1))), HLL_MAX_RANK).astype(np.uint8)
+    return registers, ranks
+
+def _pack_registers(registers: np.ndarray) -> np.ndarray:
+    return (registers[:, 0::2] << 4) | registers[:, 1::2]
+
+def _unpack_registers(packed: np.ndarray) -> np.ndarray:
+    registers = np.empty((len(packed), packed.shape[1] * 2), dtype=np.uint8)
+    registers[:, 0::2] = packed >> 4
+    registers[:, 1::2] = packed & 0x0F
+    return registers
+
+def _max_packed(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Register-wise maximum of two packed register matrices"""
+    return (np.maximum(a & 0xF0, b & 0xF0)) | np.maximum(a & 0x0F, b & 0x0F)
+
+def hll_estimate(packed: np.ndarray) -> np.ndarray:
+    """Cardinality estimates for an (n, HLL_PACKED) packed register matrix"""
+    packed = np.atleast_2d(packed)
+    if packed.shape[1] == 0:
+        return np.zeros(len(packed))
+    registers = _unpack_registers(packed)
+    m = registers.shape[1]
+    raw = HLL_ALPHA * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    # Linear counting is more accurate in the small range
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+class _Run:
+    """Per-key aggregates of some flows, sorted by key"""
+    __slots__ = ("keys", "bytes", "flows", "peers", "ports", "witness")
+
+    def __init__(self, keys: np.ndarray, byte_sums: np.ndarray, flows: np.ndarray,
+                 peers: np.ndarray, ports: np.ndarray, witness: np.ndarray):
+        self.keys = keys
+        self.bytes = byte_sums
+        self.flows = flows
+        self.peers = peers
+        self.ports = ports
+        self.witness = witness
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    @staticmethod
+    def _register_max(groups: np.ndarray, group_count: int, values: np.ndarray,
+                      tracked: bool = True) -> np.ndarray:
+        """Per-group HLL registers, computed with one sort instead of ufunc.at"""
+        if not tracked:
+            return np.zeros((group_count, 0), dtype=np.uint8)
+        # Ranks are at most 15, so each cell sorts as cell * 16 + rank
+        registers, ranks = _hll_positions(values)
+        cells = groups * HLL_REGISTERS + registers
+        combined = np.sort(cells * 16 + ranks)
+        cells = combined >> 4
+        last = np.ones(len(combined), dtype=bool)
+        last[:-1] = cells[1:] != cells[:-1]
+        matrix = np.zeros(group_count * HLL_REGISTERS, dtype=np.uint8)
+        matrix[cells[last]] = (combined[last] & 0x0F).astype(np.uint8)
+        return _pack_registers(matrix.reshape(group_count, HLL_REGISTERS))
+
+    @classmethod
+    def from_flows(cls, keys: np.ndarray, byte_counts: np.ndarray, peers: np.ndarray,
+                   ports: np.ndarray, track_peers: bool = True, track_ports: bool = True) -> '_Run':
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        groups = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(keys)]))
+        peers = peers[order]
+        return cls(
+            keys[starts],
+            np.add.reduceat(byte_counts[order], starts),
+            np.diff(np.r_[starts, len(keys)]).astype(np.int32),
+            cls._register_max(groups, len(starts), peers, track_peers),
+            cls._register_max(groups, len(starts), ports[order].astype(np.uint64), track_ports),
+            # Stable sort keeps arrival order, so the last row is the latest peer
+            peers[np.r_[starts[1:], len(keys)] - 1]
+        )
+
+    @staticmethod
+    def _merge_registers(registers: List[np.ndarray], order: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        if registers[0].shape[1] == 0:
+            return np.zeros((len(starts), 0), dtype=np.uint8)
+        merged = np.maximum.reduceat(_unpack_registers(np.concatenate(registers)[order]), starts, axis=0)
+        return _pack_registers(merged)
+
+    @classmethod
+    def merge(cls, runs: List['_Run']) -> '_Run':
+        keys = np.concatenate([r.keys for r in runs])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)] - 1
+        return cls(
+            keys[starts],
+            np.add.reduceat(np.concatenate([r.bytes for r in runs])[order], starts),
+            np.add.reduceat(np.concatenate([r.flows for r in runs])[order], starts),
+            cls._merge_registers([r.peers for r in runs], order, starts),
+            cls._merge_registers([r.ports for r in runs], order, starts),
+            np.concatenate([r.witness for r in runs])[order][ends]
+        )
+
+@dataclass
+class WindowAggregates:
+    """Window totals for a set of keys"""
+    keys: np.ndarray
+    bytes: np.ndarray
+    flows: np.ndarray
+    distinct_peers: np.ndarray
+    distinct_ports: np.ndarray
+    witness: np.ndarray
+
+class SlidingWindow:
+    """Time-bucketed ring of per-key aggregates over a sliding window
+
+    Keys and peers are uint32 IPv4 addresses. Each
+    bucket holds sorted runs of per-key byte sums, flow counts, HyperLogLog
+    sketches of distinct peers and ports (only those listed in
+    ``sketches``, since they dominate memory), and the latest peer. Runs are
+    compacted as they accumulate and whole buckets are dropped once they
+    leave the window, so memory tracks the keys active in the window and
+    nothing needs a per-key expiry sweep.
+    """
+
+    def __init__(self, bucket_seconds: float, buckets: int, sketches: Tuple[str, ...] = ("peers", "ports")):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.track_peers = "peers" in sketches
+        self.track_ports = "ports" in sketches
+        self._buckets: Dict[int, List[_Run]] = {}
+        self.current_bucket: Optional[int] = None
+
+    @property
+    def window_seconds(self) -> float:
+        return self.bucket_seconds * self.buckets
+
+    def _rotate(self, newest: int):
+        if self.current_bucket is None or newest > self.current_bucket:
+            self.current_bucket = newest
+            oldest = newest - self.buckets + 1
+            for bucket in [b for b in self._buckets if b < oldest]:
+                del self._buckets[bucket]
+
+    def add(self, timestamps: np.ndarray, keys: np.ndarray, byte_counts: np.ndarray,
+            peers: np.ndarray, ports: np.ndarray):
+        """Add flows; flows older than the window are ignored"""
+        if not len(keys):
+            return
+        bucket_ids = (timestamps // self.bucket_seconds).astype(np.int64)
+        self._rotate(int(bucket_ids.max()))
+        oldest = self.current_bucket - self.buckets + 1
+        for bucket in np.unique(bucket_ids[bucket_ids >= oldest]):
+            rows = bucket_ids == bucket
+            runs = self._buckets.setdefault(int(bucket), [])
+            runs.append(_Run.from_flows(keys[rows], byte_counts[rows], peers[rows], ports[rows],
+                                        self.track_peers, self.track_ports))
+            if len(runs) > MAX_RUNS_PER_BUCKET:
+                # Leave a dominant oldest run alone so it is not rewritten every time
+                rest = sum(len(run.keys) for run in runs[1:])
+                if len(runs[0].keys) > 4 * rest:
+                    runs[1:] = [_Run.merge(runs[1:])]
+                else:
+                    runs[:] = [_Run.merge(runs)]
+
+    def aggregate(self, keys: np.ndarray) -> WindowAggregates:
+        """Window totals for each of ``keys`` (sorted, unique)"""
+        count = len(keys)
+        byte_sums = np.zeros(count, dtype=np.int64)
+        flows = np.zeros(count, dtype=np.int64)
+        peers = np.zeros((count, HLL_PACKED if self.track_peers else 0), dtype=np.uint8)
+        ports = np.zeros((count, HLL_PACKED if self.track_ports else 0), dtype=np.uint8)
+        witness = np.zeros(count, dtype=np.uint32)
+        for bucket in sorted(self._buckets):
+            for run in self._buckets[bucket]:
+                positions = np.searchsorted(run.keys, keys)
+                positions[positions == len(run.keys)] = 0
+                hit = run.keys[positions] == keys if len(run.keys) else np.zeros(count, dtype=bool)
+                if not hit.any():
+                    continue
+                source = positions[hit]
+                byte_sums[hit] += run.bytes[source]
+                flows[hit] += run.flows[source]
+                if self.track_peers:
+                    peers[hit] = _max_packed(peers[hit], run.peers[source])
+                if self.track_ports:
+                    ports[hit] = _max_packed(ports[hit], run.ports[source])
+                witness[hit] = run.witness[source]
+        return WindowAggregates(keys, byte_sums, flows, hll_estimate(peers), hll_estimate(ports), witness)
+
+    def nbytes(self) -> int:
+        return sum(run.nbytes for runs in self._buckets.values() for run in runs)
+
+    def key_count(self) -> int:
+        """Distinct (key, bucket) entries currently held"""
+        return sum(len(run.keys) for runs in self._buckets.values() for run in runs)
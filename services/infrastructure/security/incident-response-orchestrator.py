@@ -5,21 +5,25 @@ Real-time incident detection, classification, and automated response workflows
 """
 
 import asyncio
+import ipaddress
 import logging
 import json
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Callable, Any, Set, Tuple
+from dataclasses import dataclass
 from enum import Enum
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import aiohttp
-import redis.asyncio as redis
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+
+from incident_aggregation import AlertFingerprint, IncidentAggregator, normalize_observable
+from expiring_map import EXPIRED, ExpiringMap
+from incident_index import IncidentIndex
+from notification_dispatch import Notification, NotificationDispatcher
+from playbook_engine import APPLIED, DUPLICATE, FAILED, ActionPolicy, PlaybookEngine
+from record_codec import RecordCodec
+from redis_write_behind import RedisWriteBehind
+from service_metrics import LogThrottle, MetricsRegistry
+
 logger = logging.getLogger(__name__)
 
 class IncidentSeverity(Enum):
@@ -49,7 +53,32 @@ class ResponseAction(Enum):
     COLLECT_FORENSICS = "collect_forensics"
     UPDATE_SIGNATURES = "update_signatures"
 
-@dataclass
+# Actions applied once per matching asset or indicator, with the observable
+# kinds they target and the evidence field that can name one more target
+ACTION_TARGETS = {
+    ResponseAction.ISOLATE_HOST: (("host", ""), None),
+    ResponseAction.BLOCK_IP: (("ip",), "source_ip"),
+    ResponseAction.DISABLE_USER: (("user",), "user_id"),
+    ResponseAction.RESET_PASSWORD: (("user",), "user_id"),
+    ResponseAction.QUARANTINE_FILE: (("file_hash", "hash"), "file_hash"),
+}
+
+# Actions that contain an incident once they have all succeeded
+CONTAINMENT_ACTIONS = {
+    ResponseAction.ISOLATE_HOST, ResponseAction.BLOCK_IP,
+    ResponseAction.DISABLE_USER, ResponseAction.QUARANTINE_FILE,
+}
+
+# Default limits protecting the firewall, EDR and identity APIs
+DEFAULT_ACTION_POLICIES = {
+    ResponseAction.ISOLATE_HOST: ActionPolicy(concurrency=32, rate=100.0, burst=20),
+    ResponseAction.BLOCK_IP: ActionPolicy(concurrency=16, rate=200.0, burst=50),
+    ResponseAction.DISABLE_USER: ActionPolicy(concurrency=8, rate=50.0, burst=10),
+    ResponseAction.RESET_PASSWORD: ActionPolicy(concurrency=8, rate=50.0, burst=10),
+    ResponseAction.QUARANTINE_FILE: ActionPolicy(concurrency=16, rate=100.0, burst=20),
+}
+
+@dataclass(slots=True)
 class SecurityIncident:
     """Security incident data structure"""
     incident_id: str
@@ -74,32 +103,116 @@ class SecurityIncident:
             self.timeline = []
     
     def to_dict(self) -> Dict:
-        data = asdict(self)
-        data['severity'] = self.severity.value
-        data['status'] = self.status.value
-        data['created_at'] = self.created_at.isoformat()
-        data['updated_at'] = self.updated_at.isoformat()
-        return data
+        """JSON-ready dict; evidence and timeline are shared, not copied"""
+        return INCIDENT_CODEC.to_dict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SecurityIncident':
+        return INCIDENT_CODEC.from_dict(data)
+
+INCIDENT_CODEC = RecordCodec(SecurityIncident)
 
 class IncidentResponseOrchestrator:
     """Advanced incident response orchestration system"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
+    # Merged alerts recorded individually in an incident's timeline; later
+    # ones only update the counters in its evidence
+    MAX_TIMELINE_MERGES = 100
+    # Keys read per MGET, MGETs in flight, and incidents decoded between
+    # yields to the event loop, while restoring incidents
+    RESTORE_BATCH = 1000
+    RESTORE_CONCURRENCY = 4
+    RESTORE_SLICE = 50
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379",
+                 aggregation_window: float = 900.0, persist_delay: float = 1.0,
+                 binary_records: bool = False, max_active_incidents: Optional[int] = 250_000,
+                 resolved_retention: float = 86400.0,
+                 metrics: Optional[MetricsRegistry] = None, metrics_port: Optional[int] = None):
         self.redis_client = None
+        self.redis_writer: Optional[RedisWriteBehind] = None
         self.redis_url = redis_url
-        self.active_incidents: Dict[str, SecurityIncident] = {}
+        # Persist incidents as msgpack rather than JSON; either is read back
+        self.binary_records = binary_records
+        # Closed incidents leave at once and resolved ones after
+        # resolved_retention; past max_active_incidents the least recently
+        # touched are dropped from memory and fetched back from Redis on demand
+        self.resolved_retention = resolved_retention
+        self.active_incidents: ExpiringMap = ExpiringMap(
+            max_entries=max_active_incidents, on_evict=self._release_incident, spill=self._spill_incident)
+        # Secondary indexes and cached JSON over active_incidents
+        self.incident_index = IncidentIndex()
         self.response_playbooks: Dict[str, Any] = {}
         self.response_handlers: Dict[ResponseAction, Callable] = {}
         self.notification_channels: Dict[str, Dict] = {}
+        self.incident_aggregator = IncidentAggregator(window=aggregation_window)
+        # Merges are persisted at most once per persist_delay per incident
+        self.persist_delay = persist_delay
+        self._persist_pending: Set[str] = set()
+        self._persist_task: Optional[asyncio.Task] = None
+        self.playbook_engine = PlaybookEngine(
+            self.response_handlers, targets=self._response_targets,
+            policies=dict(DEFAULT_ACTION_POLICIES), containment_actions=CONTAINMENT_ACTIONS)
+        self.notifier = NotificationDispatcher(severities={s.name: s.value for s in IncidentSeverity},
+                                               min_severity="P4_LOW", digest_from="P3_MEDIUM")
+        # Set once every persisted incident is in memory; nothing to restore yet
+        self.restore_ready = asyncio.Event()
+        self.restore_ready.set()
+        self.restore_progress: Dict[str, Any] = {"state": "idle", "scanned": 0, "loaded": 0,
+                                                 "skipped": 0, "failed": 0, "lazy": 0,
+                                                 "started_at": None, "finished_at": None}
+        self._restore_task: Optional[asyncio.Task] = None
+        # Incidents closed while the restore runs, so it does not bring them back
+        self._closed_during_restore: Set[str] = set()
+        # Alert storms open incidents faster than anyone reads the log
+        self.incident_log = LogThrottle(logger)
+        
+        # Disabled unless a registry is passed in or the endpoint is requested
+        self.metrics = metrics or MetricsRegistry("xorb_incident_response", enabled=metrics_port is not None)
+        self.metrics_port = metrics_port
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Create the per-stage histograms, counters and queue gauges"""
+        m = self.metrics
+        stage_help = "Seconds spent per stage of incident handling"
+        self._stage_aggregate = m.histogram("stage_seconds", stage_help, stage="aggregate")
+        self._stage_store = m.histogram("stage_seconds", stage_help, stage="redis_write")
+        self._stage_response = m.histogram("stage_seconds", stage_help, stage="response_trigger")
+        self._stage_create = m.histogram("stage_seconds", stage_help, stage="create_incident")
+        alert_help = "Alerts by whether they opened an incident or merged into one"
+        self._alerts_opened = m.counter("alerts_total", alert_help, result="opened")
+        self._alerts_merged = m.counter("alerts_total", alert_help, result="merged")
+        self._redis_pipeline = m.histogram("redis_pipeline_seconds", "Seconds per write-behind Redis pipeline")
+        m.gauge("active_incidents", lambda: len(self.active_incidents), "Incidents held in memory")
+        m.gauge("persist_pending", lambda: len(self._persist_pending), "Incidents awaiting a deferred write")
+        m.gauge("redis_writes_pending", lambda: self.redis_writer.pending if self.redis_writer else 0,
+                "Writes waiting in the Redis write-behind buffer")
         
     async def initialize(self):
         """Initialize incident response orchestrator"""
         try:
-            self.redis_client = redis.from_url(self.redis_url)
+            # A client set beforehand, e.g. by a test or replay harness, is kept
+            if self.redis_client is None:
+                import redis.asyncio as redis
+                self.redis_client = redis.from_url(self.redis_url)
             await self.redis_client.ping()
+            self.redis_writer = RedisWriteBehind(self.redis_client)
+            if self.metrics.enabled:
+                self.redis_writer.pipeline_latency = self._redis_pipeline
+            await self.redis_writer.start()
             
-            # Load existing incidents from Redis
+            # Restore existing incidents from Redis in the background
             await self._load_active_incidents()
+            await self.active_incidents.start()
+            
+            # Channels deliver from their own queues; nothing here waits on them
+            self.notifier.configure(self.notification_channels)
+            for name, channel in self.notifier.channels.items():
+                self.metrics.gauge("notification_queue_depth", channel.queue.qsize,
+                                   "Notifications waiting per channel", channel=name)
+            if self.metrics_port is not None:
+                await self.metrics.serve(port=self.metrics_port)
             
             logger.info("Incident Response Orchestrator initialized successfully")
             
@@ -107,6 +220,145 @@ class IncidentResponseOrchestrator:
             logger.error(f"Failed to initialize incident response orchestrator: {e}")
             raise
     
+    async def _load_active_incidents(self):
+        """Start restoring persisted incidents; returns without waiting for them
+
+        Keys are streamed with SCAN and read in MGET batches, several at a
+        time, while the orchestrator already serves requests. Lookups of an
+        incident that has not been restored yet fetch it on demand.
+        ``restore_ready`` is set when the restore finishes and
+        ``restore_status()`` reports progress.
+        """
+        if self._restore_task is not None and not self._restore_task.done():
+            return
+        self.restore_ready.clear()
+        self.restore_progress.update(state="restoring", scanned=0, loaded=0, skipped=0, failed=0,
+                                     started_at=time.monotonic(), finished_at=None)
+        self._restore_task = asyncio.create_task(self._restore_incidents())
+    
+    async def _restore_incidents(self):
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.RESTORE_CONCURRENCY * 2)
+        # Fetches overlap, but only one worker decodes at a time so the loop
+        # is never held for more than one slice
+        decoding = asyncio.Lock()
+        
+        async def fetch():
+            while True:
+                keys = await batches.get()
+                if keys is None:
+                    return
+                try:
+                    values = await self.redis_client.mget(keys)
+                except Exception as e:
+                    self.restore_progress["failed"] += len(keys)
+                    logger.error(f"Failed to restore {len(keys)} incidents: {e}")
+                    continue
+                async with decoding:
+                    for start in range(0, len(values), self.RESTORE_SLICE):
+                        self._restore_batch(values[start:start + self.RESTORE_SLICE])
+                        # Leave the event loop to requests between slices
+                        await asyncio.sleep(0)
+        
+        workers = [asyncio.create_task(fetch()) for _ in range(self.RESTORE_CONCURRENCY)]
+        try:
+            batch = []
+            async for key in self.redis_client.scan_iter(match="incident:*", count=self.RESTORE_BATCH):
+                batch.append(key)
+                self.restore_progress["scanned"] += 1
+                if len(batch) >= self.RESTORE_BATCH:
+                    await batches.put(batch)
+                    batch = []
+            if batch:
+                await batches.put(batch)
+            self.restore_progress["state"] = "ready"
+        except asyncio.CancelledError:
+            self.restore_progress["state"] = "cancelled"
+            raise
+        except Exception as e:
+            self.restore_progress["state"] = "failed"
+            logger.error(f"Incident restore stopped after {self.restore_progress['scanned']} keys: {e}")
+        finally:
+            for _ in workers:
+                await batches.put(None)
+            await asyncio.gather(*workers)
+            self.restore_progress["finished_at"] = time.monotonic()
+            self._closed_during_restore.clear()
+            self.restore_ready.set()
+            logger.info(f"Restored {self.restore_progress['loaded']} incidents in "
+                        f"{self.restore_progress['finished_at'] - self.restore_progress['started_at']:.2f}s")
+    
+    def _restore_batch(self, values: List[Optional[bytes]]):
+        progress = self.restore_progress
+        restored = []
+        for raw in values:
+            try:
+                incident = self._decode_incident(raw)
+            except Exception as e:
+                progress["failed"] += 1
+                logger.error(f"Failed to decode persisted incident: {e}")
+                continue
+            if incident is None or incident.incident_id in self.active_incidents:
+                progress["skipped"] += 1
+            else:
+                self._adopt_incident(incident, index=False)
+                restored.append(incident)
+        # Past max_active_incidents some may already have been dropped again
+        self.incident_index.add_many(incident for incident in restored
+                                     if incident.incident_id in self.active_incidents)
+        progress["loaded"] += len(restored)
+    
+    def _decode_incident(self, raw: Optional[bytes]) -> Optional[SecurityIncident]:
+        """Persisted incident that should become active, or None"""
+        if raw is None:
+            return None
+        incident = INCIDENT_CODEC.loads(raw)
+        if (incident.status == IncidentStatus.CLOSED or incident.incident_id in self.active_incidents
+                or incident.incident_id in self._closed_during_restore):
+            return None
+        return incident
+    
+    def _adopt_incident(self, incident: SecurityIncident, index: bool = True):
+        ttl = None
+        if incident.status == IncidentStatus.RESOLVED:
+            resolved_for = (datetime.utcnow() - incident.updated_at).total_seconds()
+            ttl = max(self.resolved_retention - resolved_for, 0.0)
+        self.active_incidents.set(incident.incident_id, incident, ttl=ttl)
+        if index:
+            self.incident_index.add(incident)
+        if incident.status != IncidentStatus.RESOLVED:
+            fingerprint = AlertFingerprint(incident.evidence.get("threat_category") or incident.source_system,
+                                           incident.affected_assets, incident.indicators)
+            self.incident_aggregator.open(incident.incident_id, fingerprint)
+    
+    async def _get_incident(self, incident_id: str) -> Optional[SecurityIncident]:
+        """Active incident by id, fetched from Redis if the restore has not reached it or it was dropped"""
+        incident = self.active_incidents.get(incident_id)
+        if incident is not None or self.redis_client is None:
+            return incident
+        try:
+            raw = await self.redis_client.get(f"incident:{incident_id}")
+            incident = self._decode_incident(raw)
+        except Exception as e:
+            logger.error(f"Failed to fetch incident {incident_id}: {e}")
+            return None
+        if incident is None:
+            # The restore may have adopted it while we waited
+            return self.active_incidents.get(incident_id)
+        self._adopt_incident(incident)
+        self.restore_progress["lazy"] += 1
+        return incident
+    
+    def restore_status(self) -> Dict[str, Any]:
+        """Progress of the incident restore"""
+        progress = dict(self.restore_progress)
+        if progress["started_at"] is not None:
+            end = progress["finished_at"] or time.monotonic()
+            progress["elapsed"] = end - progress["started_at"]
+            progress["rate"] = progress["loaded"] / progress["elapsed"] if progress["elapsed"] else 0.0
+        progress["ready"] = self.restore_ready.is_set()
+        progress["active_incidents"] = len(self.active_incidents)
+        return progress
+    
     async def create_incident(self, 
                             title: str,
                             description: str,
@@ -114,54 +366,407 @@ class IncidentResponseOrchestrator:
                             source_system: str,
                             affected_assets: List[str],
                             indicators: List[str],
-                            evidence: Dict[str, Any]) -> SecurityIncident:
-        """Create new security incident and trigger automated response"""
+                            evidence: Dict[str, Any],
+                            trigger_response: bool = True) -> SecurityIncident:
+        """Create new security incident and trigger automated response
+
+        Alerts matching an open incident are merged into it instead (see
+        ``aggregate_alert``); the response then only runs again if the alert
+        escalates the incident's severity. Pass ``trigger_response=False``
+        when the caller schedules the response itself, as the security
+        pipeline's respond stage does.
+        """
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        incident, respond = await self.aggregate_alert(
+            title, description, severity, source_system, affected_assets, indicators, evidence)
+        if respond and trigger_response:
+            await self.trigger_automated_response(incident)
+        if timed:
+            self._stage_create.record_since(start)
+        return incident
+    
+    async def aggregate_alert(self,
+                              title: str,
+                              description: str,
+                              severity: IncidentSeverity,
+                              source_system: str,
+                              affected_assets: List[str],
+                              indicators: List[str],
+                              evidence: Dict[str, Any]) -> Tuple[SecurityIncident, bool]:
+        """Merge an alert into its open incident or open a new one
+
+        Alerts are matched on category (``evidence["threat_category"]``,
+        else the source system) plus their exact normalized fingerprint or
+        any shared indicator or asset. Returns the incident and whether its
+        automated response should run: True for a new incident or a
+        severity escalation, False for a plain merge.
+        """
         try:
-            incident_id = str(uuid.uuid4())
+            timed = self.metrics.enabled
+            if timed:
+                start = time.perf_counter()
+            fingerprint = AlertFingerprint(evidence.get("threat_category") or source_system,
+                                           affected_assets, indicators)
+            incident_id = self.incident_aggregator.match(fingerprint)
+            incident = self.active_incidents.get(incident_id) if incident_id else None
+            if incident is not None:
+                escalated = self._merge_alert(incident, fingerprint, severity, evidence)
+                if timed:
+                    self._stage_aggregate.record_since(start)
+                    self._alerts_merged.inc()
+                return incident, escalated
             
+            incident_id = str(uuid.uuid4())
+            now = datetime.utcnow()
             incident = SecurityIncident(
                 incident_id=incident_id,
                 title=title,
                 description=description,
                 severity=severity,
                 status=IncidentStatus.OPEN,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
+                created_at=now,
+                updated_at=now,
                 source_system=source_system,
-                affected_assets=affected_assets,
-                indicators=indicators,
-                evidence=evidence
+                affected_assets=list(affected_assets),
+                indicators=list(indicators),
+                evidence={**evidence, "alert_count": 1, "last_alert_at": now.isoformat()}
             )
             
             self.active_incidents[incident_id] = incident
+            self.incident_index.add(incident)
+            self.incident_aggregator.open(incident_id, fingerprint)
+            if timed:
+                aggregated = time.perf_counter()
+                self._stage_aggregate.record(aggregated - start)
+                self._alerts_opened.inc()
+            await self._persist_incident(incident)
+            if timed:
+                self._stage_store.record_since(aggregated)
+            self._notify(incident, "New incident")
             
-            # Store in Redis
-            await self.redis_client.setex(
-                f"incident:{incident_id}",
-                86400 * 7,  # 7 days
-                json.dumps(incident.to_dict())
-            )
-            
-            # Trigger automated response
-            await self._trigger_automated_response(incident)
-            
-            logger.info(f"Created incident {incident_id}: {title}")
-            return incident
+            self.incident_log.info("incident created", "Created incident %s: %s", incident_id, title)
+            return incident, True
             
         except Exception as e:
             logger.error(f"Failed to create incident: {e}")
             raise
     
+    def _merge_alert(self, incident: SecurityIncident, fingerprint: AlertFingerprint,
+                     severity: IncidentSeverity, evidence: Dict[str, Any]) -> bool:
+        """Fold a matching alert into an incident; returns True if it escalated"""
+        new_assets, new_indicators = self.incident_aggregator.merge(incident.incident_id, fingerprint)
+        now = datetime.utcnow()
+        incident.affected_assets.extend(new_assets)
+        incident.indicators.extend(new_indicators)
+        incident.evidence["alert_count"] = incident.evidence.get("alert_count", 1) + 1
+        incident.evidence["last_alert_at"] = now.isoformat()
+        for key, value in evidence.items():
+            incident.evidence.setdefault(key, value)
+        
+        if incident.evidence["alert_count"] <= self.MAX_TIMELINE_MERGES + 1:
+            incident.timeline.append({
+                "timestamp": now.isoformat(),
+                "event": "alert_merged",
+                "severity": severity.name,
+                "new_assets": new_assets,
+                "new_indicators": new_indicators,
+                "evidence": evidence
+            })
+        
+        # Lower values are more severe
+        escalated = severity.value < incident.severity.value
+        if escalated:
+            incident.timeline.append({
+                "timestamp": now.isoformat(),
+                "event": "severity_escalated",
+                "from": incident.severity.name,
+                "to": severity.name
+            })
+            incident.severity = severity
+            self._notify(incident, f"Escalated to {severity.name}")
+        incident.updated_at = now
+        self.incident_index.update(incident, new_assets)
+        self._persist_later(incident)
+        return escalated
+    
+    def _notify(self, incident: SecurityIncident, event: str):
+        """Queue a notification on each channel; never waits for delivery
+
+        A channel's config may set ``min_severity`` (default P4_LOW) to
+        skip less severe incidents and ``digest_from`` (default P3_MEDIUM)
+        to batch incidents at or below that severity into periodic digests;
+        the dispatcher checks both when the channel is configured.
+        """
+        if not self.notifier.channels:
+            return
+        subject = f"[XORB {incident.severity.name}] {event}: {incident.title}"
+        body = (f"{incident.description}\n\nIncident: {incident.incident_id}\nStatus: {incident.status.value}\n"
+                f"Assets: {', '.join(incident.affected_assets[:20])}\n"
+                f"Indicators: {', '.join(incident.indicators[:20])}")
+        payload = {"event": event, "status": incident.status.value, "title": incident.title}
+        rank = incident.severity.value
+        for name, channel in self.notifier.channels.items():
+            if channel.min_severity is not None and rank > channel.min_severity:
+                continue
+            digest = channel.digest_from is not None and rank >= channel.digest_from
+            self.notifier.notify(Notification(subject, body, incident.severity.name, incident.incident_id,
+                                              digest=digest, payload=payload), [name])
+    
+    def _incident_payload(self, incident: SecurityIncident, cached: bool = True):
+        if self.binary_records:
+            return INCIDENT_CODEC.pack(incident)
+        if cached:
+            return self.incident_index.to_json(incident)
+        # Incidents leaving memory must not re-enter the index's serialization cache
+        return json.dumps(self.incident_index.serialize(incident))
+    
+    async def _persist_incident(self, incident: SecurityIncident, payload=None):
+        # Queue for Redis; the write is pipelined with other pending writes
+        await self.redis_writer.setex(
+            f"incident:{incident.incident_id}",
+            86400 * 7,  # 7 days
+            payload if payload is not None else self._incident_payload(incident)
+        )
+    
+    def _spill_incident(self, incident_id: str, incident: SecurityIncident):
+        """Write an incident leaving memory if its deferred write has not happened yet"""
+        if incident_id in self._persist_pending and self.redis_writer:
+            self._persist_pending.discard(incident_id)
+            # Serialized now: the write runs as a task after the index has dropped the incident
+            return self._persist_incident(incident, self._incident_payload(incident, cached=False))
+        return None
+    
+    def _release_incident(self, incident_id: str, incident: SecurityIncident, reason: str):
+        """Drop an incident that expired or was evicted from the index and aggregator"""
+        self.incident_index.remove(incident_id)
+        self.incident_aggregator.close(incident_id)
+        if reason == EXPIRED:
+            return self._spill_incident(incident_id, incident)
+        return None
+    
+    def _persist_later(self, incident: SecurityIncident):
+        """Persist an incident within persist_delay, once however often it changes meanwhile"""
+        self._persist_pending.add(incident.incident_id)
+        if self._persist_task is None or self._persist_task.done():
+            self._persist_task = asyncio.create_task(self._persist_loop())
+    
+    async def _persist_loop(self):
+        while self._persist_pending:
+            await asyncio.sleep(self.persist_delay)
+            await self.flush_incidents()
+    
+    async def flush_incidents(self):
+        """Persist incidents whose deferred write is still waiting"""
+        pending, self._persist_pending = self._persist_pending, set()
+        for incident_id in pending:
+            incident = self.active_incidents.get(incident_id)
+            if incident is None:
+                continue
+            try:
+                await self._persist_incident(incident)
+            except Exception as e:
+                logger.error(f"Failed to persist incident {incident_id}: {e}")
+    
+    @staticmethod
+    def _response_targets(action: ResponseAction, incident: SecurityIncident) -> Optional[List[str]]:
+        """Assets or indicators an action applies to, or None for incident-level actions"""
+        if action not in ACTION_TARGETS:
+            return None
+        kinds, evidence_field = ACTION_TARGETS[action]
+        targets = {}
+        for observable in (*incident.affected_assets, *incident.indicators):
+            observable = normalize_observable(observable)
+            kind, sep, value = observable.partition(":")
+            if sep:
+                try:
+                    # A bare IPv6 address is a host, not "kind:value"
+                    ipaddress.ip_address(observable)
+                    kind, value = "", observable
+                except ValueError:
+                    pass
+            else:
+                kind, value = "", observable
+            if kind in kinds:
+                targets[value] = None
+        if evidence_field and incident.evidence.get(evidence_field):
+            targets[normalize_observable(str(incident.evidence[evidence_field]))] = None
+        return list(targets)
+    
+    async def trigger_automated_response(self, incident: SecurityIncident):
+        """Run the response playbook registered for the incident's severity
+
+        Playbooks are lists of actions, ``PlaybookStep``s or dicts with
+        ``action`` and ``depends_on``; see ``PlaybookEngine``. Actions in
+        ``ACTION_TARGETS`` run once per matching asset or indicator, and
+        succeed at most once per target across incidents. Callers that
+        aggregate alerts themselves, like the security pipeline's respond
+        stage, run it for the incidents ``aggregate_alert`` says need it.
+        """
+        playbook = self.response_playbooks.get(incident.severity.name, [])
+        if not playbook:
+            return None
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        try:
+            run = await self.playbook_engine.execute(incident, playbook)
+        except Exception as e:
+            logger.error(f"Response playbook failed for incident {incident.incident_id}: {e}")
+            return None
+        finally:
+            if timed:
+                self._stage_response.record_since(start)
+        
+        for action, counts in run.summary().items():
+            if counts.get(APPLIED) and action.value not in incident.response_actions:
+                incident.response_actions.append(action.value)
+            incident.timeline.append({
+                "timestamp": run.finished_at.isoformat(),
+                "event": "response_action",
+                "action": action.value,
+                "applied": counts.get(APPLIED, 0),
+                "duplicate": counts.get(DUPLICATE, 0),
+                "failed": counts.get(FAILED, 0)
+            })
+        if run.contained_at and incident.status in (IncidentStatus.OPEN, IncidentStatus.INVESTIGATING):
+            incident.status = IncidentStatus.CONTAINED
+            incident.evidence["time_to_containment"] = (run.contained_at - incident.created_at).total_seconds()
+            incident.timeline.append({
+                "timestamp": run.contained_at.isoformat(),
+                "event": "contained",
+                "time_to_containment": incident.evidence["time_to_containment"]
+            })
+            self._notify(incident, "Contained")
+        incident.updated_at = datetime.utcnow()
+        self.incident_index.update(incident)
+        if self.redis_writer:
+            self._persist_later(incident)
+        return run
+    
+    async def shutdown(self):
+        """Deliver queued notifications, flush pending Redis writes and close the connection"""
+        if self._restore_task and not self._restore_task.done():
+            self._restore_task.cancel()
+            await asyncio.gather(self._restore_task, return_exceptions=True)
+        await self.metrics.close()
+        await self.notifier.close()
+        await self.active_incidents.close()
+        if self._persist_task:
+            self._persist_task.cancel()
+        if self.redis_writer:
+            await self.flush_incidents()
+            await self.redis_writer.close()
+        if self.redis_client:
+            await self.redis_client.close()
+    
     async def get_incident_status(self, incident_id: str) -> Optional[Dict]:
         """Get current incident status"""
-        incident = self.active_incidents.get(incident_id)
+        incident = await self._get_incident(incident_id)
         if incident:
-            return incident.to_dict()
+            return self.incident_index.to_dict(incident)
         return None
     
-    async def list_active_incidents(self) -> List[Dict]:
-        """List all active incidents"""
-        return [incident.to_dict() for incident in self.active_incidents.values()]
+    async def update_incident(self, incident_id: str, status: Optional[IncidentStatus] = None,
+                              assigned_analyst: Optional[str] = None) -> Optional[SecurityIncident]:
+        """Change an incident's status or analyst, keeping indexes and Redis current
+
+        Closed incidents leave the active set; resolved and closed ones
+        no longer absorb new alerts.
+        """
+        incident = await self._get_incident(incident_id)
+        if incident is None:
+            return None
+        now = datetime.utcnow()
+        if status is not None and status != incident.status:
+            incident.timeline.append({
+                "timestamp": now.isoformat(),
+                "event": "status_changed",
+                "from": incident.status.value,
+                "to": status.value
+            })
+            incident.status = status
+        if assigned_analyst is not None and assigned_analyst != incident.assigned_analyst:
+            incident.timeline.append({
+                "timestamp": now.isoformat(),
+                "event": "assigned",
+                "analyst": assigned_analyst
+            })
+            incident.assigned_analyst = assigned_analyst
+        incident.updated_at = now
+        
+        if incident.status in (IncidentStatus.RESOLVED, IncidentStatus.CLOSED):
+            self.incident_aggregator.close(incident_id)
+        if incident.status == IncidentStatus.RESOLVED:
+            self.active_incidents.expire_in(incident_id, self.resolved_retention)
+        elif incident.status != IncidentStatus.CLOSED:
+            self.active_incidents.expire_in(incident_id, None)
+        if self.redis_writer:
+            await self._persist_incident(incident)
+        if incident.status == IncidentStatus.CLOSED:
+            del self.active_incidents[incident_id]
+            self.incident_index.remove(incident_id)
+            if not self.restore_ready.is_set():
+                self._closed_during_restore.add(incident_id)
+        else:
+            self.incident_index.update(incident)
+        return incident
+    
+    @staticmethod
+    def _incident_filters(status, severity, assigned_analyst, source_system, asset) -> Dict[str, Any]:
+        if isinstance(severity, str):
+            severity = IncidentSeverity[severity]
+        if isinstance(status, str):
+            status = IncidentStatus(status)
+        return {"status": status, "severity": severity, "assigned_analyst": assigned_analyst,
+                "source_system": source_system, "asset": asset}
+    
+    async def query_incidents(self, status: Optional[IncidentStatus] = None,
+                              severity: Optional[IncidentSeverity] = None,
+                              assigned_analyst: Optional[str] = None,
+                              source_system: Optional[str] = None,
+                              asset: Optional[str] = None,
+                              limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of active incidents, newest first, matching every given filter
+
+        Severity and status may also be given by name or value. Pass the
+        returned ``next_cursor`` back to read the following page; it is
+        None on the last page. ``complete`` is false while incidents are
+        still being restored. The incident dicts are cached and shared, so
+        treat them as read-only.
+        """
+        filters = self._incident_filters(status, severity, assigned_analyst, source_system, asset)
+        page, next_cursor = self.incident_index.query(filters, limit, cursor)
+        return {"incidents": [self.incident_index.to_dict(incident) for incident in page],
+                "next_cursor": next_cursor, "complete": self.restore_ready.is_set()}
+    
+    async def query_incidents_json(self, status: Optional[IncidentStatus] = None,
+                                   severity: Optional[IncidentSeverity] = None,
+                                   assigned_analyst: Optional[str] = None,
+                                   source_system: Optional[str] = None,
+                                   asset: Optional[str] = None,
+                                   limit: int = 100, cursor: Optional[str] = None) -> str:
+        """``query_incidents`` as a JSON document assembled from cached incident JSON
+
+        ``complete`` is false while incidents are still being restored.
+        """
+        filters = self._incident_filters(status, severity, assigned_analyst, source_system, asset)
+        page, next_cursor = self.incident_index.query(filters, limit, cursor)
+        incidents = ",".join(self.incident_index.to_json(incident) for incident in page)
+        return (f'{{"incidents":[{incidents}],"next_cursor":{json.dumps(next_cursor)},'
+                f'"complete":{json.dumps(self.restore_ready.is_set())}}}')
+    
+    async def list_active_incidents(self, status: Optional[IncidentStatus] = None,
+                                    severity: Optional[IncidentSeverity] = None,
+                                    assigned_analyst: Optional[str] = None,
+                                    source_system: Optional[str] = None,
+                                    asset: Optional[str] = None,
+                                    limit: Optional[int] = None) -> List[Dict]:
+        """List active incidents, newest first; use query_incidents to page through them"""
+        filters = self._incident_filters(status, severity, assigned_analyst, source_system, asset)
+        page, _ = self.incident_index.query(filters, limit)
+        return [self.incident_index.to_dict(incident) for incident in page]
 
 async def main():
     """Main function for testing incident response orchestrator"""
@@ -188,4 +793,5 @@ async def main():
     print(f"Created incident: {incident.incident_id}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+XORB Incident Aggregation
+Alert fingerprinting and an indicator-to-incident index that fold alert storms into open incidents
+"""
+
+import functools
+import hashlib
+import ipaddress
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Indicators that name the detection, not an observable; they are part of
+# the fingerprint but never used to join unrelated alerts
+GENERIC_INDICATOR_PREFIXES = ("rule:", "correlation:", "ml:")
+
+# Alert storms repeat the same few observables, so their normal forms are memoized
+@functools.lru_cache(maxsize=65536)
+def normalize_observable(value: str) -> str:
+    """Canonical form of an indicator or asset: trimmed, lower-case, compressed IPs
+
+    ``"Host: 10.0.0.1 "`` and ``"host:10.0.0.1"`` normalize alike, as do
+    differently written IPv6 addresses.
+    """
+    value = value.strip().lower()
+    kind, sep, rest = value.partition(":")
+    if sep and not rest.startswith(":") and "." not in kind:
+        # "type:value", but not a bare IPv6 address
+        try:
+            ipaddress.ip_address(kind)
+        except ValueError:
+            rest = rest.strip()
+            try:
+                return f"{kind}:{ipaddress.ip_address(rest).compressed}"
+            except ValueError:
+                return f"{kind}:{rest}"
+    try:
+        return ipaddress.ip_address(value).compressed
+    except ValueError:
+        return value
+
+class AlertFingerprint:
+    """Normalized identity of an alert"""
+    __slots__ = ("category", "assets", "indicators", "digest")
+
+    def __init__(self, category: str, assets: Iterable[str], indicators: Iterable[str]):
+        self.category = category.strip().lower()
+        self.assets = sorted({normalize_observable(a) for a in assets if a})
+        self.indicators = sorted({normalize_observable(i) for i in indicators if i})
+        material = "\x1f".join([self.category, "\x1e".join(self.assets), "\x1e".join(self.indicators)])
+        self.digest = hashlib.blake2b(material.encode(), digest_size=16).hexdigest()
+
+    def join_keys(self) -> List[str]:
+        """Index keys that let a different alert join the same incident"""
+        keys = [f"indicator:{i}" for i in self.indicators if not i.startswith(GENERIC_INDICATOR_PREFIXES)]
+        keys.extend(f"asset:{a}" for a in self.assets)
+        return keys
+
+class _OpenIncident:
+    __slots__ = ("incident_id", "category", "keys", "assets", "indicators", "expires_at", "merged")
+
+    def __init__(self, incident_id: str, category: str, expires_at: float):
+        self.incident_id = incident_id
+        self.category = category
+        self.keys: Set[str] = set()
+        self.assets: Set[str] = set()
+        self.indicators: Set[str] = set()
+        self.expires_at = expires_at
+        self.merged = 0
+
+class IncidentAggregator:
+    """Maps alert fingerprints and observables to the open incident they belong to
+
+    An incident stays open for aggregation until ``window`` seconds pass
+    without a matching alert. Lookups go through a dict keyed on
+    (category, observable) and on the exact fingerprint digest, so an
+    alert costs O(number of its indicators and assets) regardless of how
+    many incidents are open. Open incidents are kept in last-seen order,
+    which lets expiry pop them from the front without scanning.
+    """
+
+    def __init__(self, window: float = 900.0, max_open: int = 100000,
+                 clock=time.monotonic):
+        self.window = window
+        self.max_open = max_open
+        self.clock = clock
+        self._open: "OrderedDict[str, _OpenIncident]" = OrderedDict()
+        self._index: Dict[Tuple[str, str], str] = {}
+        self.stats = {"alerts": 0, "merged": 0, "opened": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def match(self, fingerprint: AlertFingerprint) -> Optional[str]:
+        """Open incident id the alert belongs to, if any"""
+        self.stats["alerts"] += 1
+        self._expire(self.clock())
+        incident_id = self._index.get((fingerprint.category, fingerprint.digest))
+        if incident_id is None:
+            for key in fingerprint.join_keys():
+                incident_id = self._index.get((fingerprint.category, key))
+                if incident_id is not None:
+                    break
+        return incident_id
+
+    def open(self, incident_id: str, fingerprint: AlertFingerprint):
+        """Start aggregating alerts into a newly created incident"""
+        now = self.clock()
+        self._expire(now)
+        state = _OpenIncident(incident_id, fingerprint.category, now + self.window)
+        self._open[incident_id] = state
+        self.stats["opened"] += 1
+        self._add(state, fingerprint)
+        while len(self._open) > self.max_open:
+            self._close(next(iter(self._open.values())))
+
+    def merge(self, incident_id: str, fingerprint: AlertFingerprint) -> Tuple[List[str], List[str]]:
+        """Fold an alert into an open incident; returns its new (assets, indicators)"""
+        state = self._open[incident_id]
+        state.expires_at = self.clock() + self.window
+        state.merged += 1
+        self._open.move_to_end(incident_id)
+        self.stats["merged"] += 1
+        return self._add(state, fingerprint)
+
+    def close(self, incident_id: str):
+        """Stop aggregating into an incident, e.g. once it is resolved"""
+        state = self._open.get(incident_id)
+        if state is not None:
+            self._close(state)
+
+    def _add(self, state: _OpenIncident, fingerprint: AlertFingerprint) -> Tuple[List[str], List[str]]:
+        new_assets = [a for a in fingerprint.assets if a not in state.assets]
+        new_indicators = [i for i in fingerprint.indicators if i not in state.indicators]
+        state.assets.update(new_assets)
+        state.indicators.update(new_indicators)
+        # Alerts only ever join incidents of their own category
+        for key in (fingerprint.digest, *fingerprint.join_keys()):
+            if key not in state.keys:
+                state.keys.add(key)
+                # An observable already owned by another open incident stays with it
+                self._index.setdefault((state.category, key), state.incident_id)
+        return new_assets, new_indicators
+
+    def _close(self, state: _OpenIncident):
+        del self._open[state.incident_id]
+        for key in state.keys:
+            if self._index.get((state.category, key)) == state.incident_id:
+                del self._index[(state.category, key)]
+
+    def _expire(self, now: float):
+        while self._open:
+            state = next(iter(self._open.values()))
+            if state.expires_at > now:
+                break
+            self._close(state)
+            self.stats["expired"] += 1
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+XORB Incident Index
+Secondary indexes, cursor pagination and cached serialization for active incidents
+"""
+
+import bisect
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from incident_aggregation import normalize_observable
+
+logger = logging.getLogger(__name__)
+
+# Naive timestamps are UTC, as datetime.utcnow() produces
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Single-valued incident attributes with an index each
+INDEXED_FIELDS = ("status", "severity", "assigned_analyst", "source_system")
+
+def _key(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+class IncidentIndex:
+    """Indexes incidents by field and affected asset, newest first
+
+    Every incident gets an integer order key from its ``created_at`` (in
+    microseconds, bumped on ties), so incidents restored out of order
+    still page newest first. Each (field, value) and each asset keeps a
+    sorted list of the keys holding it, so a page is a bisect to the
+    cursor followed by a walk of ``limit`` entries down the shortest
+    matching list; other filters are checked per entry. Callers report
+    changes with ``update``, which moves the incident between lists.
+    ``add_many`` appends out-of-order keys and leaves the lists to be
+    sorted the next time they are read.
+
+    ``to_dict`` and ``to_json`` cache each incident's serialized form until
+    its ``updated_at`` changes, so an unchanged incident is serialized once
+    however often it is polled.
+    """
+
+    def __init__(self, serialize: Callable[[Any], Dict[str, Any]] = lambda incident: incident.to_dict()):
+        self.serialize = serialize
+        self._order: List[int] = []
+        self._by_seq: Dict[int, Any] = {}
+        self._seq: Dict[str, int] = {}
+        # incident_id -> indexed field values, and its normalized assets
+        self._fields: Dict[str, Dict[str, Any]] = {}
+        self._assets: Dict[str, Set[str]] = {}
+        self._postings: Dict[Tuple[str, Any], List[int]] = {}
+        # Lists appended to out of order; None stands for _order
+        self._unsorted: Set[Optional[Tuple[str, Any]]] = set()
+        self._cache: Dict[str, Tuple[Any, Dict[str, Any], str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, incident_id: str) -> bool:
+        return incident_id in self._seq
+
+    def _sorted(self, key: Optional[Tuple[str, Any]]) -> Optional[List[int]]:
+        postings = self._order if key is None else self._postings.get(key)
+        if key in self._unsorted:
+            self._unsorted.discard(key)
+            # Timsort merges the appended runs with the sorted prefix
+            postings.sort()
+        return postings
+
+    def _post(self, key: Tuple[str, Any], seq: int):
+        postings = self._postings.setdefault(key, [])
+        if not postings or postings[-1] < seq or key in self._unsorted:
+            postings.append(seq)
+        else:
+            bisect.insort(postings, seq)
+
+    def _unpost(self, key: Tuple[str, Any], seq: int):
+        postings = self._sorted(key)
+        if postings is None:
+            return
+        position = bisect.bisect_left(postings, seq)
+        if position < len(postings) and postings[position] == seq:
+            del postings[position]
+            if not postings:
+                del self._postings[key]
+
+    def _assign(self, incident: Any) -> int:
+        created_at = incident.created_at
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        seq = (created_at - _EPOCH) // _MICROSECOND
+        while seq in self._by_seq:
+            seq += 1
+        self._seq[incident.incident_id] = seq
+        self._by_seq[seq] = incident
+        self._fields[incident.incident_id] = {name: _key(getattr(incident, name)) for name in INDEXED_FIELDS}
+        self._assets[incident.incident_id] = set()
+        return seq
+
+    def add(self, incident: Any):
+        """Index an incident"""
+        if incident.incident_id in self._seq:
+            self.update(incident, incident.affected_assets)
+            return
+        seq = self._assign(incident)
+        if not self._order or self._order[-1] < seq or None in self._unsorted:
+            self._order.append(seq)
+        else:
+            bisect.insort(self._order, seq)
+        for name, value in self._fields[incident.incident_id].items():
+            self._post((name, value), seq)
+        self._add_assets(incident.incident_id, seq, incident.affected_assets)
+
+    def add_many(self, incidents: Iterable[Any]):
+        """Index incidents arriving in any order, such as during a restore
+
+        Inserting them one by one would shift the lists on every insert;
+        instead each list is appended to and sorted once when next read.
+        """
+        for incident in incidents:
+            if incident.incident_id in self._seq:
+                self.update(incident, incident.affected_assets)
+                continue
+            seq = self._assign(incident)
+            if self._order and self._order[-1] > seq:
+                self._unsorted.add(None)
+            self._order.append(seq)
+            keys = list(self._fields[incident.incident_id].items())
+            assets = self._assets[incident.incident_id]
+            for asset in incident.affected_assets:
+                asset = normalize_observable(asset)
+                if asset not in assets:
+                    assets.add(asset)
+                    keys.append(("asset", asset))
+            for key in keys:
+                postings = self._postings.setdefault(key, [])
+                if postings and postings[-1] > seq:
+                    self._unsorted.add(key)
+                postings.append(seq)
+
+    def _add_assets(self, incident_id: str, seq: int, assets: Iterable[str]):
+        indexed = self._assets[incident_id]
+        for asset in assets:
+            asset = normalize_observable(asset)
+            if asset not in indexed:
+                indexed.add(asset)
+                self._post(("asset", asset), seq)
+
+    def update(self, incident: Any, added_assets: Iterable[str] = ()):
+        """Re-index an incident's fields after a change
+
+        Assets are only ever added to an incident, so pass just the new ones
+        rather than re-reading ``affected_assets``.
+        """
+        seq = self._seq.get(incident.incident_id)
+        if seq is None:
+            self.add(incident)
+            return
+        fields = self._fields[incident.incident_id]
+        for name in INDEXED_FIELDS:
+            value = _key(getattr(incident, name))
+            if fields[name] != value:
+                self._unpost((name, fields[name]), seq)
+                self._post((name, value), seq)
+                fields[name] = value
+        self._add_assets(incident.incident_id, seq, added_assets)
+
+    def remove(self, incident_id: str):
+        seq = self._seq.pop(incident_id, None)
+        if seq is None:
+            return
+        del self._by_seq[seq]
+        order = self._sorted(None)
+        del order[bisect.bisect_left(order, seq)]
+        for name, value in self._fields.pop(incident_id).items():
+            self._unpost((name, value), seq)
+        for asset in self._assets.pop(incident_id):
+            self._unpost(("asset", asset), seq)
+        self._cache.pop(incident_id, None)
+
+    def query(self, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = 100,
+              cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+        """One page of matching incidents, newest first, and the cursor for the next page
+
+        ``filters`` maps field names from ``INDEXED_FIELDS`` or ``"asset"``
+        to the value to match; ``cursor`` is the one returned for the
+        previous page, and ``limit=None`` returns every match.
+        """
+        filters = {name: (normalize_observable(value) if name == "asset" else _key(value))
+                   for name, value in (filters or {}).items() if value is not None}
+        for name in filters:
+            if name != "asset" and name not in INDEXED_FIELDS:
+                raise ValueError(f"Incidents are not indexed by {name}")
+
+        candidates = self._sorted(None)
+        for name, value in filters.items():
+            postings = self._sorted((name, value)) or []
+            if len(postings) < len(candidates):
+                candidates = postings
+        end = len(candidates) if cursor is None else bisect.bisect_left(candidates, int(cursor))
+
+        page: List[Any] = []
+        last_seq = None
+        position = end - 1
+        while position >= 0 and (limit is None or len(page) < limit):
+            seq = candidates[position]
+            position -= 1
+            incident = self._by_seq[seq]
+            if filters and not self._matches(incident.incident_id, filters):
+                continue
+            page.append(incident)
+            last_seq = seq
+        # Only hand out a cursor if there may be more to read
+        next_cursor = str(last_seq) if position >= 0 and last_seq is not None else None
+        return page, next_cursor
+
+    def _matches(self, incident_id: str, filters: Dict[str, Any]) -> bool:
+        fields = self._fields[incident_id]
+        for name, value in filters.items():
+            if name == "asset":
+                if value not in self._assets[incident_id]:
+                    return False
+            elif fields[name] != value:
+                return False
+        return True
+
+    def _cached(self, incident: Any) -> Tuple[Dict[str, Any], str]:
+        entry = self._cache.get(incident.incident_id)
+        if entry is None or entry[0] != incident.updated_at:
+            data = self.serialize(incident)
+            entry = (incident.updated_at, data, json.dumps(data))
+            self._cache[incident.incident_id] = entry
+        return entry[1], entry[2]
+
+    def to_dict(self, incident: Any) -> Dict[str, Any]:
+        """Cached serialized incident; shared between callers, so treat it as read-only"""
+        return self._cached(incident)[0]
+
+    def to_json(self, incident: Any) -> str:
+        return self._cached(incident)[1]
+
+    def counts(self, name: str) -> Dict[Any, int]:
+        """Number of incidents per value of an indexed field"""
+        return {value: len(postings) for (field, value), postings in self._postings.items() if field == name}
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+XORB Threat Indicator Index
+Compiled IP/CIDR, hash and domain indicator lookups shared by the security services
+"""
+
+import bisect
+import ipaddress
+import logging
+import re
+import socket
+import threading
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# MD5, SHA-1 and SHA-256 digests
+_HASH_PATTERN = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64})$")
+
+# Snapshots rebuild their arrays once this many incremental additions pile up
+OVERLAY_LIMIT = 1024
+
+# Scalar IPv4 lookups in large snapshots first jump to the /16 bucket of the address
+BUCKET_SHIFT = 16
+BUCKET_COUNT = 1 << (32 - BUCKET_SHIFT)
+
+# Batch lookups at least this large are sorted before searching
+SORTED_PROBE_THRESHOLD = 4096
+
+def _parse_ipv4_cidr(value: str) -> Optional[Tuple[int, int]]:
+    """Parse an IPv4 address or CIDR into an inclusive (start, end) range"""
+    address, _, prefix = value.partition("/")
+    if address.count(".") != 3:
+        return None
+    try:
+        start = int.from_bytes(socket.inet_aton(address), "big")
+        prefix_len = int(prefix) if prefix else 32
+    except (OSError, ValueError):
+        return None
+    if not 0 <= prefix_len <= 32:
+        return None
+    host_bits = 32 - prefix_len
+    start = (start >> host_bits) << host_bits
+    return start, start + (1 << host_bits) - 1
+
+def ipv4_column(addresses: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack IPv4 strings into a uint32 column plus a validity mask
+
+    Entries that are not dotted-quad IPv4 (IPv6, empty, malformed) are 0
+    with a False mask value.
+    """
+    try:
+        if all(a.count(".") == 3 for a in addresses):
+            packed = b"".join([socket.inet_aton(a) for a in addresses])
+            column = np.frombuffer(packed, dtype=">u4").astype(np.uint32)
+            return column, np.ones(len(addresses), dtype=bool)
+    except (AttributeError, OSError, TypeError):
+        pass
+
+    # Slow path for batches containing IPv6, empty or malformed addresses
+    column = np.zeros(len(addresses), dtype=np.uint32)
+    valid = np.zeros(len(addresses), dtype=bool)
+    for i, address in enumerate(addresses):
+        if isinstance(address, str) and address.count(".") == 3:
+            try:
+                column[i] = int.from_bytes(socket.inet_aton(address), "big")
+                valid[i] = True
+            except OSError:
+                pass
+    return column, valid
+
+def _parse_ipv6_cidr(value: str) -> Optional[Tuple[int, int]]:
+    """Parse an IPv6 address or CIDR into an inclusive (start, end) range"""
+    try:
+        network = ipaddress.IPv6Network(value, strict=False)
+    except ValueError:
+        return None
+    return int(network.network_address), int(network.broadcast_address)
+
+def _merge_ranges(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort and merge overlapping or adjacent ranges into disjoint intervals"""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > running_end[:-1] + 1
+    group_first = np.flatnonzero(new_group)
+    group_last = np.append(group_first[1:] - 1, len(starts) - 1)
+    return starts[group_first], running_end[group_last]
+
+def _merge_big_ranges(ranges: List[Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+    """Merge ranges of arbitrary-precision ints (IPv6) into disjoint intervals"""
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+def _normalize_domain(domain: str) -> str:
+    return domain.strip().rstrip(".").lower()
+
+class IndicatorSnapshot:
+    """Immutable, compiled set of threat indicators
+
+    IPv4 prefixes are merged into sorted disjoint intervals and searched with
+    binary search, so a lookup costs O(log n) regardless of how many CIDRs
+    overlap. IPv6 prefixes use the same scheme over Python ints. Hashes and
+    domains are hash sets; a blocklisted domain also matches its subdomains.
+    """
+
+    def __init__(self,
+                 ipv4_ranges: Iterable[Tuple[int, int]] = (),
+                 ipv6_ranges: Iterable[Tuple[int, int]] = (),
+                 hashes: Iterable[str] = (),
+                 domains: Iterable[str] = (),
+                 version: int = 0,
+                 indicator_count: int = 0):
+        ipv4_ranges = list(ipv4_ranges)
+        self._set_ipv4(np.array([r[0] for r in ipv4_ranges], dtype=np.int64),
+                       np.array([r[1] for r in ipv4_ranges], dtype=np.int64))
+        self.ipv6_starts, self.ipv6_ends = _merge_big_ranges(list(ipv6_ranges))
+        self.hashes = frozenset(h.lower() for h in hashes)
+        self.domains = frozenset(_normalize_domain(d) for d in domains)
+        self.version = version
+        self.indicator_count = indicator_count
+
+    @classmethod
+    def from_indicators(cls, indicators: Iterable[str], version: int = 0) -> 'IndicatorSnapshot':
+        """Compile raw indicator strings, classifying each as IP/CIDR, hash or domain
+
+        Indicators may carry a type prefix (``ip:``, ``cidr:``, ``hash:``,
+        ``domain:``) as used in incident indicator lists; unprefixed values
+        are classified by shape.
+        """
+        ipv4_ranges: List[Tuple[int, int]] = []
+        ipv6_ranges: List[Tuple[int, int]] = []
+        hashes: List[str] = []
+        domains: List[str] = []
+        count = 0
+
+        for raw in indicators:
+            if isinstance(raw, bytes):
+                raw = raw.decode()
+            kind, sep, value = raw.partition(":")
+            if not sep or kind not in ("ip", "cidr", "hash", "file_hash", "domain"):
+                kind, value = "", raw
+            value = value.strip()
+            count += 1
+
+            if kind in ("", "ip", "cidr"):
+                ipv4 = _parse_ipv4_cidr(value)
+                if ipv4 is not None:
+                    ipv4_ranges.append(ipv4)
+                    continue
+                if ":" in value:
+                    ipv6 = _parse_ipv6_cidr(value)
+                    if ipv6 is not None:
+                        ipv6_ranges.append(ipv6)
+                        continue
+                if kind:
+                    logger.warning(f"Ignoring malformed IP indicator {raw!r}")
+                    count -= 1
+                    continue
+
+            if kind in ("hash", "file_hash") or (not kind and _HASH_PATTERN.match(value.lower())):
+                hashes.append(value)
+            elif value:
+                domains.append(value)
+            else:
+                count -= 1
+
+        return cls(ipv4_ranges, ipv6_ranges, hashes, domains, version=version, indicator_count=count)
+
+    @classmethod
+    def merge(cls, first: 'IndicatorSnapshot', second: 'IndicatorSnapshot') -> 'IndicatorSnapshot':
+        """Combine two compiled snapshots without re-parsing their sources"""
+        snapshot = cls.__new__(cls)
+        snapshot._set_ipv4(np.concatenate([first.ipv4_starts, second.ipv4_starts]),
+                           np.concatenate([first.ipv4_ends, second.ipv4_ends]))
+        snapshot.ipv6_starts, snapshot.ipv6_ends = _merge_big_ranges(
+            list(zip(first.ipv6_starts, first.ipv6_ends)) + list(zip(second.ipv6_starts, second.ipv6_ends))
+        )
+        snapshot.hashes = first.hashes | second.hashes
+        snapshot.domains = first.domains | second.domains
+        snapshot.version = max(first.version, second.version)
+        snapshot.indicator_count = len(first) + len(second)
+        return snapshot
+
+    def _set_ipv4(self, starts: np.ndarray, ends: np.ndarray):
+        self.ipv4_starts, self.ipv4_ends = _merge_ranges(starts, ends)
+        # array('q') gives bisect C-level item access for scalar lookups, and
+        # the /16 bucket offsets narrow each search to a handful of intervals
+        self._ipv4_starts_scalar = array("q", self.ipv4_starts.tobytes())
+        self._ipv4_ends_scalar = array("q", self.ipv4_ends.tobytes())
+        self._ipv4_buckets = None
+        if len(self.ipv4_starts) >= BUCKET_COUNT:
+            buckets = np.arange(BUCKET_COUNT + 1, dtype=np.int64) << BUCKET_SHIFT
+            self._ipv4_buckets = array("q", np.searchsorted(self.ipv4_starts, buckets).astype(np.int64).tobytes())
+
+    def __len__(self) -> int:
+        return self.indicator_count
+
+    def contains_ipv4_int(self, address: int) -> bool:
+        """Scalar check for an IPv4 address already parsed to an int; skips the parse ``contains_ip`` pays"""
+        buckets = self._ipv4_buckets
+        if buckets is None:
+            index = bisect.bisect_right(self._ipv4_starts_scalar, address) - 1
+        else:
+            # Intervals before the bucket all start below the address, so only
+            # the last of them can still cover it
+            bucket = address >> BUCKET_SHIFT
+            low = buckets[bucket]
+            index = bisect.bisect_right(self._ipv4_starts_scalar, address,
+                                        low - 1 if low else 0, buckets[bucket + 1]) - 1
+        return index >= 0 and address <= self._ipv4_ends_scalar[index]
+
+    def contains_ip(self, address: str) -> bool:
+        """Check whether an IPv4 or IPv6 address falls inside any indicator prefix"""
+        if address.count(".") == 3:
+            try:
+                return self.contains_ipv4_int(int.from_bytes(socket.inet_aton(address), "big"))
+            except OSError:
+                return False
+        try:
+            value = int(ipaddress.IPv6Address(address))
+        except ValueError:
+            return False
+        index = bisect.bisect_right(self.ipv6_starts, value) - 1
+        return index >= 0 and value <= self.ipv6_ends[index]
+
+    def contains_ipv4_many(self, addresses: np.ndarray) -> np.ndarray:
+        """Vectorized membership test for an array of integer IPv4 addresses"""
+        addresses = np.asarray(addresses).astype(np.int64, copy=False)
+        if not len(self.ipv4_starts):
+            return np.zeros(len(addresses), dtype=bool)
+        if len(addresses) < SORTED_PROBE_THRESHOLD:
+            return self._contains_sorted_or_small(addresses)
+        # Probing in address order keeps the binary searches cache friendly
+        order = np.argsort(addresses)
+        hits = np.empty(len(addresses), dtype=bool)
+        hits[order] = self._contains_sorted_or_small(addresses[order])
+        return hits
+
+    def _contains_sorted_or_small(self, addresses: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(self.ipv4_starts, addresses, side="right") - 1
+        found = index >= 0
+        index[~found] = 0
+        return found & (addresses <= self.ipv4_ends[index])
+
+    def contains_ips(self, addresses: List[str]) -> np.ndarray:
+        """Membership test for a sequence of address strings"""
+        column, valid = ipv4_column(addresses)
+        hits = self.contains_ipv4_many(column) & valid
+        for i in np.flatnonzero(~valid):
+            hits[i] = self.contains_ip(addresses[i] or "")
+        return hits
+
+    def contains_hash(self, digest: str) -> bool:
+        return digest.lower() in self.hashes
+
+    def contains_domain(self, domain: str) -> bool:
+        """Check a domain and each of its parent domains against the blocklist"""
+        labels = _normalize_domain(domain).split(".")
+        return any(".".join(labels[i:]) in self.domains for i in range(len(labels)))
+
+    def __contains__(self, indicator: str) -> bool:
+        kind, sep, value = indicator.partition(":")
+        if sep and kind in ("ip", "cidr"):
+            return self.contains_ip(value.split("/")[0])
+        if sep and kind in ("hash", "file_hash"):
+            return self.contains_hash(value)
+        if sep and kind == "domain":
+            return self.contains_domain(value)
+        return (self.contains_ip(indicator) or self.contains_hash(indicator)
+                or self.contains_domain(indicator))
+
+class IndicatorIndex:
+    """Threat indicator index with lock-free reads and atomic snapshot swaps
+
+    Readers always go through the current ``IndicatorSnapshot``, which is
+    never mutated. Bulk loads compile a complete new snapshot and publish it
+    with a single reference assignment; single additions are kept in a small
+    overlay snapshot that is folded into the main arrays when it grows.
+    """
+
+    def __init__(self):
+        self._snapshot: IndicatorSnapshot = IndicatorSnapshot()
+        self._base = self._snapshot
+        self._overlay = IndicatorSnapshot()
+        self._write_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> IndicatorSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def load(self, indicators: Iterable[str]) -> IndicatorSnapshot:
+        """Compile a full indicator feed and swap it in"""
+        snapshot = IndicatorSnapshot.from_indicators(indicators)
+        self.swap(snapshot)
+        logger.info(f"Loaded indicator snapshot v{snapshot.version} with {len(snapshot)} indicators")
+        return snapshot
+
+    def swap(self, snapshot: IndicatorSnapshot):
+        """Publish a snapshot compiled elsewhere, e.g. in a worker thread"""
+        with self._write_lock:
+            snapshot.version = self.version + 1
+            self._base = snapshot
+            self._overlay = IndicatorSnapshot()
+            self._snapshot = snapshot
+
+    def add(self, indicator: str):
+        """Add a single indicator without recompiling the full feed"""
+        with self._write_lock:
+            self._overlay = IndicatorSnapshot.merge(
+                self._overlay, IndicatorSnapshot.from_indicators([indicator])
+            )
+            if len(self._overlay) >= OVERLAY_LIMIT:
+                self._base = IndicatorSnapshot.merge(self._base, self._overlay)
+                self._overlay = IndicatorSnapshot()
+                snapshot = self._base
+            else:
+                snapshot = _OverlaySnapshot(self._base, self._overlay)
+            snapshot.version = self.version + 1
+            self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def __contains__(self, indicator: str) -> bool:
+        return indicator in self._snapshot
+
+    def contains_ip(self, address: str) -> bool:
+        return self._snapshot.contains_ip(address)
+
+    def contains_ipv4_int(self, address: int) -> bool:
+        return self._snapshot.contains_ipv4_int(address)
+
+    def contains_ipv4_many(self, addresses: np.ndarray) -> np.ndarray:
+        return self._snapshot.contains_ipv4_many(addresses)
+
+    def contains_ips(self, addresses: List[str]) -> np.ndarray:
+        return self._snapshot.contains_ips(addresses)
+
+    def contains_hash(self, digest: str) -> bool:
+        return self._snapshot.contains_hash(digest)
+
+    def contains_domain(self, domain: str) -> bool:
+        return self._snapshot.contains_domain(domain)
+
+class _OverlaySnapshot(IndicatorSnapshot):
+    """Read-only union of a compiled base snapshot and a small overlay"""
+
+    def __init__(self, base: IndicatorSnapshot, overlay: IndicatorSnapshot):
+        self.base = base
+        self.overlay = overlay
+        self.version = base.version
+        self.indicator_count = len(base) + len(overlay)
+
+    def contains_ip(self, address: str) -> bool:
+        return self.base.contains_ip(address) or self.overlay.contains_ip(address)
+
+    def contains_ipv4_int(self, address: int) -> bool:
+        return self.base.contains_ipv4_int(address) or self.overlay.contains_ipv4_int(address)
+
+    def contains_ipv4_many(self, addresses: np.ndarray) -> np.ndarray:
+        return self.base.contains_ipv4_many(addresses) | self.overlay.contains_ipv4_many(addresses)
+
+    def contains_hash(self, digest: str) -> bool:
+        return self.base.contains_hash(digest) or self.overlay.contains_hash(digest)
+
+    def contains_domain(self, domain: str) -> bool:
+        return self.base.contains_domain(domain) or self.overlay.contains_domain(domain)
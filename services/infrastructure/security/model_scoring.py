@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+XORB Model Scoring Executor
+Runs ML model scoring and fitting in a process pool so the event loop never blocks
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import pickle
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Models loaded in the current worker process: name -> (version, model)
+_WORKER_MODELS: Dict[str, Tuple[int, Any]] = {}
+
+def _load_model_file(name: str, version: int, path: str) -> Any:
+    try:
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    except FileNotFoundError:
+        # Superseded and cleaned up while queued; any newer version will do
+        newest = max(glob.glob(os.path.join(os.path.dirname(path), f"{name}.*.pkl")),
+                     key=lambda p: int(p.rsplit(".", 2)[1]))
+        version = int(newest.rsplit(".", 2)[1])
+        with open(newest, "rb") as f:
+            model = pickle.load(f)
+    _WORKER_MODELS[name] = (version, model)
+    return model
+
+def _worker_init(models: Dict[str, Tuple[int, str]]):
+    """Preload every published model when a worker process starts"""
+    for name, (version, path) in models.items():
+        _load_model_file(name, version, path)
+
+def _worker_score(name: str, version: int, path: str, method: str, features: np.ndarray) -> np.ndarray:
+    loaded = _WORKER_MODELS.get(name)
+    if loaded is not None and loaded[0] >= version:
+        model = loaded[1]
+    else:
+        model = _load_model_file(name, version, path)
+    return np.asarray(getattr(model, method)(features))
+
+def _worker_fit(estimator: Any, features: np.ndarray, labels: Optional[np.ndarray]) -> Any:
+    if labels is None:
+        return estimator.fit(features)
+    return estimator.fit(features, labels)
+
+class _ScoreRequest:
+    __slots__ = ("features", "future")
+
+    def __init__(self, features: np.ndarray, future: asyncio.Future):
+        self.features = features
+        self.future = future
+
+class ModelScoringExecutor:
+    """Process-pool executor for model predict and fit calls
+
+    Published models are pickled to a private directory and preloaded by
+    every worker. Score requests are queued per (model, method) and sent
+    to the pool as micro-batches of up to ``max_batch`` rows, waiting at
+    most ``max_delay`` seconds for a batch to fill; while all workers are
+    busy, requests keep accumulating into the next batch.
+
+    Publishing a new model version is a hot reload: each batch carries the
+    version current when it was formed and workers pick up the new file on
+    their next batch, so no request is dropped or re-queued.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_batch: int = 512,
+                 max_delay: float = 0.002, model_dir: Optional[str] = None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._owned_dir = None if model_dir else tempfile.TemporaryDirectory(prefix="xorb-models-")
+        self.model_dir = model_dir or self._owned_dir.name
+        self._models: Dict[str, Tuple[int, str]] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queues: Dict[Tuple[str, str], deque] = {}
+        self._wakeups: Dict[Tuple[str, str], asyncio.Event] = {}
+        self._batchers: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._running: set = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "rows": 0, "batches": 0, "reloads": 0, "errors": 0}
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.max_workers, initializer=_worker_init,
+                                             initargs=(dict(self._models),))
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._pool
+
+    def has_model(self, name: str) -> bool:
+        return name in self._models
+
+    def model_version(self, name: str) -> int:
+        return self._models.get(name, (0, ""))[0]
+
+    def publish(self, name: str, model: Any) -> int:
+        """Make ``model`` the current version of ``name`` and return the version"""
+        version = self.model_version(name) + 1
+        path = os.path.join(self.model_dir, f"{name}.{version}.pkl")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        previous = self._models.get(name)
+        self._models[name] = (version, path)
+        if previous is not None:
+            self.stats["reloads"] += 1
+            # Keep one superseded version for batches already handed to workers
+            stale = os.path.join(self.model_dir, f"{name}.{previous[0] - 1}.pkl")
+            if os.path.exists(stale):
+                os.remove(stale)
+        logger.info(f"Published model {name} version {version}")
+        return version
+
+    async def fit(self, name: str, estimator: Any, features: np.ndarray,
+                  labels: Optional[np.ndarray] = None) -> int:
+        """Fit ``estimator`` in a worker process and hot-reload it as ``name``"""
+        loop = asyncio.get_running_loop()
+        model = await loop.run_in_executor(self._ensure_pool(), _worker_fit, estimator,
+                                           np.asarray(features), labels)
+        return self.publish(name, model)
+
+    def score(self, name: str, features: np.ndarray, method: str = "predict") -> asyncio.Future:
+        """Queue rows for ``model.method`` and return a future for their results
+
+        ``features`` is one row or a 2-D array of rows; the future resolves
+        to an array with one result per row.
+        """
+        if name not in self._models:
+            raise KeyError(f"Model {name} has not been published")
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        self._ensure_pool()
+
+        key = (name, method)
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(_ScoreRequest(features, future))
+        self.stats["requests"] += 1
+        self.stats["rows"] += len(features)
+        if key not in self._batchers:
+            self._wakeups[key] = asyncio.Event()
+            self._batchers[key] = asyncio.create_task(self._batch_loop(key))
+        self._wakeups[key].set()
+        return future
+
+    def _queued_rows(self, key: Tuple[str, str]) -> int:
+        return sum(len(request.features) for request in self._queues.get(key, ()))
+
+    async def _batch_loop(self, key: Tuple[str, str]):
+        wakeup = self._wakeups[key]
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            if not self._queues.get(key):
+                continue
+            if self._queued_rows(key) < self.max_batch:
+                await asyncio.sleep(self.max_delay)
+            await self._slots.acquire()
+
+            queue = self._queues[key]
+            batch, rows = [], 0
+            while queue and (not batch or rows + len(queue[0].features) <= self.max_batch):
+                request = queue.popleft()
+                batch.append(request)
+                rows += len(request.features)
+            if queue:
+                wakeup.set()
+            task = asyncio.create_task(self._run_batch(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, key: Tuple[str, str], batch: List[_ScoreRequest]):
+        name, method = key
+        version, path = self._models[name]
+        features = batch[0].features if len(batch) == 1 else np.vstack([r.features for r in batch])
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self._pool, _worker_score, name, version,
+                                                 path, method, features)
+            self.stats["batches"] += 1
+            offset = 0
+            for request in batch:
+                count = len(request.features)
+                if not request.future.done():
+                    request.future.set_result(results[offset:offset + count])
+                offset += count
+        except Exception as e:
+            logger.error(f"Model scoring batch for {name}.{method} failed: {e}")
+            self.stats["errors"] += 1
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Finish queued requests and shut down the worker pool"""
+        while any(self._queues.values()) or self._running:
+            pending = [r.future for queue in self._queues.values() for r in queue]
+            await asyncio.gather(*pending, *self._running, return_exceptions=True)
+        for task in self._batchers.values():
+            task.cancel()
+        await asyncio.gather(*self._batchers.values(), return_exceptions=True)
+        self._batchers.clear()
+        self._wakeups.clear()
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown, True)
+            self._pool = None
+        if self._owned_dir is not None:
+            self._owned_dir.cleanup()
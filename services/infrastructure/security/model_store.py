@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+XORB Model Store
+Versioned, memory-mapped storage for per-user detection models
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Array dtypes the store accepts; anything else would need pickling
+STORABLE_DTYPE_KINDS = set("biuf")
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average path length of an unsuccessful BST search over ``n_samples`` points"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    many = n_samples > 2
+    lengths[many] = 2.0 * (np.log(n_samples[many] - 1.0) + np.euler_gamma) \
+        - 2.0 * (n_samples[many] - 1.0) / n_samples[many]
+    return lengths
+
+class ArrayScaler:
+    """StandardScaler transform backed by plain arrays"""
+    kind = "scaler"
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        return (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"mean": self.mean, "scale": self.scale}
+
+    @classmethod
+    def from_sklearn(cls, scaler) -> 'ArrayScaler':
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones_like(scaler.mean_)
+        return cls(np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scale, dtype=np.float64))
+
+class ArrayPCA:
+    """PCA projection backed by plain arrays"""
+    kind = "pca"
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance: np.ndarray,
+                 whiten: Union[bool, np.ndarray] = False):
+        self.mean = mean
+        self.components = components
+        self.explained_variance = explained_variance
+        self.whiten = bool(np.asarray(whiten).any())
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        projected = (np.asarray(features, dtype=np.float64) - self.mean) @ self.components.T
+        if self.whiten:
+            projected /= np.sqrt(self.explained_variance)
+        return projected
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"mean": self.mean, "components": self.components,
+                "explained_variance": self.explained_variance,
+                "whiten": np.array([self.whiten], dtype=np.uint8)}
+
+    @classmethod
+    def from_sklearn(cls, pca) -> 'ArrayPCA':
+        return cls(np.asarray(pca.mean_, dtype=np.float64), np.asarray(pca.components_, dtype=np.float64),
+                   np.asarray(pca.explained_variance_, dtype=np.float64), pca.whiten)
+
+class ArrayIsolationForest:
+    """IsolationForest scoring backed by flat node arrays
+
+    All trees are stored as one node table; ``left``/``right`` index into
+    it (-1 at leaves), ``feature`` is already mapped to the input column,
+    and ``leaf_depth`` holds each leaf's depth plus the average path length
+    of its remaining samples. Every tree is walked at once, one level per
+    step, so scoring costs O(max depth) vectorized operations. Scores match
+    sklearn's ``score_samples``/``decision_function``.
+    """
+    kind = "isolation_forest"
+
+    def __init__(self, left: np.ndarray, right: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, leaf_depth: np.ndarray, roots: np.ndarray,
+                 params: np.ndarray):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_depth = leaf_depth
+        self.roots = roots
+        # [offset_, average path length at max_samples]
+        self.params = params
+
+    def score_samples(self, features: np.ndarray) -> np.ndarray:
+        # sklearn compares float32 inputs against the split thresholds
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        rows = np.arange(len(features))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(features), len(self.roots))).copy()
+        while True:
+            internal = self.left[nodes] >= 0
+            if not internal.any():
+                break
+            go_left = features[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, self.left[nodes], self.right[nodes]), nodes)
+        depths = self.leaf_depth[nodes].sum(axis=1)
+        denominator = len(self.roots) * float(self.params[1])
+        if denominator == 0:
+            return -np.ones(len(features))
+        return -(2.0 ** (-depths / denominator))
+
+    def decision_function(self, features: np.ndarray) -> np.ndarray:
+        return self.score_samples(features) - float(self.params[0])
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return np.where(self.decision_function(features) < 0, -1, 1)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"left": self.left, "right": self.right, "feature": self.feature,
+                "threshold": self.threshold, "leaf_depth": self.leaf_depth,
+                "roots": self.roots, "params": self.params}
+
+    @classmethod
+    def from_sklearn(cls, forest) -> 'ArrayIsolationForest':
+        subsample_features = forest._max_features != forest.n_features_in_
+        left, right, feature, threshold, leaf_depth, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator, features in zip(forest.estimators_, forest.estimators_features_):
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            roots.append(offset)
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            columns = np.asarray(features)[tree.feature] if subsample_features else tree.feature
+            feature.append(np.where(is_leaf, 0, columns))
+            threshold.append(tree.threshold)
+            leaf_depth.append(tree.compute_node_depths() + _average_path_length(tree.n_node_samples) - 1.0)
+            offset += tree.node_count
+        return cls(
+            np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+            np.concatenate(feature).astype(np.int32), np.concatenate(threshold).astype(np.float64),
+            np.concatenate(leaf_depth).astype(np.float64), np.array(roots, dtype=np.int32),
+            np.array([forest.offset_, _average_path_length([forest._max_samples])[0]], dtype=np.float64)
+        )
+
+# Kinds rebuilt into scoring objects on load; other kinds load as array dicts
+MODEL_TYPES = {cls.kind: cls for cls in (ArrayScaler, ArrayPCA, ArrayIsolationForest)}
+
+def encode_model(model: Any) -> Tuple[str, Dict[str, np.ndarray]]:
+    """Convert a fitted model to a (kind, arrays) pair the store can hold"""
+    if isinstance(model, tuple(MODEL_TYPES.values())):
+        return model.kind, model.to_arrays()
+    if hasattr(model, "estimators_features_") and hasattr(model, "offset_"):
+        model = ArrayIsolationForest.from_sklearn(model)
+    elif hasattr(model, "components_"):
+        model = ArrayPCA.from_sklearn(model)
+    elif hasattr(model, "scale_") and hasattr(model, "mean_"):
+        model = ArrayScaler.from_sklearn(model)
+    else:
+        raise TypeError(f"Cannot store model of type {type(model).__name__}")
+    return model.kind, model.to_arrays()
+
+class _KindTable:
+    """Memory-mapped arrays for one model kind in one store version"""
+
+    def __init__(self, directory: Path, kind: str, spec: Dict):
+        load = lambda name: np.load(directory / name, mmap_mode="r", allow_pickle=False)
+        self.users = load(spec["users"])
+        self.fields = {
+            field: (load(info["data"]), load(info["offsets"]),
+                    load(info["shapes"]) if "shapes" in info else None)
+            for field, info in spec["fields"].items()
+        }
+
+    def index(self, user_id: str) -> int:
+        position = int(np.searchsorted(self.users, user_id))
+        if position < len(self.users) and self.users[position] == user_id:
+            return position
+        return -1
+
+    def arrays(self, position: int) -> Dict[str, np.ndarray]:
+        """Zero-copy views of one user's arrays"""
+        result = {}
+        for field, (data, offsets, shapes) in self.fields.items():
+            view = data[offsets[position]:offsets[position + 1]]
+            if shapes is not None:
+                view = view.reshape(tuple(shapes[position]))
+            result[field] = view
+        return result
+
+class ModelStoreWriter:
+    """Collects per-user models and writes them as a new store version"""
+
+    def __init__(self, store: 'ModelStore'):
+        self.store = store
+        self._entries: Dict[str, Dict[str, Dict[str, np.ndarray]]] = {}
+
+    def add(self, user_id: str, model: Any):
+        """Add a fitted scaler, PCA or isolation forest for ``user_id``"""
+        kind, arrays = encode_model(model)
+        self.add_arrays(kind, user_id, arrays)
+
+    def add_arrays(self, kind: str, user_id: str, arrays: Dict[str, np.ndarray]):
+        """Add raw numeric arrays under ``kind``; every user of a kind needs the same fields"""
+        for field, array in arrays.items():
+            if np.asarray(array).dtype.kind not in STORABLE_DTYPE_KINDS:
+                raise TypeError(f"Field {kind}.{field} has non-numeric dtype {np.asarray(array).dtype}")
+        self._entries.setdefault(kind, {})[user_id] = arrays
+
+    def carry_over(self, exclude_kinds: Iterable[str] = ()):
+        """Copy every entry of the current version that has not been replaced"""
+        excluded = set(exclude_kinds)
+        for kind in self.store.kinds():
+            if kind in excluded:
+                continue
+            replaced = self._entries.get(kind, {})
+            table = self.store._table(kind)
+            for position, user_id in enumerate(table.users.tolist()):
+                if user_id not in replaced:
+                    self._entries.setdefault(kind, {})[user_id] = table.arrays(position)
+
+    def commit(self) -> int:
+        """Write all collected entries as the next version and make it current"""
+        version = self.store.latest_version() + 1
+        directory = self.store.root / f"v{version:06d}"
+        staging = self.store.root / f".v{version:06d}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        manifest = {"version": version, "created": datetime.utcnow().isoformat(), "kinds": {}}
+        for kind, entries in self._entries.items():
+            user_ids = sorted(entries)
+            np.save(staging / f"{kind}.users.npy", np.array(user_ids, dtype=str))
+            fields = {}
+            for field in entries[user_ids[0]]:
+                arrays = [np.asarray(entries[user_id][field]) for user_id in user_ids]
+                lengths = np.fromiter((a.size for a in arrays), dtype=np.int64, count=len(arrays))
+                offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+                np.cumsum(lengths, out=offsets[1:])
+                info = {"data": f"{kind}.{field}.npy", "offsets": f"{kind}.{field}.offsets.npy"}
+                np.save(staging / info["data"], np.concatenate([a.ravel() for a in arrays]))
+                np.save(staging / info["offsets"], offsets)
+                if any(a.ndim != 1 for a in arrays):
+                    info["shapes"] = f"{kind}.{field}.shapes.npy"
+                    ndim = max(a.ndim for a in arrays)
+                    shapes = np.ones((len(arrays), ndim), dtype=np.int64)
+                    for i, a in enumerate(arrays):
+                        shapes[i, ndim - a.ndim:] = a.shape
+                    np.save(staging / info["shapes"], shapes)
+                fields[field] = info
+            manifest["kinds"][kind] = {"users": f"{kind}.users.npy", "count": len(user_ids),
+                                       "fields": fields}
+        with open(staging / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(staging, directory)
+        pointer = self.store.root / "CURRENT.tmp"
+        pointer.write_text(directory.name)
+        os.replace(pointer, self.store.root / "CURRENT")
+        self._entries = {}
+        self.store.reload()
+        logger.info(f"Model store version {version} written to {directory}")
+        return version
+
+class ModelStore:
+    """Versioned per-user model store built on memory-mapped NumPy arrays
+
+    Each version is a directory of ``.npy`` files plus a JSON manifest;
+    ``CURRENT`` names the live version and is switched atomically. All
+    users' arrays of a kind share one file, so opening the store costs a
+    few ``mmap`` calls regardless of user count, worker processes share
+    the same page-cache pages read-only, and a user's model is decoded
+    only on first access. Nothing is ever unpickled.
+    """
+
+    def __init__(self, root: Union[str, Path], cache_size: int = 100000):
+        self.root = Path(root)
+        self.cache_size = cache_size
+        self._version = 0
+        self._directory: Optional[Path] = None
+        self._manifest: Dict = {}
+        self._tables: Dict[str, _KindTable] = {}
+        self._cache: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._opened = False
+
+    def _open(self):
+        if self._opened:
+            return
+        with self._lock:
+            if self._opened:
+                return
+            pointer = self.root / "CURRENT"
+            if pointer.exists():
+                self._directory = self.root / pointer.read_text().strip()
+                with open(self._directory / "manifest.json") as f:
+                    self._manifest = json.load(f)
+                self._version = self._manifest["version"]
+            self._opened = True
+
+    def reload(self) -> int:
+        """Switch to the newest committed version; already decoded models are dropped"""
+        with self._lock:
+            self._opened = False
+            self._tables = {}
+            self._cache = {}
+        self._open()
+        return self._version
+
+    @property
+    def version(self) -> int:
+        self._open()
+        return self._version
+
+    def latest_version(self) -> int:
+        versions = [int(p.name[1:]) for p in self.root.glob("v[0-9]*") if p.is_dir()] \
+            if self.root.exists() else []
+        return max(versions, default=0)
+
+    def kinds(self) -> List[str]:
+        self._open()
+        return list(self._manifest.get("kinds", {}))
+
+    def _table(self, kind: str) -> Optional[_KindTable]:
+        table = self._tables.get(kind)
+        if table is None:
+            spec = self._manifest.get("kinds", {}).get(kind)
+            if spec is None:
+                return None
+            table = self._tables[kind] = _KindTable(self._directory, kind, spec)
+        return table
+
+    def users(self, kind: str) -> np.ndarray:
+        self._open()
+        table = self._table(kind)
+        return table.users if table is not None else np.array([], dtype=str)
+
+    def get_arrays(self, kind: str, user_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """Memory-mapped arrays stored for ``user_id`` under ``kind``, or None"""
+        self._open()
+        table = self._table(kind)
+        if table is None:
+            return None
+        position = table.index(user_id)
+        return table.arrays(position) if position >= 0 else None
+
+    def get(self, kind: str, user_id: str) -> Optional[Any]:
+        """Decoded model for ``user_id``, loaded on first access and then cached"""
+        key = (kind, user_id)
+        model = self._cache.get(key)
+        if model is not None:
+            return model
+        arrays = self.get_arrays(kind, user_id)
+        if arrays is None:
+            return None
+        model_type = MODEL_TYPES.get(kind)
+        model = model_type(**arrays) if model_type else arrays
+        if len(self._cache) >= self.cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = model
+        return model
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return self.get_arrays(*key) is not None
+
+    def writer(self) -> ModelStoreWriter:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._open()
+        return ModelStoreWriter(self)
+
+    def prune(self, keep: int = 2):
+        """Delete all but the newest ``keep`` versions"""
+        self._open()
+        versions = sorted(p for p in self.root.glob("v[0-9]*") if p.is_dir())
+        for directory in versions[:-keep] if keep else versions:
+            if directory != self._directory:
+                shutil.rmtree(directory, ignore_errors=True)
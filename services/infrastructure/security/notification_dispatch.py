@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+XORB Notification Dispatch
+Per-channel async queues over pooled SMTP connections and HTTP sessions, with low-severity digests
+"""
+
+import asyncio
+import logging
+import random
+import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Notification:
+    """One message for one channel"""
+    subject: str
+    body: str
+    severity: str
+    incident_id: Optional[str] = None
+    # Digested notifications are batched into one message per digest interval
+    digest: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+class SMTPConnectionPool:
+    """Persistent SMTP connections used from a bounded thread pool
+
+    smtplib is blocking, so every send runs on one of ``size`` worker
+    threads and the event loop never waits on the mail server. Connections
+    stay open between sends; one idle for longer than ``idle_timeout`` is
+    checked with NOOP before reuse, and a dropped one is reopened once.
+    """
+
+    def __init__(self, host: str, port: int = 25, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, size: int = 4,
+                 timeout: float = 30.0, idle_timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"smtp-{host}")
+        self._idle: Deque[Tuple[smtplib.SMTP, float]] = deque()
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "messages": 0, "reconnects": 0}
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password or "")
+        with self._lock:
+            self.stats["connections"] += 1
+        return connection
+
+    def _checkout(self) -> smtplib.SMTP:
+        with self._lock:
+            entry = self._idle.pop() if self._idle else None
+        if entry is None:
+            return self._connect()
+        connection, released_at = entry
+        if time.monotonic() - released_at > self.idle_timeout:
+            try:
+                if connection.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self._discard(connection)
+                return self._connect()
+        return connection
+
+    def _discard(self, connection: smtplib.SMTP):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _send(self, message: MIMEMultipart, sender: str, recipients: List[str]):
+        connection = self._checkout()
+        try:
+            try:
+                connection.send_message(message, sender, recipients)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed a pooled connection; retry once on a fresh one
+                self._discard(connection)
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                connection = self._connect()
+                connection.send_message(message, sender, recipients)
+        except BaseException:
+            self._discard(connection)
+            raise
+        with self._lock:
+            self.stats["messages"] += 1
+            self._idle.append((connection, time.monotonic()))
+
+    async def send(self, message: MIMEMultipart, sender: str, recipients: List[str]):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._send, message, sender, recipients)
+
+    def _close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            try:
+                connection.quit()
+            except Exception:
+                self._discard(connection)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_all)
+        self._executor.shutdown(wait=False)
+
+class EmailTransport:
+    def __init__(self, pool: SMTPConnectionPool, sender: str, recipients: List[str]):
+        self.pool = pool
+        self.sender = sender
+        self.recipients = recipients
+
+    async def send(self, subject: str, body: str, notifications: List[Notification]):
+        message = MIMEMultipart()
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message["Subject"] = subject
+        message.attach(MIMEText(body, "plain"))
+        await self.pool.send(message, self.sender, self.recipients)
+
+class WebhookTransport:
+    def __init__(self, session: aiohttp.ClientSession, url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 10.0):
+        self.session = session
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def send(self, subject: str, body: str, notifications: List[Notification]):
+        payload = {
+            "subject": subject,
+            "text": body,
+            "notifications": [
+                {"incident_id": n.incident_id, "severity": n.severity, "subject": n.subject, **n.payload}
+                for n in notifications
+            ]
+        }
+        async with self.session.post(self.url, json=payload, headers=self.headers,
+                                     timeout=self.timeout) as response:
+            if response.status >= 400:
+                raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                  status=response.status, message=response.reason or "")
+
+class NotificationChannel:
+    """A bounded queue and workers for one channel, plus its pending digest"""
+
+    def __init__(self, name: str, transport, queue_size: int = 1000, concurrency: int = 2,
+                 digest_interval: float = 300.0, max_digest: int = 500, retries: int = 3,
+                 retry_base: float = 1.0, min_severity: Optional[int] = None, digest_from: Optional[int] = None):
+        self.name = name
+        self.transport = transport
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.concurrency = concurrency
+        self.digest_interval = digest_interval
+        self.max_digest = max_digest
+        self.retries = retries
+        self.retry_base = retry_base
+        # Severity ranks (1 the most severe) this channel accepts and digests; None for all / none
+        self.min_severity = min_severity
+        self.digest_from = digest_from
+        self._digest: List[Notification] = []
+        self._digest_ready: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.delivery_latency: Deque[float] = deque(maxlen=4096)
+        self.stats = {"queued": 0, "sent": 0, "digests": 0, "digested": 0, "dropped": 0, "failed": 0}
+
+    def start(self):
+        self._digest_ready = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(), name=f"notify-{self.name}-{i}")
+                       for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._digest_loop(), name=f"notify-{self.name}-digest"))
+
+    def offer(self, notification: Notification) -> bool:
+        """Queue a notification without waiting; returns False if the channel is full"""
+        if notification.digest:
+            self._digest.append(notification)
+            if len(self._digest) >= self.max_digest:
+                self._digest_ready.set()
+            return True
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"Notification channel {self.name} is full, dropping {notification.subject}")
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _deliver(self, subject: str, body: str, notifications: List[Notification]) -> bool:
+        for attempt in range(self.retries + 1):
+            try:
+                await self.transport.send(subject, body, notifications)
+                now = time.monotonic()
+                self.delivery_latency.extend(now - n.created_at for n in notifications)
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    self.stats["failed"] += len(notifications)
+                    logger.error(f"Notification channel {self.name} failed to deliver {subject}: {e}")
+                    return False
+                await asyncio.sleep(random.uniform(0, self.retry_base * 2 ** attempt))
+        return False
+
+    async def _work(self):
+        while True:
+            notification = await self.queue.get()
+            try:
+                if await self._deliver(notification.subject, notification.body, [notification]):
+                    self.stats["sent"] += 1
+            finally:
+                self.queue.task_done()
+
+    async def _digest_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._digest_ready.wait(), self.digest_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._digest_ready.clear()
+            await self.flush_digest()
+
+    async def flush_digest(self):
+        pending, self._digest = self._digest, []
+        if not pending:
+            return
+        subject = f"[XORB] Digest: {len(pending)} low-severity notifications"
+        body = "\n".join(f"{datetime.utcnow().isoformat()} {n.severity} {n.subject}" for n in pending)
+        if await self._deliver(subject, body, pending):
+            self.stats["digests"] += 1
+            self.stats["digested"] += len(pending)
+
+    async def close(self, drain: bool = True, timeout: float = 10.0):
+        if drain:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Notification channel {self.name} closed with {self.queue.qsize()} undelivered")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if drain:
+            await self.flush_digest()
+
+class NotificationDispatcher:
+    """Fans notifications out to channels without ever waiting on delivery
+
+    Channels are configured from dicts like the orchestrator's
+    ``notification_channels``::
+
+        {"type": "email", "smtp_host": "mail", "smtp_port": 587, "starttls": True,
+         "username": "...", "password": "...", "sender": "xorb@example.com",
+         "recipients": ["soc@example.com"]}
+        {"type": "webhook", "url": "https://hooks.example.com/...", "headers": {...}}
+
+    plus the optional queue keys ``queue_size``, ``concurrency``,
+    ``digest_interval`` and ``max_digest``. Given ``severities`` (name to
+    rank, 1 the most severe), a channel may also set ``min_severity`` and
+    ``digest_from`` to one of those names, falling back to the dispatcher's
+    defaults; they are resolved to ranks on the channel when it is added.
+    Email channels that name the
+    same server share one SMTP pool, and all webhook channels share one
+    HTTP session and its keep-alive connections.
+    """
+
+    def __init__(self, smtp_pool_size: int = 4, http_connections: int = 100,
+                 severities: Optional[Dict[str, int]] = None, min_severity: Optional[str] = None,
+                 digest_from: Optional[str] = None):
+        self.smtp_pool_size = smtp_pool_size
+        self.http_connections = http_connections
+        self.severities = severities or {}
+        self.defaults = {"min_severity": min_severity, "digest_from": digest_from}
+        self.channels: Dict[str, NotificationChannel] = {}
+        self._smtp_pools: Dict[Tuple[str, int, Optional[str]], SMTPConnectionPool] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _http_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.http_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _smtp_pool(self, config: Dict[str, Any]) -> SMTPConnectionPool:
+        key = (config["smtp_host"], config.get("smtp_port", 25), config.get("username"))
+        pool = self._smtp_pools.get(key)
+        if pool is None:
+            pool = self._smtp_pools[key] = SMTPConnectionPool(
+                key[0], key[1], username=key[2], password=config.get("password"),
+                starttls=config.get("starttls", False), size=config.get("pool_size", self.smtp_pool_size))
+        return pool
+
+    def _severity_rank(self, config: Dict[str, Any], key: str) -> Optional[int]:
+        severity = config.get(key, self.defaults[key])
+        if severity is None:
+            return None
+        if severity not in self.severities:
+            raise ValueError(f"Unknown {key} {severity!r}, expected one of {', '.join(self.severities)}")
+        return self.severities[severity]
+
+    def add_channel(self, name: str, config: Dict[str, Any]) -> NotificationChannel:
+        """Create and start a channel; must be called from the event loop"""
+        ranks = {key: self._severity_rank(config, key) for key in ("min_severity", "digest_from")}
+        kind = config.get("type")
+        if kind == "email":
+            transport = EmailTransport(self._smtp_pool(config), config["sender"], list(config["recipients"]))
+        elif kind == "webhook":
+            transport = WebhookTransport(self._http_session(), config["url"], config.get("headers"),
+                                         config.get("timeout", 10.0))
+        else:
+            raise ValueError(f"Unknown notification channel type: {kind}")
+        options = {key: config[key] for key in ("queue_size", "concurrency", "digest_interval", "max_digest")
+                   if key in config}
+        channel = NotificationChannel(name, transport, **options, **ranks)
+        channel.start()
+        self.channels[name] = channel
+        return channel
+
+    def configure(self, channels: Dict[str, Dict[str, Any]]):
+        for name, config in channels.items():
+            try:
+                self.add_channel(name, config)
+            except Exception as e:
+                logger.error(f"Failed to configure notification channel {name}: {e}")
+
+    def notify(self, notification: Notification, channels: Optional[List[str]] = None) -> int:
+        """Queue a notification on every (or the named) channel; returns how many accepted it"""
+        targets = self.channels.values() if channels is None else \
+            [self.channels[name] for name in channels if name in self.channels]
+        return sum(channel.offer(notification) for channel in targets)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: {**channel.stats, "depth": channel.queue.qsize()} for name, channel in self.channels.items()}
+
+    async def close(self, drain: bool = True):
+        await asyncio.gather(*[channel.close(drain) for channel in self.channels.values()])
+        self.channels = {}
+        for pool in self._smtp_pools.values():
+            await pool.close()
+        self._smtp_pools = {}
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
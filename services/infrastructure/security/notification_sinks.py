@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+XORB Notification Sinks
+Local mock SMTP and webhook servers that record deliveries, for tests and benchmarks
+"""
+
+import asyncio
+import email
+import logging
+from email.message import Message
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+class MockSMTPServer:
+    """Minimal ESMTP server on localhost that stores every message it accepts
+
+    Speaks just enough of the protocol for smtplib (EHLO/HELO, MAIL, RCPT,
+    DATA, RSET, NOOP, QUIT; no TLS or AUTH). ``delay`` seconds are spent
+    before acknowledging each message to imitate a slow mail server.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.messages: List[Message] = []
+        self.connections = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._sessions: Set[asyncio.Task] = set()
+
+    async def start(self) -> 'MockSMTPServer':
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Pooled clients keep sessions open; end them rather than wait
+            for session in list(self._sessions):
+                session.cancel()
+            await asyncio.gather(*self._sessions, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        session = asyncio.current_task()
+        self._sessions.add(session)
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        try:
+            await reply("220 mock ESMTP ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    await reply("250-mock\r\n250 8BITMIME")
+                elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    self.messages.append(email.message_from_bytes(b"".join(lines)))
+                    await reply("250 OK: queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._sessions.discard(session)
+            writer.close()
+
+class MockWebhookServer:
+    """aiohttp server on localhost that records JSON posted to any path"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0, status: int = 200):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.status = status
+        self.requests: List[Dict[str, Any]] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    def url(self, path: str = "hook") -> str:
+        return f"http://{self.host}:{self.port}/{path}"
+
+    async def start(self) -> 'MockWebhookServer':
+        app = web.Application()
+        app.router.add_post("/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.requests.append({"path": request.match_info["path"], "json": payload})
+        return web.json_response({"ok": self.status < 400}, status=self.status)
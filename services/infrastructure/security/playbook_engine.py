@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+XORB Playbook Engine
+Concurrent, rate-limited and idempotent execution of response playbooks as action DAGs
+"""
+
+import asyncio
+import inspect
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ActionResult statuses
+APPLIED = "applied"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+@dataclass
+class ActionPolicy:
+    """Limits for one action type, shared by every incident"""
+    concurrency: int = 16
+    rate: float = 0.0  # calls per second across all incidents; 0 disables the limit
+    burst: int = 1
+    retries: int = 3
+    retry_base: float = 0.5
+    retry_max: float = 10.0
+    timeout: float = 30.0
+
+@dataclass
+class PlaybookStep:
+    """One playbook action and the actions that must succeed before it runs"""
+    action: Any
+    depends_on: Tuple[Any, ...] = ()
+
+@dataclass
+class ActionResult:
+    action: Any
+    target: Optional[str]
+    status: str
+    attempts: int = 0
+    error: Optional[str] = None
+
+@dataclass
+class PlaybookRun:
+    """Outcome of executing a playbook for one incident"""
+    incident_id: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    contained_at: Optional[datetime] = None
+    results: List[ActionResult] = field(default_factory=list)
+
+    def summary(self) -> Dict[Any, Dict[str, int]]:
+        """Result counts per action and status"""
+        counts: Dict[Any, Dict[str, int]] = {}
+        for result in self.results:
+            per_action = counts.setdefault(result.action, {})
+            per_action[result.status] = per_action.get(result.status, 0) + 1
+        return counts
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, holding at most ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # The lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+async def _invoke(handler: Callable, args: Tuple):
+    """Call a response handler without blocking the loop on a synchronous one"""
+    if inspect.iscoroutinefunction(handler) or inspect.iscoroutinefunction(getattr(handler, "__call__", None)):
+        return await handler(*args)
+    result = await asyncio.to_thread(handler, *args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+class PlaybookEngine:
+    """Runs playbooks as DAGs of actions fanned out over their targets
+
+    A playbook is a list of actions or ``PlaybookStep``s (dicts with
+    ``action`` and ``depends_on`` work too). Steps run as soon as every step
+    they depend on has succeeded, so independent steps run concurrently,
+    and ``targets(action, incident)`` fans a step out into one handler call
+    per target (``handler(incident, target)``), or returns None for a single
+    ``handler(incident)`` call. Handlers may be coroutine functions or plain
+    functions; plain ones run in a worker thread, where a timeout stops the
+    wait but not the call.
+
+    Each action type has its own ``ActionPolicy``: a semaphore caps calls in
+    flight and a token bucket caps the call rate, both shared by all
+    incidents so downstream APIs see one bounded client. Failed calls are
+    retried with full-jitter exponential backoff. An idempotency key of
+    action and target (or incident and severity, for untargeted actions) is recorded
+    once the call succeeds; later calls with the same key within
+    ``idempotency_ttl`` seconds are skipped, and concurrent ones wait for
+    the call already in flight.
+    """
+
+    def __init__(self, handlers: Dict[Any, Callable],
+                 targets: Callable[[Any, Any], Optional[List[str]]] = lambda action, incident: None,
+                 policies: Optional[Dict[Any, ActionPolicy]] = None,
+                 containment_actions: Iterable[Any] = (),
+                 idempotency_ttl: float = 86400.0, clock: Callable[[], float] = time.monotonic):
+        self.handlers = handlers
+        self.targets = targets
+        self.policies = policies if policies is not None else {}
+        self.default_policy = ActionPolicy()
+        self.containment_actions = set(containment_actions)
+        self.idempotency_ttl = idempotency_ttl
+        self.clock = clock
+        self._semaphores: Dict[Any, asyncio.Semaphore] = {}
+        self._buckets: Dict[Any, Optional[TokenBucket]] = {}
+        # idempotency key -> expiry, in insertion order so expiry pops from the front
+        self._applied: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.time_to_containment: Deque[float] = deque(maxlen=4096)
+        self.stats = {"runs": 0, "calls": 0, "applied": 0, "duplicates": 0, "retries": 0, "failed": 0}
+
+    def policy(self, action: Any) -> ActionPolicy:
+        return self.policies.get(action, self.default_policy)
+
+    @staticmethod
+    def build_steps(playbook: Iterable[Any]) -> List[PlaybookStep]:
+        """Normalize a playbook into steps, checking that it is a DAG"""
+        steps = []
+        for entry in playbook:
+            if isinstance(entry, PlaybookStep):
+                steps.append(entry)
+            elif isinstance(entry, dict):
+                steps.append(PlaybookStep(entry["action"], tuple(entry.get("depends_on", ()))))
+            else:
+                steps.append(PlaybookStep(entry))
+
+        by_action = {step.action: step for step in steps}
+        if len(by_action) != len(steps):
+            raise ValueError("Playbook lists an action more than once")
+        visiting, done = set(), set()
+
+        def visit(step: PlaybookStep):
+            if step.action in done:
+                return
+            if step.action in visiting:
+                raise ValueError(f"Playbook has a dependency cycle through {step.action}")
+            visiting.add(step.action)
+            for dependency in step.depends_on:
+                if dependency not in by_action:
+                    raise ValueError(f"Playbook step {step.action} depends on missing {dependency}")
+                visit(by_action[dependency])
+            visiting.discard(step.action)
+            done.add(step.action)
+
+        for step in steps:
+            visit(step)
+        return steps
+
+    async def execute(self, incident: Any, playbook: Iterable[Any]) -> PlaybookRun:
+        """Run a playbook for an incident and wait for every step to finish"""
+        steps = self.build_steps(playbook)
+        run = PlaybookRun(incident_id=incident.incident_id, started_at=datetime.utcnow())
+        self.stats["runs"] += 1
+        tasks: Dict[Any, asyncio.Task] = {}
+        finished: Dict[Any, datetime] = {}
+
+        async def run_step(step: PlaybookStep) -> bool:
+            for dependency in step.depends_on:
+                if not await tasks[dependency]:
+                    run.results.append(ActionResult(step.action, None, SKIPPED,
+                                                    error=f"dependency {dependency} failed"))
+                    return False
+            targets = self.targets(step.action, incident)
+            calls = [None] if targets is None else targets
+            results = await asyncio.gather(*[self._call(incident, step.action, target) for target in calls])
+            run.results.extend(results)
+            finished[step.action] = datetime.utcnow()
+            return all(result.status != FAILED for result in results)
+
+        for step in steps:
+            tasks[step.action] = asyncio.create_task(run_step(step))
+        outcomes = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+
+        run.finished_at = datetime.utcnow()
+        containment = [action for action in outcomes if action in self.containment_actions]
+        if containment and all(outcomes[action] for action in containment):
+            run.contained_at = max(finished[action] for action in containment)
+            created_at = getattr(incident, "created_at", run.started_at)
+            self.time_to_containment.append((run.contained_at - created_at).total_seconds())
+        return run
+
+    def _idempotency_key(self, incident: Any, action: Any, target: Optional[str]) -> str:
+        name = getattr(action, "value", action)
+        if target is not None:
+            return f"{name}:{target}"
+        # Untargeted actions such as notifications run again when the incident escalates
+        severity = getattr(incident, "severity", None)
+        return f"{name}:incident:{incident.incident_id}:{getattr(severity, 'name', severity)}"
+
+    def _expire(self, now: float):
+        while self._applied:
+            key, expires_at = next(iter(self._applied.items()))
+            if expires_at > now:
+                break
+            del self._applied[key]
+
+    def forget(self, key: str):
+        """Allow an action to be applied again, e.g. after it was manually reverted"""
+        self._applied.pop(key, None)
+
+    async def _call(self, incident: Any, action: Any, target: Optional[str]) -> ActionResult:
+        key = self._idempotency_key(incident, action, target)
+        self._expire(self.clock())
+        if key in self._applied:
+            self.stats["duplicates"] += 1
+            return ActionResult(action, target, DUPLICATE)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            result = await asyncio.shield(inflight)
+            self.stats["duplicates"] += 1
+            return ActionResult(action, target, DUPLICATE if result.status == APPLIED else result.status,
+                                error=result.error)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._call_with_retries(incident, action, target)
+            if result.status == APPLIED:
+                self._applied[key] = self.clock() + self.idempotency_ttl
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                future.cancel()
+
+    async def _call_with_retries(self, incident: Any, action: Any, target: Optional[str]) -> ActionResult:
+        handler = self.handlers.get(action)
+        if handler is None:
+            logger.warning(f"No handler registered for response action {getattr(action, 'value', action)}")
+            return ActionResult(action, target, FAILED, error="no handler")
+
+        policy = self.policy(action)
+        semaphore = self._semaphores.get(action)
+        if semaphore is None:
+            semaphore = self._semaphores[action] = asyncio.Semaphore(policy.concurrency)
+            self._buckets[action] = TokenBucket(policy.rate, policy.burst) if policy.rate > 0 else None
+        bucket = self._buckets[action]
+
+        error = None
+        for attempt in range(1, policy.retries + 2):
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                self.stats["calls"] += 1
+                try:
+                    args = (incident,) if target is None else (incident, target)
+                    await asyncio.wait_for(_invoke(handler, args), policy.timeout)
+                    self.stats["applied"] += 1
+                    return ActionResult(action, target, APPLIED, attempts=attempt)
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            if attempt <= policy.retries:
+                self.stats["retries"] += 1
+                # Full jitter keeps retries from many targets from arriving in waves
+                await asyncio.sleep(random.uniform(0, min(policy.retry_max, policy.retry_base * 2 ** (attempt - 1))))
+
+        self.stats["failed"] += 1
+        logger.error(f"Response action {getattr(action, 'value', action)} failed for "
+                     f"{target or incident.incident_id} after {policy.retries + 1} attempts: {error}")
+        return ActionResult(action, target, FAILED, attempts=policy.retries + 1, error=error)
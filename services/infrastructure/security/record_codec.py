@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+XORB Record Codec
+Generated encoders and decoders for the security services' record dataclasses
+"""
+
+import dataclasses
+import json
+import logging
+import typing
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    logger.warning("msgpack not available, records can only be encoded as JSON")
+
+# First byte of a binary record; msgpack never emits it, and JSON records
+# start with "{", so stored values of either kind can be told apart
+BINARY_MAGIC = b"\xc1"
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def _field_kind(annotation: Any) -> Tuple[Optional[type], bool]:
+    """The Enum or datetime class a field holds, if any, and whether it may be None"""
+    optional = False
+    if typing.get_origin(annotation) is Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        optional = len(args) < len(typing.get_args(annotation))
+        annotation = args[0] if len(args) == 1 else None
+    if isinstance(annotation, type) and (issubclass(annotation, Enum) or annotation is datetime):
+        return annotation, optional
+    return None, optional
+
+def _pack_datetime(value: datetime) -> Any:
+    # Naive timestamps are UTC and travel as integer microseconds; aware
+    # ones go as msgpack timestamps and come back in UTC
+    if value.tzinfo is None:
+        return (value - _EPOCH) // _MICROSECOND
+    return value
+
+def _unpack_datetime(value: Any) -> datetime:
+    if isinstance(value, int):
+        return _EPOCH + timedelta(microseconds=value)
+    return value
+
+class RecordCodec:
+    """Encoders for one dataclass, generated from its fields
+
+    ``to_dict`` reads each field once, converting Enum members to their
+    values and datetimes to ISO strings; nested lists and dicts such as
+    evidence or raw data are shared with the record rather than copied the
+    way ``dataclasses.asdict`` does, so encode the dict before mutating the
+    record and treat it as read-only. ``from_dict`` reverses it.
+
+    ``pack`` writes a compact msgpack array of the field values in
+    declaration order, with naive datetimes as integer microseconds.
+    Records packed before a field was appended to the class decode with
+    that field's default, so add new fields at the end. ``loads`` accepts
+    either encoding.
+    """
+
+    def __init__(self, cls: Type):
+        self.cls = cls
+        self.fields = [field.name for field in dataclasses.fields(cls)]
+        namespace: Dict[str, Any] = {"cls": cls, "fromisoformat": datetime.fromisoformat,
+                                     "pack_datetime": _pack_datetime, "unpack_datetime": _unpack_datetime}
+        to_dict: List[str] = []
+        from_dict: List[str] = []
+        to_row: List[str] = []
+        from_row: List[str] = []
+        defaults: List[Any] = []
+        for position, field in enumerate(dataclasses.fields(cls)):
+            name = field.name
+            kind, optional = _field_kind(field.type)
+            if field.default is not dataclasses.MISSING:
+                namespace[f"default_{name}"] = field.default
+                defaults.append((False, field.default))
+                read = f"data.get({name!r}, default_{name})"
+            elif field.default_factory is not dataclasses.MISSING:
+                namespace[f"factory_{name}"] = field.default_factory
+                defaults.append((True, field.default_factory))
+                read = f"(data[{name!r}] if {name!r} in data else factory_{name}())"
+            else:
+                if defaults:
+                    raise TypeError(f"{cls.__name__}.{name} has no default but follows fields that do")
+                read = f"data[{name!r}]"
+            value = f"obj.{name}"
+            if kind is datetime:
+                encoded, packed = f"{value}.isoformat()", f"pack_datetime({value})"
+                decode, unpack = "fromisoformat({})", "unpack_datetime({})"
+            elif kind is not None:
+                # Dict lookup is much cheaper than calling the Enum; the
+                # call is kept for unknown values so the error is the usual one
+                namespace[f"enum_{name}"] = kind
+                namespace[f"members_{name}"] = {member.value: member for member in kind}
+                encoded = packed = f"{value}.value"
+                decode = unpack = f"(members_{name}[{{0}}] if {{0}} in members_{name} else enum_{name}({{0}}))"
+            else:
+                encoded = packed = value
+                decode = unpack = "{}"
+            if optional and kind is not None:
+                encoded = f"(None if {value} is None else {encoded})"
+                packed = f"(None if {value} is None else {packed})"
+                decode = f"(None if {{0}} is None else {decode})"
+                unpack = f"(None if {{0}} is None else {unpack})"
+            to_dict.append(f"{name!r}: {encoded}")
+            to_row.append(packed)
+            from_dict.append(f"    v = {read}\n    {name} = {decode.format('v')}")
+            from_row.append(f"{name}={unpack.format(f'row[{position}]')}")
+        self._required = len(self.fields) - len(defaults)
+        self._defaults = defaults
+
+        source = (
+            f"def to_dict(obj):\n    return {{{', '.join(to_dict)}}}\n"
+            f"def to_row(obj):\n    return [{', '.join(to_row)}]\n"
+            f"def from_dict(data):\n" + "\n".join(from_dict) + "\n"
+            f"    return cls({', '.join(f'{name}={name}' for name in self.fields)})\n"
+            f"def from_row(row):\n    return cls({', '.join(from_row)})\n"
+        )
+        exec(compile(source, f"<{cls.__name__} codec>", "exec"), namespace)
+        self.to_dict = namespace["to_dict"]
+        self.from_dict = namespace["from_dict"]
+        self._to_row = namespace["to_row"]
+        self._from_row = namespace["from_row"]
+        if MSGPACK_AVAILABLE:
+            # Reused to skip per-call setup; records are packed on the event loop only
+            self._packer = msgpack.Packer(datetime=True, use_bin_type=True)
+
+    def dumps(self, obj: Any) -> str:
+        """JSON encoding of a record"""
+        return json.dumps(self.to_dict(obj))
+
+    def pack(self, obj: Any) -> bytes:
+        """Binary encoding of a record"""
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack is required for binary records")
+        return BINARY_MAGIC + self._packer.pack(self._to_row(obj))
+
+    def unpack(self, raw: bytes) -> Any:
+        row = msgpack.unpackb(memoryview(raw)[1:], timestamp=3, strict_map_key=False)
+        if len(row) < len(self.fields):
+            if len(row) < self._required:
+                raise ValueError(f"{self.cls.__name__} record has {len(row)} of {self._required} required fields")
+            for factory, default in self._defaults[len(row) - self._required:]:
+                row.append(default() if factory else default)
+        return self._from_row(row)
+
+    def loads(self, raw: Union[bytes, str]) -> Any:
+        """Record from either encoding, as read back from Redis"""
+        if isinstance(raw, (bytes, bytearray, memoryview)) and raw[:1] == BINARY_MAGIC:
+            return self.unpack(raw)
+        return self.from_dict(json.loads(raw))
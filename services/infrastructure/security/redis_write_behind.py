@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+XORB Redis Write-Behind Buffer
+Batches Redis writes from the security services into pipelines flushed by size or deadline
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Commands whose later write fully replaces an earlier one for the same key
+OVERWRITE_COMMANDS = {"set", "setex"}
+
+def _consume_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+class _PendingWrite:
+    __slots__ = ("command", "key", "args", "kwargs", "futures")
+
+    def __init__(self, command: str, key: str, args: tuple, kwargs: Dict[str, Any],
+                 future: asyncio.Future):
+        self.command = command
+        self.key = key
+        self.args = args
+        self.kwargs = kwargs
+        self.futures = [future]
+
+class RedisWriteBehind:
+    """Asynchronous write-behind layer for Redis
+
+    Writes are queued and sent as non-transactional pipelines once
+    ``max_batch`` writes are pending or ``flush_interval`` seconds after the
+    first pending write, whichever comes first. Pipelines run one at a time
+    in submission order, so writes to the same key are applied in order.
+    Consecutive overwrites of a key (SET/SETEX) and consecutive HSETs to a
+    hash are coalesced while they wait.
+
+    Every write returns a future that resolves once its pipeline has
+    executed; await it when durability matters. ``submit`` blocks once
+    ``max_pending`` writes are queued, pushing back on producers.
+    """
+
+    def __init__(self, redis_client, max_batch: int = 1000, flush_interval: float = 0.01,
+                 max_pending: int = 50000):
+        self.redis_client = redis_client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._buffer: List[_PendingWrite] = []
+        self._inflight: List[_PendingWrite] = []
+        self._drain_requests = 0
+        self._last_write: Dict[str, _PendingWrite] = {}
+        self._pending = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats = {"writes": 0, "coalesced": 0, "pipelines": 0, "errors": 0}
+        # Optional LatencyHistogram recording each pipeline round trip
+        self.pipeline_latency = None
+
+    async def start(self):
+        """Start the background flusher"""
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Condition()
+            self._closed = False
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Flush all pending writes and stop the flusher"""
+        if self._flusher is None:
+            return
+        self._closed = True
+        self._wakeup.set()
+        await self._flusher
+        self._flusher = None
+
+    @property
+    def pending(self) -> int:
+        """Writes queued or in flight"""
+        return self._pending
+
+    async def submit(self, command: str, key: str, *args, **kwargs) -> asyncio.Future:
+        """Queue a Redis write command, returning a future for its completion"""
+        if self._flusher is None:
+            await self.start()
+        if self._closed:
+            raise RuntimeError("Write-behind buffer is closed")
+
+        if self._pending >= self.max_pending:
+            async with self._space:
+                await self._space.wait_for(lambda: self._pending < self.max_pending)
+
+        future = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers never await; failures are logged in _execute
+        future.add_done_callback(_consume_exception)
+        self.stats["writes"] += 1
+        if self._coalesce(command, key, args, kwargs, future):
+            self.stats["coalesced"] += 1
+            return future
+
+        write = _PendingWrite(command, key, args, kwargs, future)
+        self._buffer.append(write)
+        self._last_write[key] = write
+        self._pending += 1
+        if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+        return future
+
+    def _coalesce(self, command: str, key: str, args: tuple, kwargs: Dict[str, Any],
+                  future: asyncio.Future) -> bool:
+        """Fold a write into the last pending write for the same key if it supersedes it"""
+        last = self._last_write.get(key)
+        if last is None:
+            return False
+        if command in OVERWRITE_COMMANDS and last.command in OVERWRITE_COMMANDS:
+            last.command, last.args, last.kwargs = command, args, kwargs
+        elif command == "hset" == last.command and not args and not last.args \
+                and set(kwargs) == set(last.kwargs) == {"mapping"}:
+            last.kwargs = {"mapping": {**last.kwargs["mapping"], **kwargs["mapping"]}}
+        else:
+            return False
+        last.futures.append(future)
+        return True
+
+    async def setex(self, key: str, ttl: int, value: Any) -> asyncio.Future:
+        return await self.submit("setex", key, ttl, value)
+
+    async def set(self, key: str, value: Any, **kwargs) -> asyncio.Future:
+        return await self.submit("set", key, value, **kwargs)
+
+    async def hset(self, key: str, mapping: Dict[str, Any]) -> asyncio.Future:
+        return await self.submit("hset", key, mapping=mapping)
+
+    async def flush(self):
+        """Write everything submitted so far without waiting for the deadline"""
+        futures = [f for write in self._inflight + self._buffer for f in write.futures]
+        if not futures:
+            return
+        self._drain_requests += 1
+        self._wakeup.set()
+        try:
+            await asyncio.gather(*futures, return_exceptions=True)
+        finally:
+            self._drain_requests -= 1
+
+    def _urgent(self) -> bool:
+        return self._closed or self._drain_requests > 0
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            if self._buffer and len(self._buffer) < self.max_batch and not self._urgent():
+                # Give the batch until the deadline to fill up
+                try:
+                    await asyncio.wait_for(self._wait_for_full_batch(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            while self._buffer:
+                batch = self._buffer[:self.max_batch]
+                del self._buffer[:self.max_batch]
+                for write in batch:
+                    if self._last_write.get(write.key) is write:
+                        del self._last_write[write.key]
+                self._inflight = batch
+                await self._execute(batch)
+                self._inflight = []
+                self._pending -= len(batch)
+                async with self._space:
+                    self._space.notify_all()
+                if not self._urgent() and len(self._buffer) < self.max_batch:
+                    break
+
+            if self._closed and not self._buffer:
+                return
+            if self._buffer:
+                self._wakeup.set()
+
+    async def _wait_for_full_batch(self):
+        while len(self._buffer) < self.max_batch and not self._urgent():
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _execute(self, batch: List[_PendingWrite]):
+        # Errors only fail this batch's futures: one escaping would end the
+        # flush loop and leave every later write waiting forever
+        results: List[Any] = [None] * len(batch)
+        queued: List[int] = []
+        start = time.perf_counter()
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for index, write in enumerate(batch):
+                try:
+                    getattr(pipeline, write.command)(write.key, *write.args, **write.kwargs)
+                    queued.append(index)
+                except Exception as e:
+                    # An unknown command or bad arguments fail just that write
+                    self.stats["errors"] += 1
+                    results[index] = e
+            if queued:
+                replies = await pipeline.execute(raise_on_error=False)
+                if self.pipeline_latency is not None:
+                    self.pipeline_latency.record_since(start)
+                for index, reply in zip(queued, replies):
+                    results[index] = reply
+        except Exception as e:
+            logger.error(f"Redis pipeline of {len(batch)} writes failed: {e}")
+            for index, result in enumerate(results):
+                if not isinstance(result, Exception):
+                    self.stats["errors"] += 1
+                    results[index] = e
+        self.stats["pipelines"] += 1
+
+        for write, result in zip(batch, results):
+            for future in write.futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if isinstance(result, Exception):
+                logger.error(f"Redis {write.command} {write.key} failed: {result}")
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+XORB Security Pipeline
+Bounded, back-pressured async stages linking threat detection to incident response
+"""
+
+import asyncio
+import ipaddress
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Item priorities, matching ThreatLevel values
+PRIORITY_LOW = 1
+PRIORITY_CRITICAL = 4
+
+class SheddingQueue:
+    """Bounded asyncio queue that sheds low-priority items under overload
+
+    Items are served highest priority first, FIFO within a priority. When
+    the queue is full, a new item evicts the oldest item of the lowest
+    priority below its own; if there is none, the new item is dropped
+    unless its priority is ``protected_priority`` or above, in which case
+    ``put`` waits for space. With ``shed=False`` every ``put`` waits, which
+    pushes back on the producer instead of dropping anything.
+    """
+
+    def __init__(self, capacity: int, shed: bool = True, protected_priority: int = PRIORITY_CRITICAL,
+                 on_drop: Optional[Callable[[Any, int], None]] = None):
+        self.capacity = capacity
+        self.shed = shed
+        self.protected_priority = protected_priority
+        self.on_drop = on_drop
+        self._levels: Dict[int, Deque[Tuple[float, Any]]] = {}
+        self._size = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def depth_by_priority(self) -> Dict[int, int]:
+        return {priority: len(items) for priority, items in self._levels.items() if items}
+
+    def _append(self, item: Any, priority: int):
+        self._levels.setdefault(priority, deque()).append((time.perf_counter(), item))
+        self._size += 1
+        self._not_empty.set()
+        if self._size >= self.capacity:
+            self._not_full.clear()
+
+    async def put(self, item: Any, priority: int = PRIORITY_LOW) -> bool:
+        """Enqueue ``item``; returns False if it was shed"""
+        while self._size >= self.capacity:
+            if self.shed:
+                victim_priority = min((p for p, items in self._levels.items() if items), default=None)
+                if victim_priority is not None and victim_priority < priority:
+                    _, victim = self._levels[victim_priority].popleft()
+                    self._size -= 1
+                    if self.on_drop:
+                        self.on_drop(victim, victim_priority)
+                    break
+                if priority < self.protected_priority:
+                    if self.on_drop:
+                        self.on_drop(item, priority)
+                    return False
+            await self._not_full.wait()
+        self._append(item, priority)
+        return True
+
+    async def get(self) -> Tuple[float, Any, int]:
+        """Dequeue the next item as (enqueued_at, item, priority)"""
+        while not self._size:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        priority = max(p for p, items in self._levels.items() if items)
+        enqueued_at, item = self._levels[priority].popleft()
+        self._size -= 1
+        if not self._size:
+            self._not_empty.clear()
+        if self._size < self.capacity:
+            self._not_full.set()
+        return enqueued_at, item, priority
+
+class StageMetrics:
+    """Queue depth, throughput, shedding and latency counters for one stage"""
+
+    def __init__(self, name: str, latency_samples: int = 4096):
+        self.name = name
+        self.enqueued = 0
+        self.processed = 0
+        self.errors = 0
+        self.dropped: Dict[int, int] = {}
+        self.max_depth = 0
+        self.queue_wait: Deque[float] = deque(maxlen=latency_samples)
+        self.latency: Deque[float] = deque(maxlen=latency_samples)
+
+    def record_drop(self, priority: int):
+        self.dropped[priority] = self.dropped.get(priority, 0) + 1
+
+    @staticmethod
+    def _percentiles(samples: Deque[float]) -> Dict[str, float]:
+        if not samples:
+            return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+        p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95, 99]) * 1000
+        return {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)}
+
+    def snapshot(self, depth: int) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "errors": self.errors,
+            "dropped": dict(self.dropped),
+            "queue_wait": self._percentiles(self.queue_wait),
+            "latency": self._percentiles(self.latency)
+        }
+
+# A stage handler takes one item and returns the items for the next stage
+StageHandler = Callable[[Any], Awaitable[Optional[Iterable[Any]]]]
+
+class Stage:
+    """One pipeline stage: a bounded queue served by ``concurrency`` workers"""
+
+    def __init__(self, name: str, handler: StageHandler, concurrency: int = 1,
+                 queue_size: int = 1000, shed: bool = True,
+                 priority_of: Callable[[Any], int] = lambda item: PRIORITY_LOW):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.priority_of = priority_of
+        self.metrics = StageMetrics(name)
+        self.queue = SheddingQueue(queue_size, shed=shed,
+                                   on_drop=lambda item, priority: self.metrics.record_drop(priority))
+        self.next_stage: Optional['Stage'] = None
+        self._workers: List[asyncio.Task] = []
+        self._busy = 0
+
+    @property
+    def idle(self) -> bool:
+        return not len(self.queue) and not self._busy
+
+    async def put(self, item: Any) -> bool:
+        accepted = await self.queue.put(item, self.priority_of(item))
+        if accepted:
+            self.metrics.enqueued += 1
+            self.metrics.max_depth = max(self.metrics.max_depth, len(self.queue))
+        return accepted
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work(), name=f"{self.name}-{i}")
+                         for i in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while True:
+            enqueued_at, item, _ = await self.queue.get()
+            self._busy += 1
+            started = time.perf_counter()
+            self.metrics.queue_wait.append(started - enqueued_at)
+            try:
+                outputs = await self.handler(item)
+                if outputs and self.next_stage is not None:
+                    for output in outputs:
+                        await self.next_stage.put(output)
+                self.metrics.processed += 1
+            except Exception as e:
+                self.metrics.errors += 1
+                logger.error(f"Pipeline stage {self.name} failed: {e}")
+            finally:
+                self.metrics.latency.append(time.perf_counter() - enqueued_at)
+                self._busy -= 1
+
+class Pipeline:
+    """Stages linked in order; each stage's outputs feed the next one's queue
+
+    A stage blocked on a full downstream queue stops taking work, so
+    pressure propagates back to ``submit``. Memory is bounded by the sum
+    of the queue sizes plus the items in flight.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next_stage = downstream
+        self._running = False
+
+    async def start(self):
+        if not self._running:
+            for stage in self.stages:
+                stage.start()
+            self._running = True
+
+    async def submit(self, item: Any) -> bool:
+        """Feed an item into the first stage; returns False if it was shed"""
+        return await self.stages[0].put(item)
+
+    async def drain(self, poll_interval: float = 0.005):
+        """Wait until every queued item has passed through the pipeline"""
+        while not all(stage.idle for stage in self.stages):
+            await asyncio.sleep(poll_interval)
+
+    async def stop(self, drain: bool = True):
+        if drain:
+            await self.drain()
+        for stage in self.stages:
+            await stage.stop()
+        self._running = False
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        return [stage.metrics.snapshot(len(stage.queue)) for stage in self.stages]
+
+# ThreatLevel value -> IncidentSeverity value (P1 is most severe)
+THREAT_TO_INCIDENT_SEVERITY = {1: 4, 2: 3, 3: 2, 4: 1}
+
+INTERNAL_NETWORKS = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "fc00::/7")
+
+# ThreatCategory value -> the affected end of a flow between two internal
+# hosts: outbound threats come from it, inbound ones target it
+AFFECTED_END = {
+    "data_exfiltration": "source",
+    "malware": "source",
+    "lateral_movement": "source",
+    "intrusion": "target",
+    "command_injection": "target",
+    "privilege_escalation": "target",
+    "anomalous_behavior": "target",
+    "unknown": "target",
+}
+
+class ThreatResponsePipeline(Pipeline):
+    """ingest -> detect -> incident -> respond, between a detector and an orchestrator
+
+    * ingest: flow record chunks are converted to columnar batches
+    * detect: ``detector.analyze_network_traffic_batch`` yields threat events
+    * incident: ``orchestrator.aggregate_alert`` merges threats into open
+      incidents; new and escalated incidents move on
+    * respond: ``orchestrator.trigger_automated_response`` runs the playbook
+
+    Only endpoints inside ``internal_networks`` become affected assets, so
+    host actions never reach addresses we do not own; an external end of
+    the flow becomes an ``ip:`` indicator instead. When both ends are
+    internal, ``AFFECTED_END`` picks the affected one by threat category
+    and the other is kept as a ``peer:`` indicator, which no action targets.
+
+    Threats and incidents carry their severity as queue priority, so under
+    overload LOW work is shed first and CRITICAL work is never shed.
+    """
+
+    def __init__(self, detector, orchestrator, flow_batch_type, severity_type,
+                 ingest_queue: int = 256, detect_queue: int = 64, incident_queue: int = 2000,
+                 respond_queue: int = 1000, detect_concurrency: int = 1,
+                 respond_concurrency: int = 8, internal_networks: Iterable[str] = INTERNAL_NETWORKS):
+        self.detector = detector
+        self.orchestrator = orchestrator
+        self.flow_batch_type = flow_batch_type
+        self.severity_type = severity_type
+        self.internal_networks = [ipaddress.ip_network(network) for network in internal_networks]
+        super().__init__([
+            Stage("ingest", self._ingest, queue_size=ingest_queue, shed=False),
+            Stage("detect", self._detect, concurrency=detect_concurrency,
+                  queue_size=detect_queue, shed=False),
+            Stage("incident", self._correlate_incident, queue_size=incident_queue,
+                  priority_of=lambda threat: threat.threat_level.value),
+            Stage("respond", self._respond, concurrency=respond_concurrency,
+                  queue_size=respond_queue,
+                  priority_of=lambda incident: 5 - incident.severity.value)
+        ])
+
+    async def _ingest(self, records: List[Dict]):
+        if not records:
+            return None
+        return [self.flow_batch_type.from_records(records)]
+
+    async def _detect(self, batch):
+        return await self.detector.analyze_network_traffic_batch(batch)
+
+    def _is_internal(self, address: str) -> bool:
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(address in network for network in self.internal_networks)
+
+    def _split_endpoints(self, threat) -> Tuple[List[str], List[str]]:
+        """Affected assets and indicators for the two ends of a threat's flow"""
+        ends = {end: address for end, address in (("source", threat.source_ip), ("target", threat.target_ip))
+                if address}
+        internal = [end for end, address in ends.items() if self._is_internal(address)]
+        if len(internal) == 2:
+            internal = [AFFECTED_END.get(threat.category.value, "target")]
+        assets, indicators = [], []
+        for end, address in ends.items():
+            if end in internal:
+                assets.append(address)
+            elif self._is_internal(address):
+                # Our own host on the other end; kept for matching, never blocked
+                indicators.append(f"peer:{address}")
+            else:
+                indicators.append(f"ip:{address}")
+        return assets, indicators
+
+    async def _correlate_incident(self, threat):
+        assets, indicators = self._split_endpoints(threat)
+        evidence = {"threat_event_id": threat.event_id, "confidence": threat.confidence,
+                    "threat_category": threat.category.value}
+        # BLOCK_IP also blocks the evidence's source_ip, so only an external source goes there
+        if f"ip:{threat.source_ip}" in indicators:
+            evidence["source_ip"] = threat.source_ip
+        incident, respond = await self.orchestrator.aggregate_alert(
+            title=f"{threat.category.value.replace('_', ' ').title()} from {threat.source_ip}",
+            description=threat.description,
+            severity=self.severity_type(THREAT_TO_INCIDENT_SEVERITY[threat.threat_level.value]),
+            source_system="advanced_threat_detection",
+            affected_assets=assets,
+            indicators=[*threat.indicators, *indicators],
+            evidence=evidence
+        )
+        # Merged threats only go on to the respond stage when they escalate
+        return [incident] if respond else None
+
+    async def _respond(self, incident):
+        await self.orchestrator.trigger_automated_response(incident)
+        return None
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+XORB Service Metrics
+Latency histograms, counters and gauges with a Prometheus endpoint, a sampling profiler and log throttling
+"""
+
+import asyncio
+import collections
+import logging
+import signal
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+# aiohttp is imported by serve(), so services that never expose metrics skip it
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Linear sub-buckets per power of two: 2**(SUB_BITS - 1) = 16 of them, so a
+# recorded value is off by at most 1/16 (6%) of itself
+SUB_BITS = 5
+_HALF = 1 << (SUB_BITS - 1)
+# Microseconds; values past 2**40 us (about 12 days) land in the last bucket
+_MAX_SHIFT = 40 - SUB_BITS + 1
+_BUCKETS = (_MAX_SHIFT + 2) * _HALF
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+class LatencyHistogram:
+    """Log-linear latency histogram in the style of HdrHistogram
+
+    Durations are recorded in seconds and kept as microsecond counts in
+    buckets of fixed relative width, so recording is a few integer
+    operations and memory is fixed whatever the range of values.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        micros = int(seconds * 1e6)
+        shift = micros.bit_length() - SUB_BITS
+        if shift <= 0:
+            index = micros if micros > 0 else 0
+        else:
+            index = shift * _HALF + (micros >> shift)
+            if index >= _BUCKETS:
+                index = _BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_since(self, start: float):
+        """Record the time since ``start``, a ``time.perf_counter()`` reading"""
+        self.record(time.perf_counter() - start)
+
+    @staticmethod
+    def _bucket_value(index: int) -> float:
+        # Upper edge of the bucket, in seconds
+        if index < 1 << SUB_BITS:
+            return (index + 1) / 1e6
+        shift = index // _HALF - 1
+        top = index - shift * _HALF
+        return ((top + 1) << shift) / 1e6
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds at quantile ``q`` (0-1), to the histogram's precision"""
+        if not self.count:
+            return 0.0
+        rank = max(q * self.count, 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                **{f"p{str(q * 100).rstrip('0').rstrip('.')}": self.percentile(q) for q in QUANTILES},
+                "max": self.max}
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+def _format_labels(labels: LabelSet, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricsRegistry:
+    """Named histograms, counters and gauges for one service
+
+    Metrics are created once with ``histogram``, ``counter`` and ``gauge``
+    and kept by the caller; the hot path then records straight into them,
+    guarded by ``enabled`` so a disabled registry costs one attribute
+    check. Gauges are callables read only when metrics are rendered, e.g.
+    queue depths. ``render`` produces the Prometheus text format and
+    ``serve`` exposes it over HTTP together with an on-demand profile.
+    """
+
+    def __init__(self, namespace: str = "xorb", enabled: bool = True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self._histograms: Dict[str, Dict[LabelSet, LatencyHistogram]] = {}
+        self._counters: Dict[str, Dict[LabelSet, Counter]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, Callable[[], float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._runner: Optional["web.AppRunner"] = None
+        self._profiler: Optional[SamplingProfiler] = None
+
+    def _name(self, name: str, help: str) -> str:
+        full = f"{self.namespace}_{name}"
+        if help:
+            self._help.setdefault(full, help)
+        return full
+
+    def histogram(self, name: str, help: str = "", **labels: str) -> LatencyHistogram:
+        family = self._histograms.setdefault(self._name(name, help), {})
+        return family.setdefault(tuple(sorted(labels.items())), LatencyHistogram())
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        family = self._counters.setdefault(self._name(name, help), {})
+        return family.setdefault(tuple(sorted(labels.items())), Counter())
+
+    def gauge(self, name: str, read: Callable[[], float], help: str = "", **labels: str):
+        self._gauges.setdefault(self._name(name, help), {})[tuple(sorted(labels.items()))] = read
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, family in self._histograms.items():
+            header(name, "summary")
+            for labels, histogram in family.items():
+                for q in QUANTILES:
+                    quantile = 'quantile="%s"' % q
+                    lines.append(f"{name}{_format_labels(labels, quantile)} {histogram.percentile(q):.9g}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.9g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, family in self._counters.items():
+            header(name, "counter")
+            for labels, counter in family.items():
+                lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+        for name, family in self._gauges.items():
+            header(name, "gauge")
+            for labels, read in family.items():
+                try:
+                    value = read()
+                except Exception as e:
+                    logger.error(f"Failed to read gauge {name}: {e}")
+                    continue
+                lines.append(f"{name}{_format_labels(labels)} {value:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Histogram summaries and counter values keyed by metric name and labels"""
+        result: Dict[str, Any] = {}
+        for name, family in self._histograms.items():
+            for labels, histogram in family.items():
+                result[f"{name}{_format_labels(labels)}"] = histogram.summary()
+        for name, family in self._counters.items():
+            for labels, counter in family.items():
+                result[f"{name}{_format_labels(labels)}"] = counter.value
+        return result
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9464) -> int:
+        """Serve /metrics and /debug/profile on a local port; returns the port"""
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        app.router.add_get("/debug/profile", self._handle_profile)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return port
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Format": "0.0.4"})
+
+    async def _handle_profile(self, request: "web.Request") -> "web.Response":
+        """Profile the process for ?seconds= (default 5, at most 60) and return collapsed stacks"""
+        from aiohttp import web
+        if self._profiler is not None:
+            return web.Response(status=409, text="A profile is already running\n")
+        try:
+            seconds = min(float(request.query.get("seconds", 5)), 60.0)
+            interval = max(float(request.query.get("interval", 0.005)), 0.001)
+        except ValueError:
+            return web.Response(status=400, text="seconds and interval must be numbers\n")
+        self._profiler = SamplingProfiler(interval=interval)
+        try:
+            self._profiler.start()
+            await asyncio.sleep(seconds)
+        except RuntimeError as e:
+            return web.Response(status=501, text=f"{e}\n")
+        finally:
+            self._profiler.stop()
+            profiler, self._profiler = self._profiler, None
+        return web.Response(text=profiler.collapsed(), content_type="text/plain")
+
+class SamplingProfiler:
+    """Statistical CPU profiler for the main thread, where the event loop runs
+
+    ``SIGPROF`` fires every ``interval`` seconds of CPU time the process
+    uses and the handler counts the interrupted Python stack; ``collapsed``
+    returns the counts in the collapsed-stack format flame graph tools
+    read. Time blocked on I/O is not sampled. Code runs at full speed
+    between samples, so it is safe to use in production for short windows.
+    Needs ``setitimer`` (Unix) and must be started from the main thread.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: "collections.Counter[Tuple[str, ...]]" = collections.Counter()
+        self._previous = None
+        self.running = False
+
+    def start(self):
+        if not hasattr(signal, "setitimer"):
+            raise RuntimeError("Sampling profiler needs signal.setitimer")
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("Sampling profiler must be started from the main thread")
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.running = True
+
+    def stop(self):
+        if not self.running:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous if self._previous is not None else signal.SIG_DFL)
+        self.running = False
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.samples[tuple(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+class LogThrottle:
+    """Rate-limited logging for hot paths
+
+    At most ``burst`` messages per key are logged in each ``interval``;
+    the rest are counted and reported in one line when the next interval
+    starts. Arguments are only formatted for messages actually logged.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 10.0, burst: int = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        # key -> [window end, logged, suppressed]
+        self._windows: Dict[str, List] = {}
+
+    def log(self, level: int, key: str, message: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = self.clock()
+        window = self._windows.get(key)
+        if window is None or now >= window[0]:
+            if window is not None and window[2]:
+                self.logger.log(level, "%d similar '%s' messages suppressed in the last %.0fs",
+                                window[2], key, self.interval)
+            window = self._windows[key] = [now + self.interval, 0, 0]
+        if window[1] < self.burst:
+            window[1] += 1
+            self.logger.log(level, message, *args)
+        else:
+            window[2] += 1
+
+    def info(self, key: str, message: str, *args):
+        self.log(logging.INFO, key, message, *args)
+
+    def warning(self, key: str, message: str, *args):
+        self.log(logging.WARNING, key, message, *args)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+XORB Session Tokens
+Encrypted session tokens with a rotating key ring, a verified-token cache and batch verification
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from expiring_map import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+NONCE_SIZE = 12
+
+def key_id(secret: bytes) -> str:
+    """Short id of a key, the same in every process that holds the secret"""
+    return hashlib.blake2b(secret, digest_size=6).hexdigest()
+
+def _digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+class SessionKey:
+    """One key of the ring with its cipher set up once"""
+    __slots__ = ("kid", "secret", "aead", "aad", "prefix")
+
+    def __init__(self, secret: bytes):
+        if len(secret) not in (16, 24, 32):
+            raise ValueError("Session keys must be 16, 24 or 32 bytes")
+        self.kid = key_id(secret)
+        self.secret = secret
+        self.aead = AESGCM(secret)
+        # The key id is authenticated along with the claims
+        self.aad = self.kid.encode()
+        self.prefix = self.kid + "."
+
+class SessionTokenManager:
+    """Issue and verify session tokens
+
+    A token is ``<key id>.<base64 of nonce + AES-GCM ciphertext>`` over the
+    JSON claims, so one AEAD pass both encrypts and authenticates it, in
+    place of signing a JWT and then encrypting it with Fernet. Claims get
+    an ``exp`` (Unix seconds) from the ``ttl`` given at issue.
+
+    Keys live in a ring of at most ``ring_size``; ``rotate`` adds a key
+    that signs from then on while the older ones keep verifying until they
+    fall off the ring. The key id in the token picks the key, so there is
+    no trial decryption. Pass the same ``keys`` (oldest first) to every
+    process that must verify each other's tokens.
+
+    Verified tokens are cached by digest until their ``exp``, so a token
+    presented again costs a hash and a lookup. ``revoke`` rejects a token
+    for the rest of its lifetime.
+    """
+
+    def __init__(self, keys: Optional[Sequence[bytes]] = None, ring_size: int = 3,
+                 cache_size: Optional[int] = 200_000):
+        if ring_size < 1:
+            raise ValueError("ring_size must be at least 1")
+        self.ring_size = ring_size
+        self._keys: "OrderedDict[str, SessionKey]" = OrderedDict()
+        for secret in keys or [AESGCM.generate_key(bit_length=256)]:
+            self._add_key(secret)
+        # digest -> (key id, claims)
+        self._cache = ExpiringMap(max_entries=cache_size)
+        # digest -> True for revoked tokens that have not expired
+        self._revoked = ExpiringMap()
+        self.stats = {"issued": 0, "verified": 0, "cache_hits": 0, "rejected": 0, "rotations": 0}
+
+    def _add_key(self, secret: bytes) -> SessionKey:
+        key = SessionKey(secret)
+        self._keys.pop(key.kid, None)
+        self._keys[key.kid] = key
+        while len(self._keys) > self.ring_size:
+            self._keys.popitem(last=False)
+        self._active = key
+        return key
+
+    @property
+    def active_key_id(self) -> str:
+        return self._active.kid
+
+    @property
+    def key_ids(self) -> List[str]:
+        """Key ids on the ring, oldest first"""
+        return list(self._keys)
+
+    def rotate(self, secret: Optional[bytes] = None) -> str:
+        """Start issuing with a new key, generated unless given; returns its id"""
+        key = self._add_key(secret or AESGCM.generate_key(bit_length=256))
+        self.stats["rotations"] += 1
+        logger.info(f"Rotated session token key to {key.kid}; ring holds {len(self._keys)}")
+        return key.kid
+
+    def issue(self, claims: Dict, ttl: float) -> str:
+        """Token carrying ``claims`` that expires ``ttl`` seconds from now"""
+        return self.issue_many([claims], ttl)[0]
+
+    def issue_many(self, claims_list: Iterable[Dict], ttl: float) -> List[str]:
+        """Tokens for several sessions with the same lifetime"""
+        key = self._active
+        encrypt, aad, prefix = key.aead.encrypt, key.aad, key.prefix
+        exp = int(time.time() + ttl)
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        tokens = []
+        for claims in claims_list:
+            nonce = os.urandom(NONCE_SIZE)
+            sealed = encrypt(nonce, encode({**claims, "exp": exp}).encode(), aad)
+            tokens.append(prefix + base64.urlsafe_b64encode(nonce + sealed).decode())
+        self.stats["issued"] += len(tokens)
+        return tokens
+
+    def verify(self, token: str) -> Optional[Dict]:
+        """Claims of a valid, unexpired, unrevoked token, else None"""
+        return self.verify_many((token,))[0]
+
+    def verify_many(self, tokens: Iterable[str]) -> List[Optional[Dict]]:
+        """Claims or None for each token, in order
+
+        Returned claims are shared with the cache and must not be modified.
+        """
+        now = time.time()
+        keys = self._keys
+        cache = self._cache
+        results: List[Optional[Dict]] = []
+        hits = 0
+        for token in tokens:
+            digest = _digest(token)
+            entry = cache.get(digest)
+            if entry is not None and entry[0] in keys:
+                hits += 1
+                results.append(entry[1])
+            else:
+                results.append(self._verify_uncached(token, digest, now))
+        self.stats["cache_hits"] += hits
+        return results
+
+    def _verify_uncached(self, token: str, digest: bytes, now: float) -> Optional[Dict]:
+        kid, _, body = token.partition(".")
+        key = self._keys.get(kid)
+        if key is None or digest in self._revoked:
+            self.stats["rejected"] += 1
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(body)
+            claims = json.loads(key.aead.decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], key.aad))
+            remaining = claims["exp"] - now
+        except (InvalidTag, ValueError, TypeError, KeyError):
+            self.stats["rejected"] += 1
+            return None
+        if remaining <= 0:
+            self.stats["rejected"] += 1
+            return None
+        self._cache.set(digest, (kid, claims), ttl=remaining)
+        self.stats["verified"] += 1
+        return claims
+
+    def revoke(self, token: str):
+        """Reject ``token`` from now until it would have expired"""
+        digest = _digest(token)
+        entry = self._cache.pop(digest, None)
+        if entry is not None:
+            ttl = entry[1]["exp"] - time.time()
+        else:
+            claims = self.verify(token)
+            if claims is None:
+                return
+            self._cache.pop(digest, None)
+            ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self._revoked.set(digest, True, ttl=ttl)
+
+    def cached(self) -> int:
+        return len(self._cache)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+XORB Threat Event Store
+SQLite threat-event storage with a dedicated writer thread and day-partitioned tables
+"""
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# (event_id, epoch seconds, source_ip, target_ip, threat_level, category, confidence, data)
+EventRow = Tuple[str, float, str, str, int, str, float, str]
+
+PARTITION_PREFIX = "threat_events_"
+
+@lru_cache(maxsize=1024)
+def _day_partition(day: int) -> str:
+    return PARTITION_PREFIX + datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y%m%d")
+
+def partition_name(timestamp: float) -> str:
+    """Name of the daily table holding events at ``timestamp`` (UTC)"""
+    return _day_partition(int(timestamp // 86400))
+
+def _configure(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+
+class ThreatEventStore:
+    """Threat event storage that never blocks the event loop
+
+    A single writer thread owns the write connection and commits queued
+    events in batches of up to ``batch_size`` rows, one ``executemany``
+    per daily partition, in a single transaction. The database runs in
+    WAL mode so readers never wait for the writer.
+
+    Events live in one table per UTC day, each indexed on
+    (source_ip, timestamp) and (category, timestamp). Time-range queries
+    only touch the days they cover, and retention drops whole tables
+    instead of deleting rows.
+    """
+
+    def __init__(self, db_path: Union[str, Path] = "threat_detection.db", batch_size: int = 5000,
+                 flush_interval: float = 0.05, retention_days: int = 30,
+                 max_pending: int = 500000):
+        self.db_path = Path(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._queue: "queue.Queue[Optional[Tuple[Sequence[EventRow], Future]]]" = queue.Queue(max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._partitions: set = set()
+        self._local = threading.local()
+        self._start_lock = threading.Lock()
+        self.stats = {"events": 0, "batches": 0, "errors": 0, "partitions_dropped": 0}
+
+    def start(self):
+        """Start the writer thread"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="threat-event-writer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: Optional[float] = None):
+        """Write everything queued and stop the writer thread"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+    @property
+    def pending(self) -> int:
+        """Batches queued for the writer thread"""
+        return self._queue.qsize()
+
+    def submit(self, rows: Sequence[EventRow]) -> Future:
+        """Queue rows for insertion, returning a future resolved once they are committed"""
+        future: Future = Future()
+        if not rows:
+            future.set_result(0)
+            return future
+        if self._thread is None:
+            self.start()
+        self._queue.put((rows, future))
+        return future
+
+    async def store(self, rows: Sequence[EventRow]) -> int:
+        """Queue rows and wait until they are committed"""
+        return await asyncio.wrap_future(self.submit(rows))
+
+    def flush(self):
+        """Block until everything submitted so far is committed"""
+        self._barrier().result()
+
+    def _barrier(self) -> Future:
+        future: Future = Future()
+        if self._thread is None:
+            future.set_result(0)
+            return future
+        self._queue.put(((), future))
+        return future
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        _configure(conn)
+        self._partitions = self._existing_partitions(conn)
+        next_retention = 0.0
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                item = ()
+            batch: List[Tuple[Sequence[EventRow], Future]] = []
+            rows = 0
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                elif item:
+                    batch.append(item)
+                    rows += len(item[0])
+                if stopping or rows >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()) if rows else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(conn, batch)
+            if time.monotonic() >= next_retention:
+                self._apply_retention(conn)
+                next_retention = time.monotonic() + 3600
+        conn.close()
+
+    def _existing_partitions(self, conn: sqlite3.Connection) -> set:
+        return {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+            (PARTITION_PREFIX + "%",)
+        )}
+
+    def _ensure_partition(self, conn: sqlite3.Connection, table: str):
+        if table in self._partitions:
+            return
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                event_id TEXT PRIMARY KEY,
+                timestamp REAL,
+                source_ip TEXT,
+                target_ip TEXT,
+                threat_level INTEGER,
+                category TEXT,
+                confidence REAL,
+                data TEXT
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_source ON {table} (source_ip, timestamp)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_category ON {table} (category, timestamp)")
+        self._partitions.add(table)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple[Sequence[EventRow], Future]]):
+        by_partition: Dict[str, List[EventRow]] = {}
+        for rows, _ in batch:
+            for row in rows:
+                by_partition.setdefault(partition_name(row[1]), []).append(row)
+        count = sum(len(rows) for rows in by_partition.values())
+        try:
+            conn.execute("BEGIN")
+            for table, rows in by_partition.items():
+                self._ensure_partition(conn, table)
+                conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+            self.stats["events"] += count
+            self.stats["batches"] += 1
+            for rows, future in batch:
+                future.set_result(len(rows))
+        except Exception as e:
+            logger.error(f"Failed to write {count} threat events: {e}")
+            self.stats["errors"] += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Tables created in the failed transaction are gone again
+            self._partitions = self._existing_partitions(conn)
+            for _, future in batch:
+                future.set_exception(e)
+
+    def _apply_retention(self, conn: sqlite3.Connection):
+        """Drop daily partitions older than the retention period"""
+        cutoff = partition_name(time.time() - self.retention_days * 86400)
+        for table in sorted(self._partitions):
+            if table < cutoff:
+                try:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    self._partitions.discard(table)
+                    self.stats["partitions_dropped"] += 1
+                    logger.info(f"Dropped expired threat event partition {table}")
+                except Exception as e:
+                    logger.error(f"Failed to drop threat event partition {table}: {e}")
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA query_only=ON")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _partitions_between(self, conn: sqlite3.Connection, start: float, end: float) -> List[str]:
+        tables = {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name BETWEEN ? AND ?",
+            (partition_name(start), partition_name(end))
+        )}
+        return sorted(tables, reverse=True)
+
+    def query(self, source_ip: Optional[str] = None, category: Optional[str] = None,
+              hours: float = 24, end: Optional[float] = None, limit: int = 1000) -> List[Dict]:
+        """Events in the last ``hours`` hours, newest first, optionally by source IP or category
+
+        Each covered day is searched through its (source_ip, timestamp) or
+        (category, timestamp) index, so no query scans a whole table.
+        """
+        end = end if end is not None else time.time()
+        start = end - hours * 3600
+        conn = self._reader()
+        conditions, params = ["timestamp >= ?", "timestamp <= ?"], [start, end]
+        if source_ip is not None:
+            conditions.insert(0, "source_ip = ?")
+            params.insert(0, source_ip)
+        if category is not None:
+            conditions.insert(0, "category = ?")
+            params.insert(0, category)
+        where = " AND ".join(conditions)
+
+        results: List[Dict] = []
+        for table in self._partitions_between(conn, start, end):
+            remaining = limit - len(results)
+            if remaining <= 0:
+                break
+            rows = conn.execute(
+                f"SELECT * FROM {table} WHERE {where} ORDER BY timestamp DESC LIMIT ?",
+                (*params, remaining)
+            ).fetchall()
+            results.extend(dict(row) for row in rows)
+        return results
+
+    async def query_async(self, **kwargs) -> List[Dict]:
+        """``query`` on a worker thread"""
+        return await asyncio.to_thread(self.query, **kwargs)
+
+    def threats_from_ip(self, source_ip: str, hours: float = 24, limit: int = 1000) -> List[Dict]:
+        """Threat events from ``source_ip`` in the last ``hours`` hours"""
+        return self.query(source_ip=source_ip, hours=hours, limit=limit)
@@ -5,20 +5,34 @@ Advanced network security with micro-segmentation and policy enforcement
 """
 
 import asyncio
+import bisect
+import csv
+import itertools
 import logging
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set
-from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass
 from enum import Enum
 import ipaddress
 import hashlib
-import jwt
-from cryptography.fernet import Fernet
-import redis.asyncio as redis
+import inspect
+import socket
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import numpy as np
+
+from controller_sharding import ShardRouter
+from expiring_map import EXPIRED, ExpiringMap
+from indicator_index import IndicatorIndex, IndicatorSnapshot
+from record_codec import RecordCodec
+from redis_write_behind import RedisWriteBehind
+from service_metrics import LogThrottle, MetricsRegistry
+from session_tokens import SessionTokenManager
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class TrustLevel(Enum):
@@ -37,7 +51,7 @@ class NetworkZone(Enum):
     ADMIN = "admin"
     ISOLATED = "isolated"
 
-@dataclass
+@dataclass(slots=True)
 class NetworkIdentity:
     """Network entity identity and trust attributes"""
     entity_id: str
@@ -51,11 +65,13 @@ class NetworkIdentity:
     risk_score: float = 0.0
     
     def to_dict(self) -> Dict:
-        data = asdict(self)
-        data['trust_level'] = self.trust_level.value
-        data['zone'] = self.zone.value
-        data['last_verified'] = self.last_verified.isoformat()
-        return data
+        return IDENTITY_CODEC.to_dict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NetworkIdentity':
+        return IDENTITY_CODEC.from_dict(data)
+
+IDENTITY_CODEC = RecordCodec(NetworkIdentity)
 
 @dataclass
 class NetworkPolicy:
@@ -70,26 +86,600 @@ class NetworkPolicy:
     requires_mfa: bool = False
     max_session_duration: int = 3600  # seconds
     
+    def to_dict(self) -> Dict:
+        return POLICY_CODEC.to_dict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NetworkPolicy':
+        return POLICY_CODEC.from_dict(data)
+
+POLICY_CODEC = RecordCodec(NetworkPolicy)
+
+def _parse_ip(ip_address: str) -> Optional[Tuple[int, int]]:
+    """Parse an IP string to (integer value, version), None if it is not an address"""
+    try:
+        if ip_address.count(".") == 3:
+            return int.from_bytes(socket.inet_aton(ip_address), "big"), 4
+        return int(ipaddress.IPv6Address(ip_address)), 6
+    except (OSError, ValueError):
+        return None
+
+class ZonePrefixMap:
+    """Longest-prefix-match map from IP addresses to network zones
+
+    Prefixes are bucketed by length in hash tables, so a lookup costs one
+    dict probe per distinct prefix length in use rather than a scan over
+    every zone network.
+    """
+    
+    def __init__(self):
+        # version -> [(prefix_len, {network_int: zone})], longest prefix first
+        self._tables: Dict[int, List[Tuple[int, Dict[int, NetworkZone]]]] = {4: [], 6: []}
+    
+    def add(self, cidr: str, zone: NetworkZone):
+        network = ipaddress.ip_network(cidr, strict=False)
+        tables = self._tables[network.version]
+        for prefix_len, table in tables:
+            if prefix_len == network.prefixlen:
+                table[int(network.network_address)] = zone
+                return
+        tables.append((network.prefixlen, {int(network.network_address): zone}))
+        tables.sort(key=lambda entry: entry[0], reverse=True)
+    
+    def lookup(self, ip_address: str) -> Optional[NetworkZone]:
+        parsed = _parse_ip(ip_address)
+        return self.lookup_parsed(*parsed) if parsed else None
+    
+    def lookup_parsed(self, value: int, version: int) -> Optional[NetworkZone]:
+        """Zone of an address already parsed by ``_parse_ip``"""
+        bits = 32 if version == 4 else 128
+        for prefix_len, table in self._tables[version]:
+            zone = table.get(value >> (bits - prefix_len) << (bits - prefix_len))
+            if zone is not None:
+                return zone
+        return None
+
+def _parse_time_window(time_restriction: Optional[Dict[str, str]]) -> Optional[Tuple[int, int]]:
+    """Convert a {"start": "HH:MM", "end": "HH:MM"} restriction to minutes of day"""
+    if not time_restriction:
+        return None
+    start_hour, start_minute = map(int, time_restriction["start"].split(":"))
+    end_hour, end_minute = map(int, time_restriction["end"].split(":"))
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+def read_identity_records(path: str) -> Iterator[Dict[str, str]]:
+    """Stream identity records from a CMDB export in CSV or JSONL format
+
+    Records need ``entity_id``, ``ip_address``, ``mac_address``,
+    ``device_fingerprint`` and ``zone`` (a NetworkZone value). Rows are
+    yielded one at a time so exports of any size can be imported.
+    """
+    with open(path, newline="") as export:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in export:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(export)
+
+_EPOCH = datetime(1970, 1, 1)
+_ZONES = list(NetworkZone)
+_ZONE_CODES = {zone: code for code, zone in enumerate(_ZONES)}
+_TRUST_LEVELS = {level.value: level for level in TrustLevel}
+
+def _pack_ip(ip_address: str) -> Optional[Tuple[int, int, int]]:
+    """Pack an IP string as (version, high 64 bits, low 64 bits) if it round-trips exactly"""
+    if ip_address.count(".") == 3:
+        try:
+            packed = socket.inet_aton(ip_address)
+        except OSError:
+            return None
+        return (4, 0, int.from_bytes(packed, "big")) if socket.inet_ntoa(packed) == ip_address else None
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    if str(address) != ip_address:
+        return None
+    value = int(address)
+    return address.version, value >> 64, value & 0xFFFFFFFFFFFFFFFF
+
+def _pack_mac(mac_address: str) -> Optional[int]:
+    """Pack a lowercase colon-separated MAC into a 48-bit int if it round-trips exactly"""
+    try:
+        value = int(mac_address.replace(":", ""), 16)
+    except ValueError:
+        return None
+    return value if len(mac_address) == 17 and _format_mac(value) == mac_address else None
+
+def _format_mac(value: int) -> str:
+    return value.to_bytes(6, "big").hex(":")
+
+class IdentityView:
+    """Live view of one identity in an IdentityStore
+
+    Behaves like a NetworkIdentity: reads decode from the store's columns
+    and assignments write straight back to them.
+    """
+    __slots__ = ("_store", "entity_id")
+    
+    def __init__(self, store: 'IdentityStore', entity_id: str):
+        self._store = store
+        self.entity_id = entity_id
+    
+    def _row(self) -> int:
+        return self._store._rows[self.entity_id]
+    
+    @property
+    def ip_address(self) -> str:
+        return self._store._get_ip(self._row())
+    
+    @ip_address.setter
+    def ip_address(self, value: str):
+        self._store._set_ip(self._row(), value)
+    
+    @property
+    def mac_address(self) -> str:
+        return self._store._get_mac(self._row())
+    
+    @mac_address.setter
+    def mac_address(self, value: str):
+        self._store._set_mac(self._row(), value)
+    
+    @property
+    def device_fingerprint(self) -> str:
+        return self._store._fingerprints[self._row()]
+    
+    @device_fingerprint.setter
+    def device_fingerprint(self, value: str):
+        self._store._fingerprints[self._row()] = value
+    
+    @property
+    def trust_level(self) -> TrustLevel:
+        return _TRUST_LEVELS[int(self._store._trust[self._row()])]
+    
+    @trust_level.setter
+    def trust_level(self, value: TrustLevel):
+        self._store._trust[self._row()] = value.value
+    
+    @property
+    def zone(self) -> NetworkZone:
+        return _ZONES[int(self._store._zone[self._row()])]
+    
+    @zone.setter
+    def zone(self, value: NetworkZone):
+        self._store._zone[self._row()] = _ZONE_CODES[value]
+    
+    @property
+    def last_verified(self) -> datetime:
+        return self._store._get_last_verified(self._row())
+    
+    @last_verified.setter
+    def last_verified(self, value: datetime):
+        self._store._set_last_verified(self._row(), value)
+    
+    @property
+    def cert_thumbprint(self) -> Optional[str]:
+        return self._store._sparse.get((self._row(), "cert_thumbprint"))
+    
+    @cert_thumbprint.setter
+    def cert_thumbprint(self, value: Optional[str]):
+        self._store._set_sparse(self._row(), "cert_thumbprint", value)
+    
+    @property
+    def risk_score(self) -> float:
+        # Stored as float32; rounding hides the representation error
+        return round(float(self._store._risk[self._row()]), 6)
+    
+    @risk_score.setter
+    def risk_score(self, value: float):
+        self._store._risk[self._row()] = value
+    
+    def to_identity(self) -> NetworkIdentity:
+        """Materialize a standalone NetworkIdentity copy"""
+        return NetworkIdentity(
+            entity_id=self.entity_id,
+            ip_address=self.ip_address,
+            mac_address=self.mac_address,
+            device_fingerprint=self.device_fingerprint,
+            trust_level=self.trust_level,
+            zone=self.zone,
+            last_verified=self.last_verified,
+            cert_thumbprint=self.cert_thumbprint,
+            risk_score=self.risk_score
+        )
+    
+    def to_dict(self) -> Dict:
+        # The codec only reads attributes, so encode straight from the columns
+        return IDENTITY_CODEC.to_dict(self)
+    
+    def __repr__(self) -> str:
+        return f"IdentityView({self.to_identity()!r})"
+
+class IdentityStore(MutableMapping):
+    """Columnar, array-backed replacement for Dict[str, NetworkIdentity]
+
+    Each identity is a row: IPs are packed into two uint64 columns plus a
+    version byte, MACs into a uint64, trust level and zone into uint8
+    codes, risk into float32 and last_verified into int64 microseconds.
+    Entity IDs are interned and map to row numbers. Values that do not
+    pack losslessly (malformed addresses, timezone-aware datetimes) and the
+    rarely set cert_thumbprint live in a small sparse dict. Lookups return
+    IdentityView objects rather than copies. Risk scores are kept at
+    float32 precision.
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self._rows: Dict[str, int] = {}
+        self._entity_ids: List[str] = []
+        self._fingerprints: List[str] = []
+        self._sparse: Dict[Tuple[int, str], object] = {}
+        self._ip_version = np.zeros(capacity, dtype=np.uint8)
+        self._ip_high = np.zeros(capacity, dtype=np.uint64)
+        self._ip_low = np.zeros(capacity, dtype=np.uint64)
+        self._mac = np.zeros(capacity, dtype=np.uint64)
+        self._trust = np.zeros(capacity, dtype=np.uint8)
+        self._zone = np.zeros(capacity, dtype=np.uint8)
+        self._risk = np.zeros(capacity, dtype=np.float32)
+        self._last_verified = np.zeros(capacity, dtype=np.int64)
+    
+    _COLUMNS = ("_ip_version", "_ip_high", "_ip_low", "_mac", "_trust", "_zone", "_risk", "_last_verified")
+    _SPARSE_FIELDS = ("ip_address", "mac_address", "last_verified", "cert_thumbprint")
+    
+    def _grow(self):
+        capacity = max(1024, 2 * len(self._ip_version))
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+    
+    def _set_sparse(self, row: int, field_name: str, value):
+        if value is None:
+            self._sparse.pop((row, field_name), None)
+        else:
+            self._sparse[(row, field_name)] = value
+    
+    def _get_ip(self, row: int) -> str:
+        version = self._ip_version[row]
+        if version == 4:
+            return socket.inet_ntoa(int(self._ip_low[row]).to_bytes(4, "big"))
+        if version == 6:
+            return str(ipaddress.IPv6Address((int(self._ip_high[row]) << 64) | int(self._ip_low[row])))
+        return self._sparse.get((row, "ip_address"), "")
+    
+    def _set_ip(self, row: int, ip_address: str):
+        packed = _pack_ip(ip_address)
+        self._set_sparse(row, "ip_address", None if packed else ip_address)
+        self._ip_version[row], self._ip_high[row], self._ip_low[row] = packed or (0, 0, 0)
+    
+    def _get_mac(self, row: int) -> str:
+        raw = self._sparse.get((row, "mac_address"))
+        return raw if raw is not None else _format_mac(int(self._mac[row]))
+    
+    def _set_mac(self, row: int, mac_address: str):
+        packed = _pack_mac(mac_address)
+        self._set_sparse(row, "mac_address", None if packed is not None else mac_address)
+        self._mac[row] = packed or 0
+    
+    def _get_last_verified(self, row: int) -> datetime:
+        raw = self._sparse.get((row, "last_verified"))
+        return raw if raw is not None else _EPOCH + timedelta(microseconds=int(self._last_verified[row]))
+    
+    def _set_last_verified(self, row: int, value: datetime):
+        aware = value.tzinfo is not None
+        self._set_sparse(row, "last_verified", value if aware else None)
+        self._last_verified[row] = 0 if aware else (value - _EPOCH) // timedelta(microseconds=1)
+    
+    def __setitem__(self, entity_id: str, identity):
+        row = self._rows.get(entity_id)
+        if row is None:
+            row = len(self._entity_ids)
+            if row == len(self._ip_version):
+                self._grow()
+            entity_id = sys.intern(entity_id)
+            self._rows[entity_id] = row
+            self._entity_ids.append(entity_id)
+            self._fingerprints.append(identity.device_fingerprint)
+        else:
+            self._fingerprints[row] = identity.device_fingerprint
+        self._set_ip(row, identity.ip_address)
+        self._set_mac(row, identity.mac_address)
+        self._trust[row] = identity.trust_level.value
+        self._zone[row] = _ZONE_CODES[identity.zone]
+        self._risk[row] = identity.risk_score
+        self._set_last_verified(row, identity.last_verified)
+        self._set_sparse(row, "cert_thumbprint", identity.cert_thumbprint)
+    
+    def __getitem__(self, entity_id: str) -> IdentityView:
+        if entity_id not in self._rows:
+            raise KeyError(entity_id)
+        return IdentityView(self, entity_id)
+    
+    def get(self, entity_id: str, default=None):
+        return IdentityView(self, entity_id) if entity_id in self._rows else default
+    
+    def __contains__(self, entity_id) -> bool:
+        return entity_id in self._rows
+    
+    def __delitem__(self, entity_id: str):
+        row = self._rows.pop(entity_id)
+        last = len(self._entity_ids) - 1
+        if self._sparse:
+            for field_name in self._SPARSE_FIELDS:
+                self._sparse.pop((row, field_name), None)
+        if row != last:
+            # Move the last row into the hole so the columns stay dense
+            moved_id = self._entity_ids[last]
+            self._entity_ids[row] = moved_id
+            self._fingerprints[row] = self._fingerprints[last]
+            for name in self._COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            if self._sparse:
+                for field_name in self._SPARSE_FIELDS:
+                    value = self._sparse.pop((last, field_name), None)
+                    if value is not None:
+                        self._sparse[(row, field_name)] = value
+            self._rows[moved_id] = row
+        self._entity_ids.pop()
+        self._fingerprints.pop()
+    
+    def __iter__(self):
+        return iter(self._rows)
+    
+    def __len__(self) -> int:
+        return len(self._entity_ids)
+    
+    def nbytes(self) -> int:
+        """Bytes held by the packed columns (excluding entity ID and fingerprint strings)"""
+        return sum(getattr(self, name).nbytes for name in self._COLUMNS)
+
+_group_versions = itertools.count(1)
+
+class PolicyDecisionTable:
+    """Compiled index of network policies
+
+    Policies are grouped by (source_zone, destination_zone, protocol) and
+    each group maps destination ports to the first matching policy, so
+    resolving a connection is two dict lookups. A group is recompiled on its
+    own when a policy in it is added or removed. First match in
+    ``network_policies`` order wins, as with a linear scan.
+    """
+    
+    def __init__(self, policies: Iterable[NetworkPolicy] = ()):
+        self._groups: Dict[Tuple[NetworkZone, NetworkZone, str], List[NetworkPolicy]] = {}
+        self._port_maps: Dict[Tuple[NetworkZone, NetworkZone, str], Dict[int, NetworkPolicy]] = {}
+        self._sequence: Dict[int, int] = {}
+        self._next_sequence = 0
+        self.group_versions: Dict[Tuple[NetworkZone, NetworkZone, str], int] = {}
+        # id(policy) -> parsed time window, keyed like _sequence since policy_ids may repeat
+        self._time_windows: Dict[int, Optional[Tuple[int, int]]] = {}
+        for policy in policies:
+            self.add(policy, recompile=False)
+        for key in self._groups:
+            self._compile_group(key)
+    
+    @staticmethod
+    def group_key(policy: NetworkPolicy) -> Tuple[NetworkZone, NetworkZone, str]:
+        return policy.source_zone, policy.destination_zone, policy.protocol.lower()
+    
+    def _compile_group(self, key: Tuple[NetworkZone, NetworkZone, str]):
+        port_map: Dict[int, NetworkPolicy] = {}
+        for policy in self._groups.get(key, []):
+            for port in policy.allowed_ports:
+                port_map.setdefault(port, policy)
+        if port_map:
+            self._port_maps[key] = port_map
+        else:
+            self._port_maps.pop(key, None)
+        # Versions are unique across tables so cached decisions never match a rebuilt table
+        self.group_versions[key] = next(_group_versions)
+    
+    def add(self, policy: NetworkPolicy, recompile: bool = True, sequence: Optional[int] = None):
+        """Add a policy, keeping groups in ``network_policies`` order"""
+        if sequence is None:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+        self._sequence[id(policy)] = sequence
+        key = self.group_key(policy)
+        group = self._groups.setdefault(key, [])
+        group.insert(bisect.bisect_right([self._sequence[id(p)] for p in group], sequence), policy)
+        self._time_windows[id(policy)] = _parse_time_window(policy.time_restriction)
+        if recompile:
+            self._compile_group(key)
+    
+    def remove(self, policy: NetworkPolicy) -> Optional[int]:
+        """Remove a policy, returning its position so an edit can re-add it in place"""
+        key = self.group_key(policy)
+        group = self._groups.get(key, [])
+        position = next((i for i, p in enumerate(group) if p is policy), None)
+        if position is None:
+            return None
+        del group[position]
+        self._time_windows.pop(id(policy), None)
+        if not group:
+            del self._groups[key]
+        self._compile_group(key)
+        return self._sequence.pop(id(policy))
+    
+    def time_window(self, policy: NetworkPolicy) -> Optional[Tuple[int, int]]:
+        """Parsed daily window of a policy in the table, None if unrestricted"""
+        return self._time_windows.get(id(policy))
+    
+    def lookup(self, source_zone: NetworkZone, destination_zone: NetworkZone,
+               port: int, protocol: str) -> Optional[NetworkPolicy]:
+        port_map = self._port_maps.get((source_zone, destination_zone, protocol.lower()))
+        return port_map.get(port) if port_map else None
+
+def _seconds_until_window_change(window: Tuple[int, int], now: datetime) -> float:
+    """Seconds until the next start or end boundary of a daily time window"""
+    second_of_day = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+    return min((boundary * 60 - second_of_day) % 86400 or 86400 for boundary in window)
+
+def _identity_state(identity) -> Optional[Tuple]:
+    """Identity attributes a cached access decision depends on"""
+    if identity is None:
+        return None
+    return identity.trust_level, identity.risk_score, identity.zone, identity.ip_address
+
+class CachedDecision:
+    """Access decision plus the state it was derived from"""
+    __slots__ = ("policy", "reason", "identity_state", "group_key",
+                 "group_version", "indicator_version", "deadline", "session_id")
+    
+    def __init__(self, policy, reason, identity_state, group_key,
+                 group_version, indicator_version, deadline, session_id=None):
+        self.policy = policy
+        self.reason = reason
+        self.identity_state = identity_state
+        self.group_key = group_key
+        self.group_version = group_version
+        self.indicator_version = indicator_version
+        self.deadline = deadline
+        self.session_id = session_id
+
+class DecisionCache:
+    """Bounded LRU cache of access decisions with per-entry deadlines"""
+    
+    def __init__(self, max_entries: int = 100000, ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str, int, str], CachedDecision]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key: Tuple[str, str, int, str],
+            is_current: Optional[Callable[[Tuple[str, str, int, str], CachedDecision], bool]] = None
+            ) -> Optional[CachedDecision]:
+        """Return a live entry; entries past their deadline or failing ``is_current`` are dropped"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.deadline <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if is_current is not None and not is_current(key, entry):
+            del self._entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def put(self, key: Tuple[str, str, int, str], entry: CachedDecision):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
 class ZeroTrustNetworkController:
     """Advanced zero trust network controller"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
+    def __init__(self, redis_url: str = "redis://localhost:6379",
+                 decision_cache_size: int = 100000,
+                 decision_cache_ttl: float = 5.0,
+                 compact_identities: bool = False,
+                 max_sessions: Optional[int] = 500_000,
+                 on_session_end: Optional[Callable[[Dict, str], Any]] = None,
+                 session_keys: Optional[List[bytes]] = None,
+                 metrics: Optional[MetricsRegistry] = None, metrics_port: Optional[int] = None):
         self.redis_client = None
+        self.redis_writer: Optional[RedisWriteBehind] = None
         self.redis_url = redis_url
-        self.network_identities: Dict[str, NetworkIdentity] = {}
+        # The columnar store cuts per-identity memory for very large fleets
+        self.network_identities: MutableMapping = IdentityStore() if compact_identities else {}
+        # Change only through add_policy, remove_policy, update_policy or
+        # apply_control_snapshot, or call rebuild_policy_table after editing
         self.network_policies: List[NetworkPolicy] = []
-        self.active_sessions: Dict[str, Dict] = {}
-        self.threat_indicators: Set[str] = set()
-        self.encryption_key = Fernet.generate_key()
-        self.cipher_suite = Fernet(self.encryption_key)
+        self.policy_table = PolicyDecisionTable()
+        self.zone_map = ZonePrefixMap()
+        # Sessions leave memory at their policy's max_session_duration; past
+        # max_sessions the least recently used move to Redis until they expire
+        self.active_sessions: ExpiringMap = ExpiringMap(
+            max_entries=max_sessions, on_evict=self._release_session, spill=self._spill_session)
+        # Called with the session and "expired" or "ended" to tear it down,
+        # e.g. to drop the flow at the enforcement point; may be async
+        self.on_session_end = on_session_end
+        self.threat_indicators = IndicatorIndex()
+        # Versions of the control snapshot last applied and of its policy
+        # set and indicator feed; see apply_control_snapshot
+        self.control_version = 0
+        self.policy_version = 0
+        self.indicator_feed_version = 0
+        self.decision_cache = DecisionCache(decision_cache_size, decision_cache_ttl)
+        # Shared session_keys (oldest first) let other controllers verify our tokens
+        self.session_tokens = SessionTokenManager(keys=session_keys)
+        # Grants and denials are logged per decision, so at most a few per interval
+        self.decision_log = LogThrottle(logger)
+        
+        # Disabled unless a registry is passed in or the endpoint is requested
+        self.metrics = metrics or MetricsRegistry("xorb_zero_trust", enabled=metrics_port is not None)
+        self.metrics_port = metrics_port
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Create the per-stage histograms, decision counters and gauges"""
+        m = self.metrics
+        stage_help = "Seconds spent per stage of an access decision"
+        self._stage_decision = m.histogram("stage_seconds", stage_help, stage="decision")
+        self._stage_zone = m.histogram("stage_seconds", stage_help, stage="zone_lookup")
+        self._stage_policy = m.histogram("stage_seconds", stage_help, stage="policy_match")
+        self._stage_session = m.histogram("stage_seconds", stage_help, stage="session_create")
+        decision_help = "Access decisions by result"
+        self._granted = m.counter("decisions_total", decision_help, result="granted")
+        self._denied = m.counter("decisions_total", decision_help, result="denied")
+        self._redis_pipeline = m.histogram("redis_pipeline_seconds", "Seconds per write-behind Redis pipeline")
+        m.gauge("active_sessions", lambda: len(self.active_sessions), "Sessions held in memory")
+        m.gauge("decision_cache_entries", lambda: len(self.decision_cache), "Cached access decisions")
+        m.gauge("redis_writes_pending", lambda: self.redis_writer.pending if self.redis_writer else 0,
+                "Writes waiting in the Redis write-behind buffer")
         
     async def initialize(self):
         """Initialize zero trust network controller"""
         try:
-            self.redis_client = redis.from_url(self.redis_url)
-            await self.redis_client.ping()
+            # A client set beforehand, e.g. by a test or replay harness, is
+            # kept; without either, state lives in memory only
+            if self.redis_client is None and self.redis_url:
+                import redis.asyncio as redis
+                self.redis_client = redis.from_url(self.redis_url)
+            if self.redis_client is not None:
+                await self.redis_client.ping()
+                self.redis_writer = RedisWriteBehind(self.redis_client)
+                if self.metrics.enabled:
+                    self.redis_writer.pipeline_latency = self._redis_pipeline
+                await self.redis_writer.start()
             await self._load_default_policies()
             await self._initialize_network_zones()
+            await self.active_sessions.start()
+            if self.metrics_port is not None:
+                await self.metrics.serve(port=self.metrics_port)
             logger.info("Zero Trust Network Controller initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize network controller: {e}")
@@ -138,9 +728,466 @@ class ZeroTrustNetworkController:
             )
         ]
         
-        self.network_policies.extend(default_policies)
+        for policy in default_policies:
+            self.add_policy(policy)
         logger.info(f"Loaded {len(default_policies)} default network policies")
     
+    async def _initialize_network_zones(self):
+        """Map network address ranges to security zones"""
+        zone_networks = {
+            NetworkZone.DMZ: ["172.20.0.0/24"],
+            NetworkZone.INTERNAL: ["172.20.10.0/24", "10.0.0.0/8"],
+            NetworkZone.SECURE: ["172.20.20.0/24"],
+            NetworkZone.ADMIN: ["172.20.30.0/24"],
+            NetworkZone.ISOLATED: ["172.20.99.0/24"]
+        }
+        for zone, networks in zone_networks.items():
+            for cidr in networks:
+                self.zone_map.add(cidr, zone)
+        self.decision_cache.clear()
+        logger.info(f"Initialized {len(zone_networks)} network zones")
+    
+    def add_policy(self, policy: NetworkPolicy):
+        """Add a network policy and recompile its decision table group"""
+        self.network_policies.append(policy)
+        self.policy_table.add(policy)
+    
+    def remove_policy(self, policy_id: str) -> bool:
+        """Remove a network policy and recompile its decision table group"""
+        for position, policy in enumerate(self.network_policies):
+            if policy.policy_id == policy_id:
+                del self.network_policies[position]
+                self.policy_table.remove(policy)
+                return True
+        return False
+    
+    def update_policy(self, policy_id: str, **changes) -> bool:
+        """Edit a network policy in place and recompile the affected groups"""
+        for policy in self.network_policies:
+            if policy.policy_id == policy_id:
+                sequence = self.policy_table.remove(policy)
+                for field_name, value in changes.items():
+                    setattr(policy, field_name, value)
+                self.policy_table.add(policy, sequence=sequence)
+                return True
+        return False
+    
+    def rebuild_policy_table(self):
+        """Recompile the decision table after editing network_policies directly
+
+        The table is not rebuilt on its own: policies added, removed or
+        changed any other way than through the methods above are not seen
+        by access checks until this runs.
+        """
+        self.policy_table = PolicyDecisionTable(self.network_policies)
+    
+    async def apply_control_snapshot(self, snapshot: Dict) -> bool:
+        """Switch to the policies and indicator feed of a newer control snapshot
+
+        Snapshots are dicts with ``version``, ``policy_version`` and
+        ``policies`` (``NetworkPolicy.to_dict`` form), and
+        ``indicator_version`` and ``indicators``, as published by a
+        ``ShardRouter``'s control plane. Parts whose version is unchanged are
+        kept, so cached decisions survive an indicator-only update for
+        unaffected connections. The feed is compiled off the event loop and
+        both parts are swapped in together. Returns False for a snapshot no
+        newer than the one applied.
+        """
+        if snapshot["version"] <= self.control_version:
+            return False
+        policies = None
+        if snapshot["policy_version"] != self.policy_version:
+            policies = [NetworkPolicy.from_dict(policy) for policy in snapshot["policies"]]
+            table = PolicyDecisionTable(policies)
+        indicators = None
+        if snapshot["indicator_version"] != self.indicator_feed_version:
+            indicators = await asyncio.to_thread(IndicatorSnapshot.from_indicators, snapshot["indicators"])
+        # A newer snapshot may have been applied while the feed compiled
+        if snapshot["version"] <= self.control_version:
+            return False
+        if policies is not None:
+            self.network_policies = policies
+            self.policy_table = table
+            self.policy_version = snapshot["policy_version"]
+        if indicators is not None:
+            self.threat_indicators.swap(indicators)
+            self.indicator_feed_version = snapshot["indicator_version"]
+        self.control_version = snapshot["version"]
+        logger.info(f"Applied control snapshot v{self.control_version} ({len(self.network_policies)} policies, "
+                    f"indicator feed v{self.indicator_feed_version})")
+        return True
+    
+    def export_control_snapshot(self) -> Dict:
+        """The current policies in control snapshot form; indicators are not kept as text"""
+        return {
+            "version": self.control_version,
+            "policy_version": self.policy_version,
+            "policies": [policy.to_dict() for policy in self.network_policies],
+            "indicator_version": self.indicator_feed_version,
+            "indicators": []
+        }
+    
+    async def _determine_zone_by_ip(self, ip_address: str) -> Optional[NetworkZone]:
+        """Determine the security zone an IP address belongs to"""
+        return self.zone_map.lookup(ip_address)
+    
+    def _find_applicable_policy(self,
+                                source_zone: NetworkZone,
+                                destination_zone: Optional[NetworkZone],
+                                destination_port: int,
+                                protocol: str) -> Optional[NetworkPolicy]:
+        """Find the first policy matching a connection"""
+        return self.policy_table.lookup(source_zone, destination_zone, destination_port, protocol)
+    
+    def _check_time_restriction(self, time_restriction: Dict[str, str]) -> bool:
+        """Check whether the current UTC time falls inside a policy time window"""
+        return self._in_time_window(_parse_time_window(time_restriction))
+    
+    @staticmethod
+    def _in_time_window(window: Optional[Tuple[int, int]]) -> bool:
+        if window is None:
+            return True
+        now = datetime.utcnow()
+        minute = now.hour * 60 + now.minute
+        start, end = window
+        if start <= end:
+            return start <= minute < end
+        # Window spans midnight
+        return minute >= start or minute < end
+    
+    def _evaluate_access(self,
+                         source_entity: str,
+                         destination_ip: str,
+                         destination_port: int,
+                         protocol: str) -> Tuple[Optional[NetworkPolicy], str]:
+        """Evaluate zero trust policies for a connection
+
+        Returns the granting policy, or None with the reason for the denial.
+        """
+        source_identity = self.network_identities.get(source_entity)
+        if not source_identity:
+            return None, f"Unknown source entity {source_entity}"
+        
+        # The destination is parsed once for both the indicator and the zone lookup
+        destination = _parse_ip(destination_ip)
+        if destination and destination[1] == 4:
+            flagged = self.threat_indicators.contains_ipv4_int(destination[0])
+        else:
+            flagged = self.threat_indicators.contains_ip(destination_ip)
+        if flagged or self.threat_indicators.contains_ip(source_identity.ip_address):
+            return None, f"Threat indicator match for {source_entity} to {destination_ip}"
+        
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        dest_zone = self.zone_map.lookup_parsed(*destination) if destination else None
+        if timed:
+            zoned = time.perf_counter()
+            self._stage_zone.record(zoned - start)
+        applicable_policy = self._find_applicable_policy(
+            source_identity.zone,
+            dest_zone,
+            destination_port,
+            protocol
+        )
+        if timed:
+            self._stage_policy.record_since(zoned)
+        if not applicable_policy:
+            return None, f"No applicable policy for {source_entity}"
+        
+        if source_identity.trust_level.value < applicable_policy.min_trust_level.value:
+            return None, f"Insufficient trust level for {source_entity}"
+        
+        if applicable_policy.time_restriction and not self._in_time_window(
+                self.policy_table.time_window(applicable_policy)):
+            return None, f"Outside allowed time window for {source_entity}"
+        
+        return applicable_policy, ""
+    
+    def _is_decision_current(self, key: Tuple[str, str, int, str], entry: CachedDecision) -> bool:
+        """Check that the identity, policy group and indicators behind a cached decision are unchanged"""
+        identity = self.network_identities.get(key[0])
+        if _identity_state(identity) != entry.identity_state:
+            return False
+        if self.policy_table.group_versions.get(entry.group_key, 0) != entry.group_version:
+            return False
+        if entry.indicator_version != self.threat_indicators.version:
+            # Additions can only turn grants into denials; a swapped feed may
+            # also lift a denial that came from an indicator match
+            if entry.policy is None:
+                if entry.reason.startswith("Threat indicator"):
+                    return False
+            elif (self.threat_indicators.contains_ip(key[1])
+                  or self.threat_indicators.contains_ip(identity.ip_address)):
+                return False
+            entry.indicator_version = self.threat_indicators.version
+        return True
+    
+    def _cache_decision(self, key: Tuple[str, str, int, str], policy: Optional[NetworkPolicy],
+                        reason: str, session_id: Optional[str] = None) -> CachedDecision:
+        """Cache a decision until its TTL, its session expiry or a time window boundary"""
+        identity = self.network_identities.get(key[0])
+        lifetime = self.decision_cache.ttl
+        if policy is not None:
+            lifetime = min(lifetime, policy.max_session_duration)
+        group_key = None
+        if identity is not None:
+            group_key = (identity.zone, self.zone_map.lookup(key[1]), key[3].lower())
+            window = self.policy_table.time_window(policy) if policy else None
+            if window is None and reason.startswith("Outside allowed time window"):
+                matched = self.policy_table.lookup(*group_key[:2], key[2], key[3])
+                window = self.policy_table.time_window(matched) if matched else None
+            if window is not None:
+                lifetime = min(lifetime, _seconds_until_window_change(window, datetime.utcnow()))
+        entry = CachedDecision(
+            policy=policy,
+            reason=reason,
+            identity_state=_identity_state(identity),
+            group_key=group_key,
+            group_version=self.policy_table.group_versions.get(group_key, 0),
+            indicator_version=self.threat_indicators.version,
+            deadline=time.monotonic() + lifetime,
+            session_id=session_id
+        )
+        self.decision_cache.put(key, entry)
+        return entry
+    
+    def _decide(self, key: Tuple[str, str, int, str]) -> CachedDecision:
+        """The current decision for a connection, from the cache or freshly evaluated and cached
+
+        A grant's session_id may not name a live session yet; see _needs_session.
+        """
+        entry = self.decision_cache.get(key, self._is_decision_current)
+        if entry is None:
+            policy, reason = self._evaluate_access(*key)
+            entry = self._cache_decision(key, policy, reason)
+        return entry
+    
+    def _needs_session(self, entry: CachedDecision) -> bool:
+        return entry.policy is not None and entry.session_id not in self.active_sessions
+    
+    async def _authorize(self,
+                         source_entity: str,
+                         destination_ip: str,
+                         destination_port: int,
+                         protocol: str) -> Tuple[bool, str]:
+        """Decide a connection through the decision cache, reusing live sessions on hits"""
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        entry = self._decide((source_entity, destination_ip, destination_port, protocol))
+        if self._needs_session(entry):
+            entry.session_id = await self._create_network_session(
+                source_entity, destination_ip, destination_port, entry.policy
+            )
+        if timed:
+            self._record_decision(start, entry.policy is not None)
+        return entry.policy is not None, entry.reason
+    
+    def _record_decision(self, start: float, granted: bool):
+        self._stage_decision.record_since(start)
+        (self._granted if granted else self._denied).inc()
+    
+    async def _create_network_session(self,
+                                      source_entity: str,
+                                      destination_ip: str,
+                                      destination_port: int,
+                                      policy: NetworkPolicy) -> str:
+        """Create an access session with a signed, encrypted session token"""
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        session_id = str(uuid.uuid4())
+        created_at = datetime.utcnow()
+        expires_at = created_at + timedelta(seconds=policy.max_session_duration)
+        token = self.session_tokens.issue({
+            "sid": session_id,
+            "sub": source_entity,
+            "dst": f"{destination_ip}:{destination_port}",
+            "pol": policy.policy_id
+        }, policy.max_session_duration)
+        self.active_sessions.set(session_id, {
+            "session_id": session_id,
+            "source_entity": source_entity,
+            "destination_ip": destination_ip,
+            "destination_port": destination_port,
+            "policy_id": policy.policy_id,
+            "requires_mfa": policy.requires_mfa,
+            "created_at": created_at.isoformat(),
+            "expires_at": expires_at.isoformat(),
+            "token": token
+        }, ttl=policy.max_session_duration)
+        if timed:
+            self._stage_session.record_since(start)
+        return session_id
+    
+    def _spill_session(self, session_id: str, session: Dict):
+        """Keep a session evicted from memory in Redis until it expires"""
+        if not self.redis_writer:
+            return None
+        remaining = (datetime.fromisoformat(session["expires_at"]) - datetime.utcnow()).total_seconds()
+        if remaining < 1:
+            return None
+        return self.redis_writer.setex(f"network_session:{session_id}", int(remaining), json.dumps(session))
+    
+    def _release_session(self, session_id: str, session: Dict, reason: str):
+        # Evicted sessions are still valid in Redis; only expiry ends them
+        if reason == EXPIRED and self.on_session_end is not None:
+            return self.on_session_end(session, reason)
+        return None
+    
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """A live session, from memory or, if it was evicted, from Redis"""
+        session = self.active_sessions.get(session_id)
+        if session is not None or self.redis_client is None:
+            return session
+        try:
+            raw = await self.redis_client.get(f"network_session:{session_id}")
+        except Exception as e:
+            logger.error(f"Failed to fetch session {session_id}: {e}")
+            return None
+        return json.loads(raw) if raw else None
+    
+    async def end_session(self, session_id: str) -> bool:
+        """Terminate a session before it expires"""
+        session = self.active_sessions.pop(session_id, None) or await self.get_session(session_id)
+        if session is None:
+            return False
+        self.session_tokens.revoke(session["token"])
+        if self.redis_writer:
+            await self.redis_writer.submit("delete", f"network_session:{session_id}")
+        if self.on_session_end is not None:
+            result = self.on_session_end(session, "ended")
+            if inspect.isawaitable(result):
+                await result
+        return True
+    
+    async def verify_session_token(self, token: str) -> Optional[Dict]:
+        """Claims of a session token whose session is still live, else None"""
+        return (await self.verify_session_tokens([token]))[0]
+    
+    async def verify_session_tokens(self, tokens: Iterable[str]) -> List[Optional[Dict]]:
+        """Verify a batch of session tokens; repeated tokens are served from the token cache"""
+        results = self.session_tokens.verify_many(tokens)
+        for index, claims in enumerate(results):
+            # Sessions evicted from memory are still live if Redis has them
+            if (claims is not None and claims["sid"] not in self.active_sessions
+                    and await self.get_session(claims["sid"]) is None):
+                results[index] = None
+        return results
+    
+    def rotate_session_key(self, secret: Optional[bytes] = None) -> str:
+        """Issue new session tokens with a fresh key; tokens from recent keys keep verifying"""
+        return self.session_tokens.rotate(secret)
+    
+    def _calculate_risk_scores(self, ip_addresses: List[str], device_fingerprints: List[str]) -> np.ndarray:
+        """Vectorized initial risk scores for a batch of devices"""
+        flagged = self.threat_indicators.contains_ips(ip_addresses)
+        unfingerprinted = np.array([not fp or fp == "unknown" for fp in device_fingerprints], dtype=bool)
+        risk = 0.1 + 0.6 * flagged + 0.2 * unfingerprinted
+        return np.round(np.minimum(risk, 1.0), 3)
+    
+    def _initial_trust_levels(self, zones: List[NetworkZone], risk_scores: np.ndarray) -> List[TrustLevel]:
+        """Vectorized initial trust levels from zones and risk scores"""
+        isolated = np.array([zone == NetworkZone.ISOLATED for zone in zones], dtype=bool)
+        levels = np.select(
+            [isolated | (risk_scores >= 0.7), risk_scores >= 0.4],
+            [TrustLevel.UNTRUSTED.value, TrustLevel.BASIC.value],
+            default=TrustLevel.AUTHENTICATED.value
+        )
+        return [TrustLevel(level) for level in levels.tolist()]
+    
+    async def _calculate_risk_score(self, ip_address: str, device_fingerprint: str) -> float:
+        """Calculate the initial risk score of a device"""
+        return float(self._calculate_risk_scores([ip_address], [device_fingerprint])[0])
+    
+    async def _determine_initial_trust(self, zone: NetworkZone, risk_score: float) -> TrustLevel:
+        """Determine the initial trust level from zone and risk"""
+        return self._initial_trust_levels([zone], np.array([risk_score]))[0]
+    
+    async def register_identities_bulk(self,
+                                       records: Union[Iterable[Dict], AsyncIterable[Dict]],
+                                       chunk_size: int = 10000,
+                                       progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Register identities from a stream of records in bounded-memory chunks
+
+        ``records`` may be any iterable or async iterable of dicts, such as
+        ``read_identity_records(path)``. Risk and trust are computed per
+        chunk with vectorized operations and each chunk is written to Redis
+        through the pipelined writer before the next chunk is read.
+        ``progress`` is called with (registered, skipped) after each chunk.
+        Returns the number of identities registered.
+        """
+        registered = 0
+        skipped = 0
+        chunk: List[Dict] = []
+        
+        async def flush_chunk():
+            nonlocal registered, skipped
+            valid = []
+            for record in chunk:
+                try:
+                    zone = record["zone"]
+                    valid.append((record, zone if isinstance(zone, NetworkZone) else NetworkZone(zone)))
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"Skipping invalid identity record {record.get('entity_id')}: {e}")
+                    skipped += 1
+            if valid:
+                await self._register_identity_chunk(valid)
+                registered += len(valid)
+            chunk.clear()
+            if progress:
+                progress(registered, skipped)
+        
+        if hasattr(records, "__aiter__"):
+            async for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    await flush_chunk()
+        else:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    await flush_chunk()
+        if chunk:
+            await flush_chunk()
+        
+        logger.info(f"Bulk registered {registered} network identities ({skipped} skipped)")
+        return registered
+    
+    async def _register_identity_chunk(self, records: List[Tuple[Dict, NetworkZone]]):
+        """Score, store and persist one chunk of identity records"""
+        ip_addresses = [record.get("ip_address", "") for record, _ in records]
+        fingerprints = [record.get("device_fingerprint", "") for record, _ in records]
+        zones = [zone for _, zone in records]
+        risk_scores = self._calculate_risk_scores(ip_addresses, fingerprints)
+        trust_levels = self._initial_trust_levels(zones, risk_scores)
+        now = datetime.utcnow()
+        
+        for (record, zone), ip_address, fingerprint, trust_level, risk_score in zip(
+                records, ip_addresses, fingerprints, trust_levels, risk_scores.tolist()):
+            identity = NetworkIdentity(
+                entity_id=record["entity_id"],
+                ip_address=ip_address,
+                mac_address=record.get("mac_address", ""),
+                device_fingerprint=fingerprint,
+                trust_level=trust_level,
+                zone=zone,
+                last_verified=now,
+                cert_thumbprint=record.get("cert_thumbprint") or None,
+                risk_score=risk_score
+            )
+            self.network_identities[identity.entity_id] = identity
+            if self.redis_writer:
+                await self.redis_writer.hset(
+                    f"network_identity:{identity.entity_id}",
+                    {k: v for k, v in identity.to_dict().items() if v is not None}
+                )
+        
+        # Wait for the chunk to reach Redis so memory stays bounded by one chunk
+        if self.redis_writer:
+            await self.redis_writer.flush()
+    
     async def register_network_identity(self, 
                                       entity_id: str,
                                       ip_address: str,
@@ -168,19 +1215,29 @@ class ZeroTrustNetworkController:
             
             self.network_identities[entity_id] = identity
             
-            # Store in Redis for persistence
-            await self.redis_client.hset(
-                f"network_identity:{entity_id}",
-                mapping=identity.to_dict()
-            )
+            # Queue for Redis persistence; Redis rejects None hash values
+            if self.redis_writer:
+                await self.redis_writer.hset(
+                    f"network_identity:{entity_id}",
+                    {k: v for k, v in identity.to_dict().items() if v is not None}
+                )
             
             logger.info(f"Registered network identity {entity_id} with trust level {initial_trust.name}")
-            return identity
+            return self.network_identities[entity_id]
             
         except Exception as e:
             logger.error(f"Failed to register network identity: {e}")
             raise
     
+    async def shutdown(self):
+        """Flush pending Redis writes and close the connection"""
+        await self.metrics.close()
+        await self.active_sessions.close()
+        if self.redis_writer:
+            await self.redis_writer.close()
+        if self.redis_client:
+            await self.redis_client.close()
+    
     async def verify_network_access(self, 
                                   source_entity: str,
                                   destination_ip: str,
@@ -188,52 +1245,67 @@ class ZeroTrustNetworkController:
                                   protocol: str = "tcp") -> bool:
         """Verify network access based on zero trust policies"""
         try:
-            # Get source identity
-            source_identity = self.network_identities.get(source_entity)
-            if not source_identity:
-                logger.warning(f"Access denied: Unknown source entity {source_entity}")
-                return False
-            
-            # Determine destination zone
-            dest_zone = await self._determine_zone_by_ip(destination_ip)
-            
-            # Find applicable policy
-            applicable_policy = self._find_applicable_policy(
-                source_identity.zone,
-                dest_zone,
-                destination_port,
-                protocol
-            )
-            
-            if not applicable_policy:
-                logger.warning(f"Access denied: No applicable policy for {source_entity}")
-                return False
-            
-            # Check trust level requirement
-            if source_identity.trust_level.value < applicable_policy.min_trust_level.value:
-                logger.warning(f"Access denied: Insufficient trust level for {source_entity}")
-                return False
-            
-            # Check time restrictions
-            if applicable_policy.time_restriction:
-                if not self._check_time_restriction(applicable_policy.time_restriction):
-                    logger.warning(f"Access denied: Outside allowed time window for {source_entity}")
-                    return False
-            
-            # Create session if access granted
-            session_id = await self._create_network_session(
+            granted, denial_reason = await self._authorize(
                 source_entity,
                 destination_ip,
                 destination_port,
-                applicable_policy
+                protocol
             )
+            if not granted:
+                self.decision_log.warning("access denied", "Access denied: %s", denial_reason)
+                return False
             
-            logger.info(f"Network access granted for {source_entity} to {destination_ip}:{destination_port}")
+            self.decision_log.info("access granted", "Network access granted for %s to %s:%s",
+                                   source_entity, destination_ip, destination_port)
             return True
             
         except Exception as e:
             logger.error(f"Network access verification error: {e}")
             return False
+    
+    async def verify_many(self, checks: Iterable[Tuple[str, str, int, str]]) -> List[bool]:
+        """Verify a batch of (source_entity, destination_ip, destination_port, protocol) checks
+
+        Every check is decided first, synchronously, through the decision
+        cache and compiled policy table; only then are sessions created, once
+        per granted connection without a live session.
+        """
+        results = []
+        # Decision -> the check that opens its session; repeats in the batch share it
+        sessions: Dict[int, Tuple[CachedDecision, Tuple[str, str, int, str]]] = {}
+        decide, needs_session = self._decide, self._needs_session
+        timed = self.metrics.enabled
+        for check in checks:
+            try:
+                if timed:
+                    start = time.perf_counter()
+                entry = decide(tuple(check))
+                if needs_session(entry):
+                    sessions.setdefault(id(entry), (entry, check))
+                results.append(entry.policy is not None)
+                if timed:
+                    self._record_decision(start, results[-1])
+            except Exception as e:
+                logger.error(f"Network access verification error: {e}")
+                results.append(False)
+        for entry, (source_entity, destination_ip, destination_port, _) in sessions.values():
+            try:
+                entry.session_id = await self._create_network_session(
+                    source_entity, destination_ip, destination_port, entry.policy
+                )
+            except Exception as e:
+                logger.error(f"Failed to create session for {source_entity}: {e}")
+        denied = results.count(False)
+        if denied:
+            logger.warning(f"Access denied for {denied} of {len(results)} batched checks")
+        return results
+
+def sharded_controller(shards: Optional[int] = None, **options) -> ShardRouter:
+    """Router over ``shards`` controller processes, one per core by default
+
+    ``options`` go to ``ShardRouter``; see ``controller_sharding``.
+    """
+    return ShardRouter(__file__, ZeroTrustNetworkController.__name__, shards=shards, **options)
 
 async def main():
     """Main function for testing zero trust network controller"""
@@ -260,4 +1332,5 @@ async def main():
     print(f"Network access granted: {access_granted}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
\ No newline at end of file